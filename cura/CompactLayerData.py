@@ -0,0 +1,114 @@
+# Copyright (c) 2018 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import numpy
+
+from .LayerData import LayerData
+from .LayerPolygon import LayerPolygon
+
+
+##  Layer data that keeps its layer mesh in a compact form, for prints that are
+#   too big to keep the complete layer mesh in memory.
+#
+#   Vertex positions are quantized to 16 bits within the bounds they were built
+#   in, line types and extruders are stored as bytes and line dimensions and
+#   feedrates as half floats. The colors are not stored at all, they are looked
+#   up in the line type and material palettes. The full mesh is only expanded
+#   when it is requested, e.g. when it is uploaded to the graphics card.
+#   Immutable, use LayerDataBuilder to create one of these.
+class CompactLayerData(LayerData):
+    ##  Creates the layer data.
+    #
+    #   \param quantized_vertices The vertices, as uint16 steps of vertex_scale
+    #   away from vertex_offset.
+    #   \param vertex_offset The [x, y, z] of a vertex with quantized value 0.
+    #   \param vertex_scale The [x, y, z] size of one quantization step.
+    #   \param line_dimensions The width and thickness of each vertex.
+    #   \param feedrates The feedrate of each vertex.
+    #   \param extruders The extruder (uint8) of each vertex.
+    #   \param line_types The line type (uint8) of each vertex.
+    #   \param color_map An [r, g, b, a] row for each line type.
+    #   \param material_color_map An [r, g, b, a] row for each extruder.
+    def __init__(self, quantized_vertices, vertex_offset, vertex_scale, line_dimensions, feedrates, extruders, line_types,
+                 color_map, material_color_map, normals = None, indices = None, uvs = None, file_name = None,
+                 center_position = None, layers = None, element_counts = None):
+        super().__init__(normals = normals, indices = indices, uvs = uvs, file_name = file_name,
+                         center_position = center_position, layers = layers, element_counts = element_counts)
+        self._quantized_vertices = quantized_vertices
+        self._vertex_offset = numpy.asarray(vertex_offset, dtype = numpy.float32)
+        self._vertex_scale = numpy.asarray(vertex_scale, dtype = numpy.float32)
+        self._line_dimensions = line_dimensions
+        self._feedrates = feedrates
+        self._extruders = extruders
+        self._line_types = line_types
+        self._color_map = color_map
+
+        # Extruders without a material color are black, like in the regular layer mesh.
+        self._material_color_map = numpy.zeros((256, 4), dtype = numpy.float32)
+        self._material_color_map[:len(material_color_map)] = material_color_map[:256]
+
+    def getVertices(self):
+        return self._quantized_vertices * self._vertex_scale + self._vertex_offset
+
+    def getVertexCount(self):
+        return len(self._quantized_vertices)
+
+    def getVerticesAsByteArray(self):
+        return self.getVertices().tobytes()
+
+    def hasColors(self):
+        return True
+
+    def getColors(self):
+        return self._color_map[self._line_types]
+
+    def getColorsAsByteArray(self):
+        return self.getColors().tobytes()
+
+    def attributeNames(self):
+        return ["line_dimensions", "extruders", "colors", "line_types", "feedrates"]
+
+    def hasAttribute(self, key):
+        return key in self.attributeNames()
+
+    ##  Expand one of the attributes of the layer mesh.
+    #
+    #   The attributes are the same as those of the LayerData created by
+    #   LayerDataBuilder in its regular mode.
+    def getAttribute(self, key):
+        if key == "line_dimensions":
+            return {"value": self._line_dimensions.astype(numpy.float32), "opengl_name": "a_line_dim", "opengl_type": "vector2f"}
+        if key == "extruders":
+            # Strangely enough, the type has to be float while it is actually an int.
+            return {"value": self._extruders.astype(numpy.float32), "opengl_name": "a_extruder", "opengl_type": "float"}
+        if key == "colors":
+            return {"value": self._getMaterialColors(), "opengl_name": "a_material_color", "opengl_type": "vector4f"}
+        if key == "line_types":
+            return {"value": self._line_types.astype(numpy.float32), "opengl_name": "a_line_type", "opengl_type": "float"}
+        if key == "feedrates":
+            return {"value": self._feedrates.astype(numpy.float32), "opengl_name": "a_feedrate", "opengl_type": "float"}
+        return None
+
+    ##  Get the number of bytes that the layer mesh takes in this compact form.
+    def getByteSize(self):
+        byte_size = sum(array.nbytes for array in (self._quantized_vertices, self._line_dimensions, self._feedrates, self._extruders, self._line_types))
+        if self.getIndices() is not None:
+            byte_size += self.getIndices().nbytes
+        return byte_size
+
+    ##  Get the number of bytes that the layer mesh would take in the regular
+    #   LayerData, with float32 vertices, colors, material colors and
+    #   attributes.
+    def getExpandedByteSize(self):
+        floats_per_vertex = 3 + 4 + 4 + 2 + 1 + 1 + 1  # Vertex, color, material color, line dimensions, feedrate, extruder and line type.
+        byte_size = self.getVertexCount() * floats_per_vertex * 4
+        if self.getIndices() is not None:
+            byte_size += self.getIndices().nbytes
+        return byte_size
+
+    def _getMaterialColors(self):
+        material_colors = self._material_color_map[self._extruders]
+        # Travel moves are shown in the color of their line type, also when coloring by material.
+        travel_moves = numpy.logical_or(self._line_types == LayerPolygon.MoveCombingType, self._line_types == LayerPolygon.MoveRetractionType)
+        material_colors[travel_moves] = self._color_map[self._line_types[travel_moves]]
+        return material_colors
@@ -520,6 +520,7 @@ class CuraApplication(QtApplication):
 
         preferences.addPreference("view/invert_zoom", False)
         preferences.addPreference("view/filter_current_build_plate", False)
+        preferences.addPreference("view/compact_layer_data", False)  # Quantize the layer view mesh, for prints that don't fit in memory otherwise.
         preferences.addPreference("cura/sidebar_collapsed", False)
 
         self._need_to_show_user_agreement = not self.getPreferences().getValue("general/accepted_user_agreement")
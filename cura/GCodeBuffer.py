@@ -0,0 +1,132 @@
+# Copyright (c) 2018 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import gzip
+import io
+from collections.abc import MutableSequence
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
+
+
+##  The g-code of a build plate, as a sequence of chunks (usually one layer
+#   each) that are kept as UTF-8 bytes.
+#
+#   It behaves like the list of strings that it replaces: indexing, iterating
+#   and assigning chunks works with strings, which are decoded and encoded one
+#   chunk at a time. Code that only needs the bytes, e.g. to write or compress
+#   the g-code, can use iterBytes() and doesn't need to decode anything or
+#   join the chunks into one big string.
+#
+#   Copies share the bytes of the chunks, since those are never modified in
+#   place.
+#
+#   The g-code can be compressed with gzip ahead of time, e.g. in a job after
+#   slicing, with compress(). The compressed g-code is kept until the chunks
+#   are changed.
+class GCodeBuffer(MutableSequence):
+    ##  Creates the buffer.
+    #
+    #   \param chunks The chunks of g-code, as strings or bytes, or another
+    #   GCodeBuffer to share the chunks of.
+    def __init__(self, chunks: Iterable[Union[str, bytes]] = ()) -> None:
+        if isinstance(chunks, GCodeBuffer):
+            self._chunks = list(chunks._chunks)  # type: List[bytes]
+        else:
+            self._chunks = [self._encode(chunk) for chunk in chunks]
+        self._version = 0  # Changes whenever the chunks change.
+        self._compressed = None  # type: Optional[Tuple[int, bytes]]  # The version that was compressed and the compressed g-code.
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [chunk.decode("utf-8", "replace") for chunk in self._chunks[index]]
+        return self._chunks[index].decode("utf-8", "replace")
+
+    def __setitem__(self, index, value) -> None:
+        if isinstance(index, slice):
+            self._chunks[index] = [self._encode(chunk) for chunk in value]
+        else:
+            self._chunks[index] = self._encode(value)
+        self._version += 1
+
+    def __delitem__(self, index) -> None:
+        del self._chunks[index]
+        self._version += 1
+
+    def insert(self, index: int, value: Union[str, bytes]) -> None:
+        self._chunks.insert(index, self._encode(value))
+        self._version += 1
+
+    def __repr__(self) -> str:
+        return "<GCodeBuffer with {0} chunks of {1} bytes>".format(len(self._chunks), self.getByteSize())
+
+    ##  Get a chunk without decoding it.
+    def getBytes(self, index: int) -> bytes:
+        return self._chunks[index]
+
+    ##  Iterate over the chunks without decoding them.
+    def iterBytes(self) -> Iterator[bytes]:
+        return iter(self._chunks)
+
+    ##  Iterate over the lines of each chunk, decoding one chunk at a time.
+    #
+    #   Each chunk is split like str.split("\n"), so a chunk that ends with a
+    #   newline gives an empty line at its end.
+    def iterLines(self) -> Iterator[str]:
+        for chunk in self._chunks:
+            yield from chunk.decode("utf-8", "replace").split("\n")
+
+    ##  Get the total size of the g-code in bytes.
+    def getByteSize(self) -> int:
+        return sum(len(chunk) for chunk in self._chunks)
+
+    ##  Write all of the g-code to a binary stream, one chunk at a time.
+    def writeTo(self, stream) -> None:
+        for chunk in self._chunks:
+            stream.write(chunk)
+
+    ##  Create a buffer with the same chunks. Changing the chunks of one of
+    #   them doesn't change the other.
+    def copy(self) -> "GCodeBuffer":
+        return GCodeBuffer(self)
+
+    ##  Compress the g-code with gzip and keep the result, so that it doesn't
+    #   need to be compressed again until the chunks change.
+    #
+    #   This may be called on another thread than the one that changes the
+    #   chunks. The result is then only kept if the chunks didn't change while
+    #   they were compressed.
+    #
+    #   \param is_cancelled Function that tells whether to stop compressing.
+    #   \return The compressed g-code, or None if it was cancelled.
+    def compress(self, is_cancelled: Optional[Callable[[], bool]] = None) -> Optional[bytes]:
+        version = self._version
+        chunks = list(self._chunks)
+        output = io.BytesIO()
+        with gzip.GzipFile(fileobj = output, mode = "wb") as gzip_file:
+            for chunk in chunks:
+                if is_cancelled is not None and is_cancelled():
+                    return None
+                gzip_file.write(chunk)
+        compressed = output.getvalue()
+        self._compressed = (version, compressed)
+        return compressed
+
+    ##  Get the g-code compressed with gzip by compress(), if the chunks didn't
+    #   change since.
+    #
+    #   \return The compressed g-code, or None if it's not compressed.
+    def getCompressed(self) -> Optional[bytes]:
+        compressed = self._compressed
+        if compressed is None or compressed[0] != self._version:
+            return None
+        return compressed[1]
+
+    @staticmethod
+    def _encode(chunk: Union[str, bytes]) -> bytes:
+        if isinstance(chunk, bytes):
+            return chunk
+        if isinstance(chunk, (bytearray, memoryview)):
+            return bytes(chunk)
+        return chunk.encode("utf-8")
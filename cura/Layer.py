@@ -1,16 +1,45 @@
 from UM.Mesh.MeshBuilder import MeshBuilder
 
+from .LayerPolygon import LayerPolygon
+
 import numpy
 
 
+##  The paths of a single layer, stored as columns.
+#
+#   Instead of one LayerPolygon with its own small arrays per path, all paths
+#   of the layer share one contiguous array per property: the points of all
+#   paths one after the other, and the line types, widths, thicknesses and
+#   feedrates of all lines one after the other. The path offsets tell where
+#   the points of each path start, so path k has the points
+#   points[path_offsets[k]:path_offsets[k + 1]] and one line less than it has
+#   points.
+#
+#   Paths are added with addPath() or addPaths(). They are gathered per chunk
+#   and only concatenated into the columns when the columns are needed.
 class Layer:
     def __init__(self, layer_id):
         self._id = layer_id
         self._height = 0.0
         self._thickness = 0.0
-        self._polygons = []
         self._element_count = 0
 
+        # Chunks of paths that were added but not yet concatenated into the columns.
+        self._pending_paths = []
+        self._pending_path_count = 0
+
+        self._points = numpy.empty((0, 3), numpy.float32)
+        self._path_offsets = numpy.zeros((1, ), numpy.int32)
+        self._extruders = numpy.empty((0, ), numpy.int32)  # Per path.
+        self._types = numpy.empty((0, ), numpy.uint8)  # Per line from here on.
+        self._line_widths = numpy.empty((0, ), numpy.float32)
+        self._line_thicknesses = numpy.empty((0, ), numpy.float32)
+        self._line_feedrates = numpy.empty((0, ), numpy.float32)
+
+        self._line_start_points = None  # Index of the first point of each line.
+        self._needed_points = None  # Which of the two points of each line need their own vertex in the line mesh.
+        self._polygons = None
+
     @property
     def height(self):
         return self._height
@@ -19,45 +48,226 @@ class Layer:
     def thickness(self):
         return self._thickness
 
+    ##  The paths of this layer as separate LayerPolygon objects.
+    #
+    #   This is only kept for compatibility. The LayerPolygons are created the
+    #   first time this is asked for, which is slow for big layers. Use the
+    #   columns of the layer itself instead.
     @property
     def polygons(self):
+        if self._polygons is None:
+            self._finalize()
+            self._polygons = []
+            line_offsets = self._lineOffsets()
+            for path in range(self.pathCount):
+                point_begin, point_end = self._path_offsets[path], self._path_offsets[path + 1]
+                line_begin, line_end = line_offsets[path], line_offsets[path + 1]
+                polygon = LayerPolygon(self._extruders[path], self._types[line_begin:line_end].reshape((-1, 1)), self._points[point_begin:point_end],
+                                       self._line_widths[line_begin:line_end].reshape((-1, 1)), self._line_thicknesses[line_begin:line_end].reshape((-1, 1)),
+                                       self._line_feedrates[line_begin:line_end].reshape((-1, 1)))
+                polygon.buildCache()
+                self._polygons.append(polygon)
         return self._polygons
 
     @property
     def elementCount(self):
         return self._element_count
 
+    ##  The points of all paths in this layer, as an N x 3 array.
+    @property
+    def points(self):
+        self._finalize()
+        return self._points
+
+    ##  Where the points of each path start in the points array, followed by
+    #   the total number of points.
+    @property
+    def pathOffsets(self):
+        self._finalize()
+        return self._path_offsets
+
+    ##  The extruder of each path.
+    @property
+    def extruders(self):
+        self._finalize()
+        return self._extruders
+
+    ##  The line type of each line.
+    @property
+    def types(self):
+        self._finalize()
+        return self._types
+
+    @property
+    def lineWidths(self):
+        self._finalize()
+        return self._line_widths
+
+    @property
+    def lineThicknesses(self):
+        self._finalize()
+        return self._line_thicknesses
+
+    @property
+    def lineFeedrates(self):
+        self._finalize()
+        return self._line_feedrates
+
+    @property
+    def pathCount(self):
+        return len(self._path_offsets) - 1 + self._pending_path_count
+
     def setHeight(self, height):
         self._height = height
 
     def setThickness(self, thickness):
         self._thickness = thickness
 
-    def lineMeshVertexCount(self):
-        result = 0
-        for polygon in self._polygons:
-            result += polygon.lineMeshVertexCount()
+    ##  Add a path to this layer.
+    #
+    #   \param extruder The extruder that prints the path.
+    #   \param line_types The type of each line, one less than there are points.
+    #   \param points The points of the path, as an N x 3 array.
+    #   \param line_widths The width of each line.
+    #   \param line_thicknesses The thickness of each line.
+    #   \param line_feedrates The feedrate of each line.
+    def addPath(self, extruder, line_types, points, line_widths, line_thicknesses, line_feedrates):
+        self.addPaths(numpy.array([extruder], numpy.int32), numpy.array([len(points)], numpy.int32),
+                      line_types, points, line_widths, line_thicknesses, line_feedrates)
 
-        return result
+    ##  Add a number of paths to this layer at once, given as columns.
+    #
+    #   The columns are used as they are when possible, without copying them.
+    #   They may be read-only views, e.g. on the data of a message; the layer
+    #   never writes into them.
+    #
+    #   \param extruders The extruder of each path.
+    #   \param point_counts The number of points of each path.
+    #   \param line_types The type of each line of all paths.
+    #   \param points The points of all paths, as an N x 3 array.
+    #   \param line_widths The width of each line of all paths.
+    #   \param line_thicknesses The thickness of each line of all paths.
+    #   \param line_feedrates The feedrate of each line of all paths.
+    def addPaths(self, extruders, point_counts, line_types, points, line_widths, line_thicknesses, line_feedrates):
+        line_types = numpy.ravel(line_types)
+        line_widths = numpy.ravel(line_widths)
+        line_thicknesses = numpy.ravel(line_thicknesses)
+        line_feedrates = numpy.ravel(line_feedrates)
 
-    def lineMeshElementCount(self):
-        result = 0
-        for polygon in self._polygons:
-            result += polygon.lineMeshElementCount()
+        # A path without lines doesn't show anything, so leave those out.
+        has_lines = point_counts >= 2
+        if not numpy.all(has_lines):
+            point_mask = numpy.repeat(has_lines, point_counts)
+            line_mask = numpy.repeat(has_lines, numpy.maximum(point_counts - 1, 0))
+            extruders, point_counts, points = extruders[has_lines], point_counts[has_lines], points[point_mask]
+            line_types, line_widths, line_thicknesses, line_feedrates = line_types[line_mask], line_widths[line_mask], line_thicknesses[line_mask], line_feedrates[line_mask]
+        if len(point_counts) == 0:
+            return
+
+        self._pending_paths.append((extruders, point_counts, line_types, points, line_widths, line_thicknesses, line_feedrates))
+        self._pending_path_count += len(point_counts)
+
+    ##  Concatenate the paths that were added since the last time into the
+    #   columns.
+    def _finalize(self):
+        if not self._pending_paths:
+            return
+
+        extruders, point_counts, line_types, points, line_widths, line_thicknesses, line_feedrates = zip(*self._pending_paths)
+        self._pending_paths = []
+        self._pending_path_count = 0
+
+        point_counts = numpy.concatenate(point_counts)
+        self._path_offsets = numpy.concatenate((self._path_offsets, self._path_offsets[-1] + numpy.cumsum(point_counts, dtype = numpy.int32)))
+        self._extruders = _appendColumn(self._extruders, extruders).astype(numpy.int32, copy = False)
+        self._points = _appendColumn(self._points, points).astype(numpy.float32, copy = False)
+
+        self._types = _appendColumn(self._types, line_types)
+        faulty_types = self._types >= LayerPolygon.getNumberOfTypes()
+        if numpy.any(faulty_types):  # Got faulty line data from the engine.
+            if not self._types.flags.writeable:  # Don't write into data we don't own, e.g. a view on a message.
+                self._types = self._types.copy()
+            self._types[faulty_types] = LayerPolygon.NoneType
+        self._line_widths = _appendColumn(self._line_widths, line_widths).astype(numpy.float32, copy = False)
+        self._line_thicknesses = _appendColumn(self._line_thicknesses, line_thicknesses).astype(numpy.float32, copy = False)
+        self._line_feedrates = _appendColumn(self._line_feedrates, line_feedrates).astype(numpy.float32, copy = False)
+
+        self._line_start_points = None
+        self._needed_points = None
+        self._polygons = None
 
-        return result
+    ##  Where the lines of each path start in the line arrays, followed by the
+    #   total number of lines.
+    def _lineOffsets(self):
+        return self._path_offsets - numpy.arange(len(self._path_offsets), dtype = numpy.int32)
 
+    ##  The index of the first point of each line. The line ends at the next point.
+    def _getLineStartPoints(self):
+        self._finalize()
+        if self._line_start_points is None:
+            # Every point is the start of a line, except for the last point of each path.
+            is_line_start = numpy.ones(len(self._points), dtype = bool)
+            is_line_start[self._path_offsets[1:] - 1] = False
+            self._line_start_points = numpy.flatnonzero(is_line_start).astype(numpy.int32)
+        return self._line_start_points
+
+    ##  For each line, whether its start and end point need a vertex of their
+    #   own in the line mesh.
+    #
+    #   The end point of a line always does. The start point only needs one
+    #   at the start of a path or when the line type changes, since otherwise
+    #   the line can share the vertex of the end of the previous line.
+    def _getNeededPoints(self):
+        self._finalize()
+        if self._needed_points is None:
+            self._needed_points = numpy.ones((len(self._types), 2), dtype = bool)
+            self._needed_points[1:, 0] = self._types[1:] != self._types[:-1]
+            self._needed_points[self._lineOffsets()[:-1], 0] = True
+        return self._needed_points
+
+    def lineMeshVertexCount(self):
+        return int(numpy.sum(self._getNeededPoints()))
+
+    def lineMeshElementCount(self):
+        self._finalize()
+        return len(self._types)
+
+    ##  Set all the arrays provided by the function caller, representing this
+    #   layer. The arrays are either by vertex or by indices.
+    #
+    #   \param vertex_offset : determines where to start filling the vertex arrays
+    #   \param index_offset : determines where to start filling the index array
+    #   \return The vertex and index offsets after this layer.
     def build(self, vertex_offset, index_offset, vertices, colors, line_dimensions, feedrates, extruders, line_types, indices):
-        result_vertex_offset = vertex_offset
-        result_index_offset = index_offset
-        self._element_count = 0
-        for polygon in self._polygons:
-            polygon.build(result_vertex_offset, result_index_offset, vertices, colors, line_dimensions, feedrates, extruders, line_types, indices)
-            result_vertex_offset += polygon.lineMeshVertexCount()
-            result_index_offset += polygon.lineMeshElementCount()
-            self._element_count += polygon.elementCount
+        needed_points = self._getNeededPoints()
+        needed_list = needed_points.ravel()
+        vertex_end = vertex_offset + int(numpy.sum(needed_list))
+        index_end = index_offset + len(self._types)
 
-        return (result_vertex_offset, result_index_offset)
+        # Row n of the point index list reads [start end] for line n. The points that don't need a vertex are dropped.
+        line_start_points = self._getLineStartPoints()
+        point_index_list = (line_start_points.reshape((-1, 1)) + numpy.array([[0, 1]], dtype = numpy.int32)).ravel()[needed_list]
+        vertices[vertex_offset:vertex_end, :] = self._points[point_index_list]
+
+        # All other properties are per line, so they're the same for both points of the line.
+        line_index_list = numpy.repeat(numpy.arange(len(self._types), dtype = numpy.int32), 2)[needed_list]
+        line_types_per_vertex = self._types[line_index_list]
+        colors[vertex_offset:vertex_end, :] = LayerPolygon.getColorMap()[line_types_per_vertex]
+        line_dimensions[vertex_offset:vertex_end, 0] = self._line_widths[line_index_list]
+        line_dimensions[vertex_offset:vertex_end, 1] = self._line_thicknesses[line_index_list]
+        feedrates[vertex_offset:vertex_end] = self._line_feedrates[line_index_list]
+        extruders[vertex_offset:vertex_end] = numpy.repeat(self._extruders, numpy.diff(self._lineOffsets()))[line_index_list]
+        line_types[vertex_offset:vertex_end] = line_types_per_vertex
+
+        # Each line segment goes from the vertex before its end vertex to its end vertex. That is either its own start
+        # vertex, or the end vertex of the previous line if the start point didn't need a vertex of its own.
+        end_vertices = numpy.cumsum(needed_list, dtype = numpy.int32)[1::2] - 1 + vertex_offset
+        indices[index_offset:index_end, 0] = end_vertices - 1
+        indices[index_offset:index_end, 1] = end_vertices
+
+        self._element_count = len(self._types) * 2  # Each line is drawn between two vertices.
+
+        return (vertex_end, index_end)
 
     def createMesh(self):
         return self.createMeshOrJumps(True)
@@ -70,47 +280,78 @@ class Layer:
 
     def createMeshOrJumps(self, make_mesh):
         builder = MeshBuilder()
-        
-        line_count = 0
-        if make_mesh:
-            for polygon in self._polygons:
-                line_count += polygon.meshLineCount
-        else:
-            for polygon in self._polygons:
-                line_count += polygon.jumpCount
+
+        # Filter out the types of lines we are not interesed in depending on whether we are drawing the mesh or the jumps.
+        jump_mask = LayerPolygon.getJumpMap()[self.types]
+        index_mask = numpy.logical_not(jump_mask) if make_mesh else jump_mask
+        line_count = int(numpy.sum(index_mask))
 
         # Reserve the neccesary space for the data upfront
         builder.reserveFaceAndVertexCount(2 * line_count, 4 * line_count)
-        
-        for polygon in self._polygons:
-            # Filter out the types of lines we are not interesed in depending on whether we are drawing the mesh or the jumps.
-            index_mask = numpy.logical_not(polygon.jumpMask) if make_mesh else polygon.jumpMask
-
-            # Create an array with rows [p p+1] and only keep those we whant to draw based on make_mesh
-            points = numpy.concatenate((polygon.data[:-1], polygon.data[1:]), 1)[index_mask.ravel()]
-            # Line types of the points we want to draw
-            line_types = polygon.types[index_mask]
-            
-            # Shift the z-axis according to previous implementation.
-            if make_mesh:
-                points[polygon.isInfillOrSkinType(line_types), 1::3] -= 0.01
-            else:
-                points[:, 1::3] += 0.01
-
-            # Create an array with normals and tile 2 copies to match size of points variable
-            normals = numpy.tile( polygon.getNormals()[index_mask.ravel()], (1, 2))
-
-            # Scale all normals by the line width of the current line so we can easily offset.
-            normals *= (polygon.lineWidths[index_mask.ravel()] / 2)
-
-            # Create 4 points to draw each line segment, points +- normals results in 2 points each.
-            # After this we reshape to one point per line.
-            f_points = numpy.concatenate((points-normals, points+normals), 1).reshape((-1, 3))
-
-            # __index_pattern defines which points to use to draw the two faces for each lines egment, the following linesegment is offset by 4
-            f_indices = ( self.__index_pattern + numpy.arange(0, 4 * len(normals), 4, dtype=numpy.int32).reshape((-1, 1)) ).reshape((-1, 3))
-            f_colors = numpy.repeat(polygon.mapLineTypeToColor(line_types), 4, 0)
-
-            builder.addFacesWithColor(f_points, f_indices, f_colors)
-        
-        return builder.build()
\ No newline at end of file
+        if line_count == 0:
+            return builder.build()
+
+        # Create an array with rows [p p+1] for the lines we want to draw based on make_mesh
+        line_start_points = self._getLineStartPoints()[index_mask]
+        points = numpy.concatenate((self._points[line_start_points], self._points[line_start_points + 1]), 1)
+        # Line types of the lines we want to draw
+        line_types = self._types[index_mask]
+
+        # Shift the z-axis according to previous implementation.
+        if make_mesh:
+            points[LayerPolygon.getInfillOrSkinTypeMap()[line_types], 1::3] -= 0.01
+        else:
+            points[:, 1::3] += 0.01
+
+        # Calculate the 2D normals of the lines and tile 2 copies to match size of points variable
+        normals = points[:, 3:6] - points[:, 0:3]
+        lengths = numpy.sqrt(normals[:, 0] ** 2 + normals[:, 2] ** 2)
+        normals[:, 0], normals[:, 2] = -normals[:, 2] / lengths, normals[:, 0] / lengths
+        normals[:, 1] = 0.0
+        normals = numpy.tile(normals, (1, 2))
+
+        # Scale all normals by the line width of the current line so we can easily offset.
+        normals *= (self._line_widths[index_mask].reshape((-1, 1)) / 2)
+
+        # Create 4 points to draw each line segment, points +- normals results in 2 points each.
+        # After this we reshape to one point per line.
+        f_points = numpy.concatenate((points-normals, points+normals), 1).reshape((-1, 3))
+
+        # __index_pattern defines which points to use to draw the two faces for each lines egment, the following linesegment is offset by 4
+        f_indices = ( self.__index_pattern + numpy.arange(0, 4 * line_count, 4, dtype=numpy.int32).reshape((-1, 1)) ).reshape((-1, 3))
+        f_colors = numpy.repeat(LayerPolygon.getColorMap()[line_types], 4, 0)
+
+        builder.addFacesWithColor(f_points, f_indices, f_colors)
+
+        return builder.build()
+
+    ##  Find the point that the print head is at after a number of steps along
+    #   the paths of this layer, for the simulation.
+    #
+    #   The first path counts all of its points. The next paths start where
+    #   the previous path ended, so their first point is not counted.
+    #
+    #   \param index The number of steps along the paths.
+    #   \return The point as [x, y, z], or None if the index is past the end.
+    def getPointAtPathIndex(self, index):
+        self._finalize()
+        point_counts = numpy.diff(self._path_offsets)
+        if len(point_counts) == 0:
+            return None
+        point_counts[1:] -= 1
+        path_ends = numpy.cumsum(point_counts)
+        path = int(numpy.searchsorted(path_ends, index, side = "right"))
+        if path >= len(path_ends):
+            return None
+        local_index = index - (path_ends[path - 1] - 1 if path > 0 else 0)
+        return self._points[self._path_offsets[path] + local_index]
+
+
+##  Append chunks of data to a column.
+#
+#   Concatenating copies all data, so when the column is empty and there is
+#   only one chunk, the chunk itself becomes the column.
+def _appendColumn(column, chunks):
+    if len(column) == 0 and len(chunks) == 1:
+        return chunks[0]
+    return numpy.concatenate((column, ) + tuple(chunks))
@@ -0,0 +1,112 @@
+# Copyright (c) 2018 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import collections
+import os
+
+import numpy
+
+##  Functions to keep the columns of layers in files.
+#
+#   The columns of the layers, as returned by LayerDecoder.decodeLayer(), are
+#   written to a directory with one file per column, with the rows of all
+#   layers after each other. To read them, the files are memory-mapped, so
+#   the operating system pages them in when they are used and can drop them
+#   again when memory runs low. The number of paths, lines and points of each
+#   layer tells where its rows are, so the caller has to keep those.
+#
+#   This only uses numpy and doesn't depend on the rest of Cura, so it can be
+#   called from a job thread.
+
+
+# Name of each column file -> (data type, shape of a row), in the order of the arguments of Layer.addPaths().
+_columns = collections.OrderedDict([
+    ("extruders", (numpy.int32, ())),  # Per path.
+    ("point_counts", (numpy.int32, ())),  # Per path.
+    ("line_types", (numpy.uint8, ())),  # Per line.
+    ("points", (numpy.float32, (3, ))),  # Per point.
+    ("line_widths", (numpy.float32, ())),  # Per line.
+    ("line_thicknesses", (numpy.float32, ())),  # Per line.
+    ("line_feedrates", (numpy.float32, ()))  # Per line.
+])
+
+
+##  Writes the columns of layers to the column files of a directory.
+#
+#   The files are created when the writer is created and should be closed
+#   with close(), or by using the writer in a with-statement.
+class ColumnFileWriter:
+    ##  Creates the column files.
+    #
+    #   \param directory The directory to write the files to. It must exist.
+    def __init__(self, directory):
+        self._files = []
+        try:
+            for name in _columns:
+                self._files.append(open(os.path.join(directory, name), "wb"))
+        except EnvironmentError:
+            self.close()
+            raise
+
+    ##  Append the columns of a layer to the files.
+    #
+    #   \param columns The columns of the layer, in the order of
+    #   Layer.addPaths().
+    #   \return The number of paths, lines and points of the layer, which are
+    #   needed to read the layer again.
+    def write(self, columns):
+        for (dtype, shape), column_file, column in zip(_columns.values(), self._files, columns):
+            column_file.write(numpy.ascontiguousarray(column, dtype = dtype).tobytes())
+        return len(columns[0]), len(columns[2]), len(columns[3])
+
+    def close(self):
+        for column_file in self._files:
+            column_file.close()
+        self._files = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
+
+
+##  Memory-map the column files of a directory.
+#
+#   \param directory The directory that the columns were written to.
+#   \param row_counts The number of paths, lines and points of each layer, in
+#   the order that the layers were written, as returned by
+#   ColumnFileWriter.write().
+#   \return A list with the columns of each layer, in the order of
+#   Layer.addPaths(). The columns are read-only.
+#   \exception EnvironmentError or ValueError if the files can't be mapped,
+#   e.g. when they are missing or too short.
+def readColumnFiles(directory, row_counts):
+    path_count = sum(counts[0] for counts in row_counts)
+    line_count = sum(counts[1] for counts in row_counts)
+    point_count = sum(counts[2] for counts in row_counts)
+    column_row_counts = {"extruders": path_count, "point_counts": path_count, "points": point_count}
+
+    column_maps = []
+    for name, (dtype, shape) in _columns.items():
+        row_count = column_row_counts.get(name, line_count)
+        if row_count == 0:  # Empty files can't be mapped.
+            column_maps.append(numpy.empty((0, ) + shape, dtype))
+            continue
+        column_maps.append(numpy.memmap(os.path.join(directory, name), dtype = dtype, mode = "r", shape = (row_count, ) + shape))
+    extruders, point_counts, line_types, points, line_widths, line_thicknesses, line_feedrates = column_maps
+
+    layers = []
+    path_offset = 0
+    line_offset = 0
+    point_offset = 0
+    for layer_path_count, layer_line_count, layer_point_count in row_counts:
+        path_slice = slice(path_offset, path_offset + layer_path_count)
+        line_slice = slice(line_offset, line_offset + layer_line_count)
+        point_slice = slice(point_offset, point_offset + layer_point_count)
+        layers.append((extruders[path_slice], point_counts[path_slice], line_types[line_slice], points[point_slice],
+                       line_widths[line_slice], line_thicknesses[line_slice], line_feedrates[line_slice]))
+        path_offset += layer_path_count
+        line_offset += layer_line_count
+        point_offset += layer_point_count
+    return layers
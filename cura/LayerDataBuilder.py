@@ -5,16 +5,45 @@ from .Layer import Layer
 from .LayerPolygon import LayerPolygon
 from UM.Mesh.MeshBuilder import MeshBuilder
 from .LayerData import LayerData
+from .CompactLayerData import CompactLayerData
 
 import numpy
 
 
 ## Builder class for constructing a LayerData object
 class LayerDataBuilder(MeshBuilder):
+    # Name of each layer mesh buffer -> (whether it has one row per vertex or per index, shape of a row, data type)
+    _buffer_layout = {
+        "vertices": (True, (3, ), numpy.float32),
+        "line_dimensions": (True, (2, ), numpy.float32),
+        "colors": (True, (4, ), numpy.float32),
+        "material_colors": (True, (4, ), numpy.float32),
+        "feedrates": (True, (), numpy.float32),
+        "extruders": (True, (), numpy.float32),
+        "line_types": (True, (), numpy.float32),
+        "indices": (False, (2, ), numpy.int32)
+    }
+
+    # The buffers of the layer mesh when it is kept compact, see setQuantizationBounds().
+    _compact_buffer_layout = {
+        "vertices": (True, (3, ), numpy.uint16),
+        "line_dimensions": (True, (2, ), numpy.float16),
+        "feedrates": (True, (), numpy.float16),
+        "extruders": (True, (), numpy.uint8),
+        "line_types": (True, (), numpy.uint8),
+        "indices": (False, (2, ), numpy.int32)
+    }
+
     def __init__(self):
         super().__init__()
         self._layers = {}
-        self._element_counts = {}
+        self._element_counts = {}  # Number of elements per layer, for the layers that are already in the layer mesh.
+
+        # Buffers of the layer mesh, kept between builds so that new layers can be appended to them.
+        self._buffers = {}
+        self._built_vertex_count = 0
+        self._built_index_count = 0
+        self._quantization_bounds = None  # The (minimum, maximum) to quantize vertices in, if the layer mesh is kept compact.
 
     def addLayer(self, layer):
         if layer not in self._layers:
@@ -24,8 +53,7 @@ class LayerDataBuilder(MeshBuilder):
         if layer not in self._layers:
             self.addLayer(layer)
 
-        p = LayerPolygon(self, polygon_type, data, line_width, line_thickness, line_feedrate)
-        self._layers[layer].polygons.append(p)
+        self._layers[layer].addPath(0, polygon_type, data, line_width, line_thickness, line_feedrate)
 
     def getLayer(self, layer):
         if layer in self._layers:
@@ -49,74 +77,207 @@ class LayerDataBuilder(MeshBuilder):
 
         self._layers[layer].setThickness(thickness)
 
+    ##  Keep the layer mesh in a compact form, with the vertices quantized to
+    #   16 bits within the given bounds.
+    #
+    #   Vertices outside of the bounds are clamped to them. Changing the bounds
+    #   makes the next build() rebuild the whole layer mesh.
+    #
+    #   \param minimum The lowest [x, y, z] of the vertices, or None to keep
+    #   the regular float layer mesh.
+    #   \param maximum The highest [x, y, z] of the vertices.
+    def setQuantizationBounds(self, minimum, maximum = None):
+        if minimum is None:
+            self._quantization_bounds = None
+        else:
+            self._quantization_bounds = (numpy.array(minimum, dtype = numpy.float32), numpy.array(maximum, dtype = numpy.float32))
+        self._resetBuffers()
+
     ##  Return the layer data as LayerData.
     #
+    #   The layer mesh is built incrementally: only the layers that were added
+    #   since the previous call are processed and appended to the vertex and
+    #   index buffers kept by this builder. This allows the layer data to be
+    #   built in chunks while layers are still being added. If a new layer
+    #   lies below a layer that was already built, the whole mesh is rebuilt
+    #   so the buffers stay sorted by layer number.
+    #
+    #   Layers are expected to be complete when they are built; paths added to
+    #   a layer after it was built are only picked up by a full rebuild.
+    #
+    #   When quantization bounds are set, a CompactLayerData is returned.
+    #
     #   \param material_color_map: [r, g, b, a] for each extruder row.
     #   \param line_type_brightness: compatibility layer view uses line type brightness of 0.5
     def build(self, material_color_map, line_type_brightness = 1.0):
+        new_layers = sorted(layer for layer in self._layers if layer not in self._element_counts)
+        if new_layers and self._element_counts and new_layers[0] < max(self._element_counts):
+            # A layer was inserted below the layers we already have, so start over.
+            self._resetBuffers()
+            new_layers = sorted(self._layers)
+
         vertex_count = 0
         index_count = 0
-        for layer, data in self._layers.items():
-            vertex_count += data.lineMeshVertexCount()
-            index_count += data.lineMeshElementCount()
-
-        vertices = numpy.empty((vertex_count, 3), numpy.float32)
-        line_dimensions = numpy.empty((vertex_count, 2), numpy.float32)
-        colors = numpy.empty((vertex_count, 4), numpy.float32)
-        indices = numpy.empty((index_count, 2), numpy.int32)
-        feedrates = numpy.empty((vertex_count), numpy.float32)
-        extruders = numpy.empty((vertex_count), numpy.float32)
-        line_types = numpy.empty((vertex_count), numpy.float32)
+        for layer in new_layers:
+            vertex_count += self._layers[layer].lineMeshVertexCount()
+            index_count += self._layers[layer].lineMeshElementCount()
+
+        vertex_begin = self._built_vertex_count
+        vertex_end = vertex_begin + vertex_count
+        index_begin = self._built_index_count
+        index_end = index_begin + index_count
+        self._reserveBuffers(vertex_end, index_end)
+
+        # The new layers are built into float buffers. Those are the buffers we keep, unless the mesh is kept compact.
+        if self._quantization_bounds is None:
+            new_buffers = {}
+            for name, (per_vertex, shape, dtype) in self._buffer_layout.items():
+                new_buffers[name] = self._buffers[name][vertex_begin:vertex_end] if per_vertex else self._buffers[name][index_begin:index_end]
+        else:
+            new_buffers = {}
+            for name, (per_vertex, shape, dtype) in self._buffer_layout.items():
+                if name != "material_colors":
+                    new_buffers[name] = numpy.empty(((vertex_count if per_vertex else index_count), ) + shape, dtype)
+
+        vertices = new_buffers["vertices"]
+        line_dimensions = new_buffers["line_dimensions"]
+        colors = new_buffers["colors"]
+        indices = new_buffers["indices"]
+        feedrates = new_buffers["feedrates"]
+        extruders = new_buffers["extruders"]
+        line_types = new_buffers["line_types"]
 
         vertex_offset = 0
         index_offset = 0
-        for layer, data in sorted(self._layers.items()):
+        for layer in new_layers:
+            data = self._layers[layer]
             ( vertex_offset, index_offset ) = data.build( vertex_offset, index_offset, vertices, colors, line_dimensions, feedrates, extruders, line_types, indices)
             self._element_counts[layer] = data.elementCount
+        indices += vertex_begin
+
+        self._built_vertex_count = vertex_end
+        self._built_index_count = index_end
+
+        # The LayerData gets its own copy of the bookkeeping, since this builder can still append layers to it.
+        element_counts = dict(self._element_counts)
+        layers = {layer: self._layers[layer] for layer in element_counts}
+
+        if self._quantization_bounds is not None:
+            return self._buildCompact(new_buffers, vertex_begin, index_begin, material_color_map, line_type_brightness, layers, element_counts)
 
-        self.addVertices(vertices)
         colors[:, 0:3] *= line_type_brightness
-        self.addColors(colors)
-        self.addIndices(indices.flatten())
 
         # Note: we're using numpy indexing here.
         # See also: https://docs.scipy.org/doc/numpy/reference/arrays.indexing.html
-        material_colors = numpy.zeros((line_dimensions.shape[0], 4), dtype=numpy.float32)
+        new_material_colors = new_buffers["material_colors"]
+        new_material_colors[:] = 0
         for extruder_nr in range(material_color_map.shape[0]):
-            material_colors[extruders == extruder_nr] = material_color_map[extruder_nr]
+            new_material_colors[extruders == extruder_nr] = material_color_map[extruder_nr]
         # Set material_colors with indices where line_types (also numpy array) == MoveCombingType
-        material_colors[line_types == LayerPolygon.MoveCombingType] = colors[line_types == LayerPolygon.MoveCombingType]
-        material_colors[line_types == LayerPolygon.MoveRetractionType] = colors[line_types == LayerPolygon.MoveRetractionType]
+        new_material_colors[line_types == LayerPolygon.MoveCombingType] = colors[line_types == LayerPolygon.MoveCombingType]
+        new_material_colors[line_types == LayerPolygon.MoveRetractionType] = colors[line_types == LayerPolygon.MoveRetractionType]
+
+        # The buffers are only appended to, or replaced when they are rebuilt, so the layer data can use views on them.
+        views = {}
+        for name, (per_vertex, shape, dtype) in self._buffer_layout.items():
+            view = self._buffers[name][:vertex_end] if per_vertex else self._buffers[name][:index_end].reshape((-1, ))
+            view.flags.writeable = False  # Makes sure that the mesh data doesn't make a copy of it.
+            views[name] = view
 
         attributes = {
             "line_dimensions": {
-                "value": line_dimensions,
+                "value": views["line_dimensions"],
                 "opengl_name": "a_line_dim",
                 "opengl_type": "vector2f"
                 },
             "extruders": {
-                "value": extruders,
+                "value": views["extruders"],
                 "opengl_name": "a_extruder",
                 "opengl_type": "float"  # Strangely enough, the type has to be float while it is actually an int.
                 },
             "colors": {
-                "value": material_colors,
+                "value": views["material_colors"],
                 "opengl_name": "a_material_color",
                 "opengl_type": "vector4f"
                 },
             "line_types": {
-                "value": line_types,
+                "value": views["line_types"],
                 "opengl_name": "a_line_type",
                 "opengl_type": "float"
                 },
             "feedrates": {
-                "value": feedrates,
+                "value": views["feedrates"],
                 "opengl_name": "a_feedrate",
                 "opengl_type": "float"
                 }
             }
 
-        return LayerData(vertices=self.getVertices(), normals=self.getNormals(), indices=self.getIndices(),
-                        colors=self.getColors(), uvs=self.getUVCoordinates(), file_name=self.getFileName(),
-                        center_position=self.getCenterPosition(), layers=self._layers,
-                        element_counts=self._element_counts, attributes=attributes)
+        return LayerData(vertices=views["vertices"], normals=self.getNormals(), indices=views["indices"],
+                        colors=views["colors"], uvs=self.getUVCoordinates(), file_name=self.getFileName(),
+                        center_position=self.getCenterPosition(), layers=layers,
+                        element_counts=element_counts, attributes=attributes)
+
+    ##  Store the new part of the layer mesh in the compact buffers and return
+    #   the compact layer data.
+    #
+    #   The compact buffers are only appended to, or replaced when they are
+    #   rebuilt, so the returned layer data can use views on them.
+    def _buildCompact(self, new_buffers, vertex_begin, index_begin, material_color_map, line_type_brightness, layers, element_counts):
+        minimum, maximum = self._quantization_bounds
+        scale = (maximum - minimum) / 65535
+        scale[scale <= 0] = 1  # Don't divide by zero for flat bounds.
+
+        vertex_end = self._built_vertex_count
+        index_end = self._built_index_count
+        quantized = numpy.rint((new_buffers["vertices"] - minimum) / scale)
+        self._buffers["vertices"][vertex_begin:vertex_end] = numpy.clip(quantized, 0, 65535)
+        for name in ["line_dimensions", "feedrates", "extruders", "line_types"]:
+            self._buffers[name][vertex_begin:vertex_end] = new_buffers[name]
+        self._buffers["indices"][index_begin:index_end] = new_buffers["indices"]
+
+        color_map = LayerPolygon.getColorMap().copy()
+        color_map[:, 0:3] *= line_type_brightness
+
+        views = {}
+        for name, (per_vertex, shape, dtype) in self._compact_buffer_layout.items():
+            view = self._buffers[name][:vertex_end] if per_vertex else self._buffers[name][:index_end].reshape((-1, ))
+            view.flags.writeable = False  # Makes sure that the mesh data doesn't make a copy of it.
+            views[name] = view
+
+        return CompactLayerData(views["vertices"], minimum, scale, views["line_dimensions"], views["feedrates"],
+                                views["extruders"], views["line_types"], color_map, material_color_map,
+                                normals = self.getNormals(), indices = views["indices"], uvs = self.getUVCoordinates(),
+                                file_name = self.getFileName(), center_position = self.getCenterPosition(),
+                                layers = layers, element_counts = element_counts)
+
+    ##  Forget the layer mesh that was built so far.
+    #
+    #   New buffers are made for the next build, since the layer data that was
+    #   returned before may still use the old ones.
+    def _resetBuffers(self):
+        self._element_counts = {}
+        self._buffers = {}
+        self._built_vertex_count = 0
+        self._built_index_count = 0
+
+    ##  Make sure the buffers kept between builds can hold the given number of
+    #   vertices and indices.
+    #
+    #   Buffers grow by at least a factor two, so that appending layers in
+    #   small chunks does not copy the whole mesh every time.
+    def _reserveBuffers(self, vertex_count, index_count):
+        buffer_layout = self._buffer_layout if self._quantization_bounds is None else self._compact_buffer_layout
+        for name, (per_vertex, shape, dtype) in buffer_layout.items():
+            required = vertex_count if per_vertex else index_count
+            old_buffer = self._buffers.get(name)
+            if old_buffer is not None and len(old_buffer) >= required:
+                continue
+
+            capacity = required
+            if old_buffer is not None:
+                capacity = max(required, 2 * len(old_buffer))
+            new_buffer = numpy.empty((capacity, ) + shape, dtype)
+            if old_buffer is not None:
+                used = self._built_vertex_count if per_vertex else self._built_index_count
+                new_buffer[:used] = old_buffer[:used]
+            self._buffers[name] = new_buffer
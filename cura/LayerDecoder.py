@@ -0,0 +1,92 @@
+# Copyright (c) 2018 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import numpy
+
+##  Functions to decode the sliced layers that CuraEngine sends.
+#
+#   Decoding a layer takes two steps. extractLayer() copies the fields of a
+#   layer message into plain Python objects. It has to be called on the thread
+#   that reads the messages. decodeLayer() turns those into the columns of a
+#   Layer. It only uses numpy and doesn't depend on the rest of Cura, so it can
+#   run in a thread pool or in a worker process.
+
+
+##  Copy the data of a layer message into plain Python objects.
+#
+#   \param layer The cura.proto.LayerOptimized message.
+#   \return A tuple of the layer ID, height, thickness and a list of paths.
+#   Each path is a tuple of its extruder, point type and the raw bytes of its
+#   points, line types, line widths, line thicknesses and line feedrates.
+def extractLayer(layer):
+    paths = []
+    for p in range(layer.repeatedMessageCount("path_segment")):
+        polygon = layer.getRepeatedMessage("path_segment", p)
+        paths.append((polygon.extruder, polygon.point_type, polygon.points, polygon.line_type, polygon.line_width, polygon.line_thickness, polygon.line_feedrate))
+    return layer.id, layer.height, layer.thickness, paths
+
+
+##  Decode an extracted layer into the columns of a Layer.
+#
+#   The bytes of all paths are joined per field and numpy arrays are made as
+#   views over them, so the line data is not copied again after that. Only
+#   the points are copied once, to swap their axes into the scene's axes.
+#   Since the line columns are views over bytes, they are read-only.
+#
+#   \param extracted_layer A layer as returned by extractLayer().
+#   \return A tuple of the layer ID, height, thickness and the columns of the
+#   layer, as accepted by Layer.addPaths(): the extruder and number of points
+#   of each path, the line types, the points, the line widths, the line
+#   thicknesses and the line feedrates.
+def decodeLayer(extracted_layer):
+    layer_id, layer_height, layer_thickness, paths = extracted_layer
+
+    extruders = numpy.fromiter((path[0] for path in paths), dtype = numpy.int32, count = len(paths))
+    point_types = numpy.fromiter((path[1] for path in paths), dtype = numpy.int32, count = len(paths))
+    point_components = numpy.where(point_types == 0, 2, 3)  # Point2D or Point3D.
+    point_counts = (numpy.fromiter((len(path[2]) for path in paths), dtype = numpy.int32, count = len(paths)) // 4) // point_components
+
+    # Joining the bytes of a single path returns the bytes themselves, so a layer with only one path is not copied at all.
+    line_types = _viewBytes([path[3] for path in paths], "u1")
+    line_widths = _viewBytes([path[4] for path in paths], "f4")
+    line_thicknesses = _viewBytes([path[5] for path in paths], "f4")
+    line_feedrates = _viewBytes([path[6] for path in paths], "f4")
+
+    # Create a new 3D-array and copy the points over with the axes swapped, inserting the right height for 2D points.
+    new_points = numpy.empty((int(numpy.sum(point_counts)), 3), numpy.float32)
+    if numpy.all(point_types == 0):  # All Point2D, which is what the engine normally sends.
+        points = _viewBytes([path[2] for path in paths], "f4").reshape((-1, 2))
+        new_points[:, 0] = points[:, 0]
+        new_points[:, 1] = layer_height / 1000  # layer height value is in backend representation
+        numpy.negative(points[:, 1], out = new_points[:, 2])
+    elif numpy.all(point_types != 0):  # All Point3D.
+        points = _viewBytes([path[2] for path in paths], "f4").reshape((-1, 3))
+        new_points[:, 0] = points[:, 0]
+        new_points[:, 1] = points[:, 2]
+        numpy.negative(points[:, 1], out = new_points[:, 2])
+    else:  # A mix of both, so fill in the points path by path.
+        offset = 0
+        for path, point_count in zip(paths, point_counts):
+            path_points = new_points[offset:offset + point_count]
+            if path[1] == 0:  # Point2D
+                points = numpy.frombuffer(path[2], dtype = "f4").reshape((-1, 2))
+                path_points[:, 0] = points[:, 0]
+                path_points[:, 1] = layer_height / 1000  # layer height value is in backend representation
+                numpy.negative(points[:, 1], out = path_points[:, 2])
+            else:  # Point3D
+                points = numpy.frombuffer(path[2], dtype = "f4").reshape((-1, 3))
+                path_points[:, 0] = points[:, 0]
+                path_points[:, 1] = points[:, 2]
+                numpy.negative(points[:, 1], out = path_points[:, 2])
+            offset += point_count
+
+    return layer_id, layer_height, layer_thickness, (extruders, point_counts, line_types, new_points, line_widths, line_thicknesses, line_feedrates)
+
+
+##  Make a numpy array that views the bytes of a field of all paths.
+#
+#   \param chunks The bytes of the field, per path.
+#   \param dtype The data type of the elements.
+#   \return A read-only array over the joined bytes.
+def _viewBytes(chunks, dtype):
+    return numpy.frombuffer(b"".join(chunks), dtype = dtype)
@@ -21,7 +21,11 @@ class LayerPolygon:
     __number_of_types = 11
 
     __jump_map = numpy.logical_or(numpy.logical_or(numpy.arange(__number_of_types) == NoneType, numpy.arange(__number_of_types) == MoveCombingType), numpy.arange(__number_of_types) == MoveRetractionType)
-    
+
+    # When type is used as index returns true if type == LayerPolygon.InfillType or type == LayerPolygon.SkinType or type == LayerPolygon.SupportInfillType
+    # Should be generated in better way, not hardcoded.
+    __infill_or_skin_type_map = numpy.array([0, 0, 0, 1, 0, 0, 1, 1, 0, 0, 1], dtype=numpy.bool)
+
     ##  LayerPolygon, used in ProcessSlicedLayersJob
     #   \param extruder
     #   \param line_types array with line_types
@@ -55,9 +59,7 @@ class LayerPolygon:
         self._color_map = LayerPolygon.getColorMap()
         self._colors = self._color_map[self._types]
         
-        # When type is used as index returns true if type == LayerPolygon.InfillType or type == LayerPolygon.SkinType or type == LayerPolygon.SupportInfillType
-        # Should be generated in better way, not hardcoded.
-        self._isInfillOrSkinTypeMap = numpy.array([0, 0, 0, 1, 0, 0, 1, 1, 0, 0, 1], dtype=numpy.bool)
+        self._isInfillOrSkinTypeMap = self.__infill_or_skin_type_map
         
         self._build_cache_line_mesh_mask = None
         self._build_cache_needed_points = None
@@ -218,6 +220,23 @@ class LayerPolygon:
 
         return normals
 
+    ##  The number of line types there are.
+    @classmethod
+    def getNumberOfTypes(cls):
+        return cls.__number_of_types
+
+    ##  Array with a boolean per line type, true if lines of that type are
+    #   jumps instead of extrusions.
+    @classmethod
+    def getJumpMap(cls):
+        return cls.__jump_map
+
+    ##  Array with a boolean per line type, true if lines of that type are
+    #   infill or skin.
+    @classmethod
+    def getInfillOrSkinTypeMap(cls):
+        return cls.__infill_or_skin_type_map
+
     __color_map = None # type: numpy.ndarray[Any]
 
     ##  Gets the instance of the VersionUpgradeManager, or creates one.
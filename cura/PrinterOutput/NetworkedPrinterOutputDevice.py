@@ -4,12 +4,13 @@
 from UM.Application import Application
 from UM.Logger import Logger
 
+from cura.GCodeBuffer import GCodeBuffer
 from cura.PrinterOutputDevice import PrinterOutputDevice, ConnectionState
 
 from PyQt5.QtNetwork import QHttpMultiPart, QHttpPart, QNetworkRequest, QNetworkAccessManager, QNetworkReply
 from PyQt5.QtCore import pyqtProperty, pyqtSignal, pyqtSlot, pyqtSignal, QUrl, QCoreApplication
 from time import time
-from typing import Callable, Any, Optional, Dict, Tuple
+from typing import Callable, Any, Optional, Dict, Tuple, Union
 from enum import IntEnum
 from typing import List
 
@@ -51,7 +52,7 @@ class NetworkedPrinterOutputDevice(PrinterOutputDevice):
 
         self._sending_gcode = False
         self._compressing_gcode = False
-        self._gcode = []                    # type: List[str]
+        self._gcode = []                    # type: Union[List[str], GCodeBuffer]
 
         self._connection_state_before_timeout = None    # type: Optional[ConnectionState]
 
@@ -79,8 +80,10 @@ class NetworkedPrinterOutputDevice(PrinterOutputDevice):
     def authenticationState(self) -> int:
         return self._authentication_state
 
-    def _compressDataAndNotifyQt(self, data_to_append: str) -> bytes:
-        compressed_data = gzip.compress(data_to_append.encode("utf-8"))
+    def _compressDataAndNotifyQt(self, data_to_append: Union[str, bytes]) -> bytes:
+        if isinstance(data_to_append, str):
+            data_to_append = data_to_append.encode("utf-8")
+        compressed_data = gzip.compress(data_to_append)
         self._progress_message.setProgress(-1)  # Tickle the message so that it's clear that it's still being used.
         QCoreApplication.processEvents()  # Ensure that the GUI does not freeze.
 
@@ -90,6 +93,12 @@ class NetworkedPrinterOutputDevice(PrinterOutputDevice):
         return compressed_data
 
     def _compressGCode(self) -> Optional[bytes]:
+        # The g-code may be compressed already, right after it was sliced. See the "backend/precompress_gcode" preference.
+        if isinstance(self._gcode, GCodeBuffer):
+            compressed_gcode = self._gcode.getCompressed()
+            if compressed_gcode is not None:
+                return compressed_gcode
+
         self._compressing_gcode = True
 
         ## Mash the data into single string
@@ -98,7 +107,12 @@ class NetworkedPrinterOutputDevice(PrinterOutputDevice):
         batched_lines = []
         batched_lines_count = 0
 
-        for line in self._gcode:
+        # The chunks of a GCodeBuffer are compressed as they are, without decoding them.
+        if isinstance(self._gcode, GCodeBuffer):
+            lines = self._gcode.iterBytes()
+        else:
+            lines = (line.encode("utf-8") for line in self._gcode)
+        for line in lines:
             if not self._compressing_gcode:
                 self._progress_message.hide()
                 # Stop trying to zip / send as abort was called.
@@ -110,13 +124,13 @@ class NetworkedPrinterOutputDevice(PrinterOutputDevice):
             batched_lines_count += len(line)
 
             if batched_lines_count >= max_chars_per_line:
-                file_data_bytes_list.append(self._compressDataAndNotifyQt("".join(batched_lines)))
+                file_data_bytes_list.append(self._compressDataAndNotifyQt(b"".join(batched_lines)))
                 batched_lines = []
                 batched_lines_count = 0
 
         # Don't miss the last batch (If any)
         if len(batched_lines) != 0:
-            file_data_bytes_list.append(self._compressDataAndNotifyQt("".join(batched_lines)))
+            file_data_bytes_list.append(self._compressDataAndNotifyQt(b"".join(batched_lines)))
 
         self._compressing_gcode = False
         return b"".join(file_data_bytes_list)
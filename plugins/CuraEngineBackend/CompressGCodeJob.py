@@ -0,0 +1,27 @@
+# Copyright (c) 2018 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+from time import time
+
+from UM.Job import Job
+from UM.Logger import Logger
+
+from cura.GCodeBuffer import GCodeBuffer
+
+
+##  Compresses the g-code of a build plate that was just sliced, so that it
+#   can be sent to a networked printer right away. See GCodeBuffer.compress.
+class CompressGCodeJob(Job):
+    def __init__(self, gcode_list: GCodeBuffer) -> None:
+        super().__init__()
+        self._gcode_list = gcode_list
+        self._abort_requested = False
+
+    ##  Aborts the job, e.g. because the g-code is going to be sliced again.
+    def abort(self) -> None:
+        self._abort_requested = True
+
+    def run(self) -> None:
+        start_time = time()
+        if self._gcode_list.compress(lambda: self._abort_requested) is not None:
+            Logger.log("d", "Compressing the g-code took %s seconds", time() - start_time)
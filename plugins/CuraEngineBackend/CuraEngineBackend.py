@@ -15,13 +15,22 @@ from UM.Qt.Duration import DurationFormat
 from PyQt5.QtCore import QObject, pyqtSlot
 
 from collections import defaultdict
+from cura.GCodeBuffer import GCodeBuffer
 from cura.Settings.ExtruderManager import ExtruderManager
 from . import ProcessSlicedLayersJob
+from .CompressGCodeJob import CompressGCodeJob
+from .StoreLayersJob import StoreLayersJob
 from . import StartSliceJob
+from .LayerCache import LayerCache
+from .SliceResultCache import SliceResult, SliceResultCache
+from .SettingsSnapshot import SettingsSnapshot
+from .SliceScheduler import SliceScheduler
+from .EngineWorker import EngineWorker
 
 import os
+import re
 import sys
-from time import time
+from time import sleep, time
 
 from PyQt5.QtCore import QTimer
 
@@ -30,6 +39,10 @@ import Arcus
 from UM.i18n import i18nCatalog
 catalog = i18nCatalog("cura")
 
+##  The tokens in the g-code that are replaced once slicing is finished.
+_gcode_token_pattern = re.compile(r"\{(print_time|filament_amount|filament_weight|filament_cost|jobname)\}")
+_gcode_token_bytes_pattern = re.compile(_gcode_token_pattern.pattern.encode("utf-8"))
+
 
 class CuraEngineBackend(QObject, Backend):
 
@@ -80,6 +93,27 @@ class CuraEngineBackend(QObject, Backend):
         self._stored_layer_data = []
         self._stored_optimized_layer_data = {}  # key is build plate number, then arrays are stored until they go to the ProcessSlicesLayersJob
 
+        # Optionally, the layers are stored on disk instead of in memory. See LayerCache.
+        self._layer_cache = LayerCache(os.path.join(Resources.getCacheStoragePath(), "layers"))
+        self._caching_build_plates = set()  # The build plates that are being sliced with their layers going to the layer cache.
+        self._store_layers_jobs = {}  # Build plate number -> StoreLayersJob that writes its layers to the layer cache.
+
+        # The results of the last slices, so that slicing the same thing again doesn't need the engine.
+        self._slice_result_cache = SliceResultCache(0)
+        self._slice_fingerprints = {}  # Build plate number -> fingerprint of the running slice, see StartSliceJob.getFingerprint().
+        self._token_chunks = {}  # Build plate number -> set of the indices of the g-code chunks that contain tokens.
+        self._print_time_estimates = {}  # Build plate number -> the print times and material amounts the engine sent for the running slice.
+
+        # Additional engine processes, to slice several build plates at the same time. See EngineWorker.
+        self._engine_workers = []
+        self._slice_progress = 0.0  # Progress of the slice of our own engine.
+
+        # Engine processes that are started and connected already, to replace our own engine when it is restarted.
+        self._warm_engines = []
+        self._cold_engine_starts = 0
+        self._warm_engine_starts = 0
+        self._next_engine_port = 0  # The additional and warm engines get ports after that of our own engine, see _takeEnginePort().
+
         self._scene = self._application.getController().getScene()
         self._scene.sceneChanged.connect(self._onSceneChanged)
 
@@ -92,6 +126,7 @@ class CuraEngineBackend(QObject, Backend):
         # to start the auto-slicing timer again.
         #
         self._global_container_stack = None
+        self._settings_snapshots = {}  # Stack ID -> SettingsSnapshot of the global and extruder stacks.
 
         # Listeners for receiving messages from the back-end.
         self._message_handlers["cura.proto.Layer"] = self._onLayerMessage
@@ -118,9 +153,31 @@ class CuraEngineBackend(QObject, Backend):
         self._postponed_scene_change_sources = []  # scene change is postponed (by a tool)
 
         self._slice_start_time = None
+        self._engine_start_time = None  # When the slice message was sent to our own engine.
+        self._process_layers_start_time = None
+        self._slice_scheduler = SliceScheduler()  # Sizes the auto-slicing delay to how long slicing takes.
         self._is_disabled = False
 
         Application.getInstance().getPreferences().addPreference("general/auto_slice", False)
+        # Decode sliced layers on the job thread ("none"), in a pool of threads ("thread") or of worker processes
+        # ("process"). A worker count of 0 uses one worker per CPU core.
+        Application.getInstance().getPreferences().addPreference("backend/layer_processing_pool", "none")
+        Application.getInstance().getPreferences().addPreference("backend/layer_processing_workers", 0)
+        # Store sliced layers on disk, and keep the layer data of at most this many build plates in the scene.
+        Application.getInstance().getPreferences().addPreference("backend/layer_cache_on_disk", False)
+        Application.getInstance().getPreferences().addPreference("backend/layer_cache_resident_plates", 2)
+        # Remember the results of this many slices, optionally also on disk. 0 disables it.
+        Application.getInstance().getPreferences().addPreference("backend/slice_result_cache_size", 0)
+        Application.getInstance().getPreferences().addPreference("backend/slice_result_cache_on_disk", False)
+        self._updateSliceResultCache()
+        # The number of engine processes that slice build plates at the same time.
+        Application.getInstance().getPreferences().addPreference("backend/slice_workers", 1)
+        # The number of idle engine processes to keep ready for when the engine needs to be restarted.
+        Application.getInstance().getPreferences().addPreference("backend/warm_engines", 1)
+        # Compress the g-code of the active build plate after slicing, so that it can be sent to a networked printer
+        # right away.
+        Application.getInstance().getPreferences().addPreference("backend/precompress_gcode", False)
+        self._compress_gcode_job = None  # The job that compresses the g-code of the active build plate, if any.
 
         self._use_timer = False
         # When you update a setting and other settings get changed through inheritance, many propertyChanged signals are fired.
@@ -128,7 +185,7 @@ class CuraEngineBackend(QObject, Backend):
         # TODO: Properly group propertyChanged signals by whether they are triggered by the same user interaction.
         self._change_timer = QTimer()
         self._change_timer.setSingleShot(True)
-        self._change_timer.setInterval(500)
+        self._change_timer.setInterval(self._slice_scheduler.getDebounceInterval())
         self.determineAutoSlicing()
         Application.getInstance().getPreferences().preferenceChanged.connect(self._onPreferencesChanged)
 
@@ -156,6 +213,8 @@ class CuraEngineBackend(QObject, Backend):
         self._machine_error_checker = self._application.getMachineErrorChecker()
         self._machine_error_checker.errorCheckFinished.connect(self._onStackErrorCheckFinished)
 
+        self._updateWarmEngines()
+
     ##  Terminate the engine process.
     #
     #   This function should terminate the engine process.
@@ -163,13 +222,23 @@ class CuraEngineBackend(QObject, Backend):
     def close(self):
         # Terminate CuraEngine if it is still running at this point
         self._terminate()
+        for worker in self._engine_workers + self._warm_engines:
+            worker.close()
+        self._engine_workers = []
+        self._warm_engines = []
+        self._abortStoreLayersJobs()
+        self._layer_cache.clear()
 
     ##  Get the command that is used to call the engine.
     #   This is useful for debugging and used to actually start the engine.
+    #   \param port The port the engine should connect to. Defaults to the port
+    #   of our own socket.
     #   \return list of commands and args / parameters.
-    def getEngineCommand(self):
+    def getEngineCommand(self, port = None):
+        if port is None:
+            port = self._port
         json_path = Resources.getPath(Resources.DefinitionContainers, "fdmprinter.def.json")
-        return [Application.getInstance().getPreferences().getValue("backend/location"), "connect", "127.0.0.1:{0}".format(self._port), "-j", json_path, ""]
+        return [Application.getInstance().getPreferences().getValue("backend/location"), "connect", "127.0.0.1:{0}".format(port), "-j", json_path, ""]
 
     ##  Emitted when we get a message containing print duration and material amount.
     #   This also implies the slicing has finished.
@@ -185,16 +254,32 @@ class CuraEngineBackend(QObject, Backend):
 
     @pyqtSlot()
     def stopSlicing(self):
+        # The build plates that the additional engines were slicing still need to be sliced.
+        for worker in self._engine_workers:
+            if worker.isBusy():
+                build_plate_number = worker.getBuildPlate()
+                worker.cancelSlice()
+                self._discardSliceResult(build_plate_number)
+                if build_plate_number not in self._build_plates_to_be_sliced:
+                    self._build_plates_to_be_sliced.insert(0, build_plate_number)
+        self._stopOwnSlice()
+
+    ##  Stop the slice of our own engine, leaving the additional engines alone.
+    def _stopOwnSlice(self):
         self.backendStateChange.emit(BackendState.NotStarted)
         if self._slicing:  # We were already slicing. Stop the old job.
             self._terminate()
-            self._createSocket()
+            self._startFreshEngine()
 
         if self._process_layers_job:  # We were processing layers. Stop that, the layers are going to change soon.
             Logger.log("d", "Aborting process layers job...")
             self._process_layers_job.abort()
             self._process_layers_job = None
 
+        if self._compress_gcode_job:  # The g-code is going to change.
+            self._compress_gcode_job.abort()
+            self._compress_gcode_job = None
+
         if self._error_message:
             self._error_message.hide()
 
@@ -227,10 +312,14 @@ class CuraEngineBackend(QObject, Backend):
         num_objects = self._numObjectsPerBuildPlate()
 
         self._stored_layer_data = []
-        self._stored_optimized_layer_data[build_plate_to_be_sliced] = []
+        if self._slicing and self._start_slice_job_build_plate == build_plate_to_be_sliced:
+            # An outdated slice of this build plate may still be running. Stopping it throws away its result, so that
+            # has to happen before the result of this slice is prepared.
+            self._stopOwnSlice()
+        self._startSliceResult(build_plate_to_be_sliced)
 
         if build_plate_to_be_sliced not in num_objects or num_objects[build_plate_to_be_sliced] == 0:
-            self._scene.gcode_dict[build_plate_to_be_sliced] = []
+            self._scene.gcode_dict[build_plate_to_be_sliced] = GCodeBuffer()
             Logger.log("d", "Build plate %s has no objects to be sliced, skipping", build_plate_to_be_sliced)
             if self._build_plates_to_be_sliced:
                 self.slice()
@@ -240,15 +329,16 @@ class CuraEngineBackend(QObject, Backend):
             Application.getInstance().getPrintInformation().setToZeroPrintInformation(build_plate_to_be_sliced)
 
         if self._process is None:
-            self._createSocket()
-        self.stopSlicing()
+            self._startFreshEngine()
+        self._stopOwnSlice()  # The additional engines may still be slicing other build plates.
         self._engine_is_fresh = False  # Yes we're going to use the engine
 
         self.processingProgress.emit(0.0)
         self.backendStateChange.emit(BackendState.NotStarted)
 
-        self._scene.gcode_dict[build_plate_to_be_sliced] = []  #[] indexed by build plate number
+        self._scene.gcode_dict[build_plate_to_be_sliced] = GCodeBuffer()  # indexed by build plate number
         self._slicing = True
+        self._slice_progress = 0.0
         self.slicingStarted.emit()
 
         self.determineAutoSlicing()  # Switch timer on or off if appropriate
@@ -257,16 +347,21 @@ class CuraEngineBackend(QObject, Backend):
         self._start_slice_job = StartSliceJob.StartSliceJob(slice_message)
         self._start_slice_job_build_plate = build_plate_to_be_sliced
         self._start_slice_job.setBuildPlate(self._start_slice_job_build_plate)
+        self._start_slice_job.setSettingsSnapshots(self._settings_snapshots)
+        self._start_slice_job.setSliceResultCache(self._slice_result_cache)
         self._start_slice_job.start()
         self._start_slice_job.finished.connect(self._onStartSliceCompleted)
 
+        # Let the additional engines slice the next build plates, if there are any.
+        self._startEngineWorkers()
+
     ##  Terminate the engine process.
     #   Start the engine process by calling _createSocket()
     def _terminate(self):
         self._slicing = False
+        self._engine_start_time = None
         self._stored_layer_data = []
-        if self._start_slice_job_build_plate in self._stored_optimized_layer_data:
-            del self._stored_optimized_layer_data[self._start_slice_job_build_plate]
+        self._discardSliceResult(self._start_slice_job_build_plate)
         if self._start_slice_job is not None:
             self._start_slice_job.cancel()
 
@@ -399,7 +494,18 @@ class CuraEngineBackend(QObject, Backend):
             self._invokeSlice()
             return
 
+        # If the same slice was done before, use its result instead of slicing again.
+        self._slice_fingerprints[self._start_slice_job_build_plate] = job.getFingerprint()
+        slice_result = self._slice_result_cache.get(job.getFingerprint(), job.getStoredSliceResult())
+        if slice_result is not None:
+            Logger.log("d", "Using the stored result of an identical slice.")
+            self._restoreSliceResult(self._start_slice_job_build_plate, slice_result)
+            self._onSlicingFinishedMessage(None)
+            return
+
         # Preparation completed, send it to the backend.
+        self._recordSliceDuration(self._start_slice_job_build_plate, "start", time() - self._slice_start_time)
+        self._engine_start_time = time()
         self._socket.sendMessage(job.getSliceMessage())
 
         # Notify the user that it's now up to the backend to do it's job
@@ -459,6 +565,9 @@ class CuraEngineBackend(QObject, Backend):
         # current layer data is removed so the previous data is not rendered - CURA-4821
         if source.callDecoration("isBlockSlicing") and source.callDecoration("getLayerData"):
             self._stored_optimized_layer_data = {}
+            self._abortStoreLayersJobs()
+            self._layer_cache.clear()
+            self._caching_build_plates.clear()
 
         build_plate_changed = set()
         source_build_plate_number = source.callDecoration("getBuildPlateNumber")
@@ -490,7 +599,7 @@ class CuraEngineBackend(QObject, Backend):
                 self._postponed_scene_change_sources.append(source)
             return
 
-        self.stopSlicing()
+        self._stopSlicingForChange()
         for build_plate_number in build_plate_changed:
             if build_plate_number not in self._build_plates_to_be_sliced:
                 self._build_plates_to_be_sliced.append(build_plate_number)
@@ -515,7 +624,7 @@ class CuraEngineBackend(QObject, Backend):
             return
 
         self._terminate()
-        self._createSocket()
+        self._startFreshEngine()
 
         if error.getErrorCode() not in [Arcus.ErrorCode.BindFailedError, Arcus.ErrorCode.ConnectionResetError, Arcus.ErrorCode.Debug]:
             Logger.log("w", "A socket error caused the connection to be reset")
@@ -532,9 +641,38 @@ class CuraEngineBackend(QObject, Backend):
             if build_plate_number not in self._build_plates_to_be_sliced:
                 self._build_plates_to_be_sliced.append(build_plate_number)
 
+    ##  Stop slicing because the scene or the settings changed.
+    #
+    #   If our own engine is expected to finish its slice before the next slice
+    #   would start anyway, it is allowed to finish. The next slice stops it if
+    #   it turns out to take longer. That only applies when auto-slicing: the
+    #   finished slice would start the next one, and without the timer nothing
+    #   should be sliced before the user asks for it.
+    def _stopSlicingForChange(self):
+        if (self._use_timer and self._slicing and self._start_slice_job is None and self._engine_start_time is not None and
+                not any(worker.isBusy() for worker in self._engine_workers)):
+            elapsed = time() - self._engine_start_time
+            if self._slice_scheduler.shouldFinishSlice(self._start_slice_job_build_plate, elapsed, self._slice_progress):
+                Logger.log("d", "Letting the slice of build plate %s finish, it is expected to take %.2f more seconds.",
+                           self._start_slice_job_build_plate,
+                           self._slice_scheduler.getEstimatedRemainingDuration(self._start_slice_job_build_plate, elapsed, self._slice_progress))
+                return
+        self.stopSlicing()
+
+    ##  Remember how long a phase of slicing a build plate took, and adjust the
+    #   auto-slicing delay to it.
+    #
+    #   \param phase One of SliceScheduler.Phases.
+    #   \param duration The duration in seconds.
+    def _recordSliceDuration(self, build_plate_number, phase, duration):
+        self._slice_scheduler.recordDuration(build_plate_number, phase, duration)
+        self._change_timer.setInterval(self._slice_scheduler.getDebounceInterval())
+        Logger.log("d", "Phase %s of slicing build plate %s took %.2f seconds, slicing %s ms after changes now.",
+                   phase, build_plate_number, duration, self._change_timer.interval())
+
     ##  Convenient function: mark everything to slice, emit state and clear layer data
     def needsSlicing(self):
-        self.stopSlicing()
+        self._stopSlicingForChange()
         self.markSliceAll()
         self.processingProgress.emit(0.0)
         self.backendStateChange.emit(BackendState.NotStarted)
@@ -546,6 +684,12 @@ class CuraEngineBackend(QObject, Backend):
     # \param instance The setting instance that has changed.
     # \param property The property of the setting instance that has changed.
     def _onSettingChanged(self, instance, property):
+        if property in ("value", "limit_to_extruder"):
+            # Setting values can depend on settings in other stacks, so the affected settings are evaluated again in all stacks.
+            affected_keys = SettingsSnapshot.getAffectedKeys(self._global_container_stack, instance)
+            for snapshot in self._settings_snapshots.values():
+                snapshot.invalidate(affected_keys)
+
         if property == "value":  # Only reslice if the value has changed.
             self.needsSlicing()
             self._onChanged()
@@ -573,17 +717,30 @@ class CuraEngineBackend(QObject, Backend):
     #
     #   \param message The protobuf message containing sliced layer data.
     def _onOptimizedLayerMessage(self, message):
-        if self._start_slice_job_build_plate not in self._stored_optimized_layer_data:
-            self._stored_optimized_layer_data[self._start_slice_job_build_plate] = []
-        self._stored_optimized_layer_data[self._start_slice_job_build_plate].append(message)
+        self._storeOptimizedLayer(self._start_slice_job_build_plate, message)
+
+    def _storeOptimizedLayer(self, build_plate_number, message):
+        if build_plate_number not in self._stored_optimized_layer_data:
+            self._stored_optimized_layer_data[build_plate_number] = []
+        # Layers that go to the layer cache are written to it once the slice is finished, see _startStoreLayersJob().
+        self._stored_optimized_layer_data[build_plate_number].append(message)
 
     ##  Called when a progress message is received from the engine.
     #
     #   \param message The protobuf message containing the slicing progress.
     def _onProgressMessage(self, message):
-        self.processingProgress.emit(message.amount)
+        self._slice_progress = message.amount
+        self._emitProgress()
         self.backendStateChange.emit(BackendState.Processing)
 
+    ##  Emit the progress of all running slices together.
+    def _emitProgress(self):
+        progresses = [worker.getProgress() for worker in self._engine_workers if worker.isBusy()]
+        if self._slicing:
+            progresses.append(self._slice_progress)
+        if progresses:
+            self.processingProgress.emit(sum(progresses) / len(progresses))
+
     def _invokeSlice(self):
         if self._use_timer:
             # if the error check is scheduled, wait for the error check finish signal to trigger auto-slice,
@@ -601,32 +758,28 @@ class CuraEngineBackend(QObject, Backend):
     #
     #   \param message The protobuf message signalling that slicing is finished.
     def _onSlicingFinishedMessage(self, message):
-        self.backendStateChange.emit(BackendState.Done)
-        self.processingProgress.emit(1.0)
+        if message is not None and self._engine_start_time is not None:  # Not restored from an identical slice.
+            self._recordSliceDuration(self._start_slice_job_build_plate, "engine", time() - self._engine_start_time)
+        self._engine_start_time = None
 
-        gcode_list = self._scene.gcode_dict[self._start_slice_job_build_plate]
-        for index, line in enumerate(gcode_list):
-            replaced = line.replace("{print_time}", str(Application.getInstance().getPrintInformation().currentPrintTime.getDisplayString(DurationFormat.Format.ISO8601)))
-            replaced = replaced.replace("{filament_amount}", str(Application.getInstance().getPrintInformation().materialLengths))
-            replaced = replaced.replace("{filament_weight}", str(Application.getInstance().getPrintInformation().materialWeights))
-            replaced = replaced.replace("{filament_cost}", str(Application.getInstance().getPrintInformation().materialCosts))
-            replaced = replaced.replace("{jobname}", str(Application.getInstance().getPrintInformation().jobName))
+        self._slicing = False
+        if self._start_slice_job_build_plate in self._build_plates_to_be_sliced:
+            # Something changed while finishing this slice. Its result is only kept for identical slices later on.
+            self.backendStateChange.emit(BackendState.NotStarted)
+        elif any(worker.isBusy() for worker in self._engine_workers):  # Other build plates are still being sliced.
+            self._emitProgress()
+        else:
+            self.backendStateChange.emit(BackendState.Done)
+            self.processingProgress.emit(1.0)
 
-            gcode_list[index] = replaced
+        self._finishSliceResult(self._start_slice_job_build_plate)
 
-        self._slicing = False
         Logger.log("d", "Slicing took %s seconds", time() - self._slice_start_time )
         Logger.log("d", "Number of models per buildplate: %s", dict(self._numObjectsPerBuildPlate()))
 
         # See if we need to process the sliced layers job.
-        active_build_plate = Application.getInstance().getMultiBuildPlateModel().activeBuildPlate
-        if (
-            self._layer_view_active and
-            (self._process_layers_job is None or not self._process_layers_job.isRunning()) and
-            active_build_plate == self._start_slice_job_build_plate and
-            active_build_plate not in self._build_plates_to_be_sliced):
-
-            self._startProcessSlicedLayersJob(active_build_plate)
+        self._processLayersIfShown(self._start_slice_job_build_plate)
+        self._compressGCodeIfEnabled(self._start_slice_job_build_plate)
         # self._onActiveViewChanged()
         self._start_slice_job_build_plate = None
 
@@ -638,24 +791,362 @@ class CuraEngineBackend(QObject, Backend):
             self.enableTimer()  # manually enable timer to be able to invoke slice, also when in manual slice mode
             self._invokeSlice()
 
+    ##  Prepare to store the result of slicing a build plate.
+    def _startSliceResult(self, build_plate_number):
+        self._stored_optimized_layer_data[build_plate_number] = []
+        self._abortStoreLayersJob(build_plate_number)
+        self._layer_cache.removeBuildPlate(build_plate_number)
+        self._caching_build_plates.discard(build_plate_number)
+        if Application.getInstance().getPreferences().getValue("backend/layer_cache_on_disk"):
+            self._caching_build_plates.add(build_plate_number)
+        self._slice_fingerprints.pop(build_plate_number, None)
+        self._print_time_estimates.pop(build_plate_number, None)
+        self._token_chunks[build_plate_number] = set()
+
+    ##  Complete the result of slicing a build plate once the engine sent all
+    #   of it: replace the tokens in the g-code, make the layers ready to be
+    #   processed and remember the result for identical slices.
+    def _finishSliceResult(self, build_plate_number):
+        gcode_list = self._scene.gcode_dict[build_plate_number]
+        unreplaced_gcode_list = GCodeBuffer(gcode_list)  # Shares the chunks that don't get replaced.
+        token_chunks = self._token_chunks.pop(build_plate_number, None)
+        if token_chunks is None:  # Not tracked while the g-code came in, so look for them.
+            token_chunks = {index for index, chunk in enumerate(gcode_list) if _gcode_token_pattern.search(chunk)}
+
+        if token_chunks:
+            print_information = Application.getInstance().getPrintInformation()
+            token_values = {
+                "print_time": str(print_information.currentPrintTime.getDisplayString(DurationFormat.Format.ISO8601)),
+                "filament_amount": str(print_information.materialLengths),
+                "filament_weight": str(print_information.materialWeights),
+                "filament_cost": str(print_information.materialCosts),
+                "jobname": str(print_information.jobName)
+            }
+            for index in token_chunks:
+                gcode_list[index] = _gcode_token_pattern.sub(lambda match: token_values[match.group(1)], gcode_list[index])
+
+        if build_plate_number in self._caching_build_plates:
+            self._caching_build_plates.discard(build_plate_number)
+            self._startStoreLayersJob(build_plate_number)
+
+        print_times, material_amounts = self._print_time_estimates.pop(build_plate_number, ({}, []))
+        self._slice_result_cache.put(self._slice_fingerprints.pop(build_plate_number, None),
+                                     SliceResult(unreplaced_gcode_list, print_times, material_amounts, self._stored_optimized_layer_data.get(build_plate_number, []), token_chunks))
+
+    ##  Throw away the (partial) result of slicing a build plate.
+    def _discardSliceResult(self, build_plate_number):
+        if build_plate_number in self._stored_optimized_layer_data:
+            del self._stored_optimized_layer_data[build_plate_number]
+        self._caching_build_plates.discard(build_plate_number)
+        self._slice_fingerprints.pop(build_plate_number, None)
+        self._print_time_estimates.pop(build_plate_number, None)
+        self._token_chunks.pop(build_plate_number, None)
+
+    ##  Use the result of an identical slice as the result of slicing a build
+    #   plate.
+    #
+    #   \param slice_result The SliceResult of the identical slice.
+    def _restoreSliceResult(self, build_plate_number, slice_result):
+        self._caching_build_plates.discard(build_plate_number)  # The layers of the stored result are used instead.
+
+        self._scene.gcode_dict[build_plate_number] = GCodeBuffer(slice_result.gcode_list)
+        if slice_result.token_chunks is None:
+            self._token_chunks.pop(build_plate_number, None)
+        else:
+            self._token_chunks[build_plate_number] = set(slice_result.token_chunks)
+        self._stored_optimized_layer_data[build_plate_number] = list(slice_result.layers)
+        self._print_time_estimates[build_plate_number] = (slice_result.print_times, slice_result.material_amounts)
+        self.printDurationMessage.emit(build_plate_number, slice_result.print_times, slice_result.material_amounts)
+
+    ##  Start writing the layers of a build plate that was just sliced to the
+    #   layer cache.
+    def _startStoreLayersJob(self, build_plate_number):
+        self._abortStoreLayersJob(build_plate_number)
+        job = StoreLayersJob(self._layer_cache, build_plate_number, self._stored_optimized_layer_data.get(build_plate_number, []))
+        job.finished.connect(self._onStoreLayersFinished)
+        self._store_layers_jobs[build_plate_number] = job
+        job.start()
+
+    def _abortStoreLayersJob(self, build_plate_number):
+        job = self._store_layers_jobs.pop(build_plate_number, None)
+        if job is not None:
+            job.abort()
+
+    def _abortStoreLayersJobs(self):
+        for build_plate_number in list(self._store_layers_jobs):
+            self._abortStoreLayersJob(build_plate_number)
+
+    def _onStoreLayersFinished(self, job):
+        build_plate_number = job.getBuildPlate()
+        if self._store_layers_jobs.get(build_plate_number) is not job:  # Aborted. It may have finished before it knew.
+            self._layer_cache.removeDirectory(job.getDirectory())
+            return
+        del self._store_layers_jobs[build_plate_number]
+        if job.getIndex() is None:  # Unable to write them. The layers just stay in memory.
+            return
+
+        self._layer_cache.addBuildPlate(build_plate_number, job.getDirectory(), job.getIndex())
+        if self._stored_optimized_layer_data.get(build_plate_number) is job.getLayers():
+            # Not processed yet. The layers on disk are processed instead of the messages, which can go now.
+            self._stored_optimized_layer_data[build_plate_number] = self._layer_cache.getLayers(build_plate_number)
+        elif build_plate_number not in self._stored_optimized_layer_data:  # Processed already.
+            self._markLayerDataResident(build_plate_number)
+
+    ##  Mark that the layer data of a build plate that is in the layer cache
+    #   was put in the scene.
+    #
+    #   The layer data of the least recently shown build plates is removed
+    #   from the scene. Since their layers are still in the layer cache, they
+    #   are processed again when they are shown.
+    def _markLayerDataResident(self, build_plate_number):
+        max_resident = int(Application.getInstance().getPreferences().getValue("backend/layer_cache_resident_plates"))
+        for evicted_build_plate_number in self._layer_cache.markResident(build_plate_number, max_resident):
+            Logger.log("d", "Removing the layer data of build plate %s from memory.", evicted_build_plate_number)
+            self._clearLayerData({evicted_build_plate_number})
+            self._stored_optimized_layer_data[evicted_build_plate_number] = self._layer_cache.getLayers(evicted_build_plate_number)
+
+    ##  Start processing the layers of a build plate that was just sliced, if
+    #   they are shown in the layer view.
+    def _processLayersIfShown(self, build_plate_number):
+        active_build_plate = Application.getInstance().getMultiBuildPlateModel().activeBuildPlate
+        if (
+            self._layer_view_active and
+            (self._process_layers_job is None or not self._process_layers_job.isRunning()) and
+            active_build_plate == build_plate_number and
+            active_build_plate not in self._build_plates_to_be_sliced):
+
+            self._startProcessSlicedLayersJob(active_build_plate)
+
+    ##  Start compressing the g-code of a build plate that was just sliced, if
+    #   that is enabled and it's the active build plate.
+    def _compressGCodeIfEnabled(self, build_plate_number):
+        if not Application.getInstance().getPreferences().getValue("backend/precompress_gcode"):
+            return
+        active_build_plate = Application.getInstance().getMultiBuildPlateModel().activeBuildPlate
+        if active_build_plate != build_plate_number or active_build_plate in self._build_plates_to_be_sliced:
+            return
+
+        if self._compress_gcode_job:
+            self._compress_gcode_job.abort()
+        self._compress_gcode_job = CompressGCodeJob(self._scene.gcode_dict[build_plate_number])
+        self._compress_gcode_job.start()
+
+    ##  Hand the build plates that are waiting to be sliced to the additional
+    #   engines that are idle.
+    #
+    #   Our own engine counts as one of the engines of "backend/slice_workers",
+    #   so there is one additional engine less than that.
+    def _startEngineWorkers(self):
+        worker_count = max(int(Application.getInstance().getPreferences().getValue("backend/slice_workers")) - 1, 0)
+        protocol_file = os.path.abspath(os.path.join(PluginRegistry.getInstance().getPluginPath(self.getPluginId()), "Cura.proto"))
+        while len(self._engine_workers) < worker_count:
+            worker = EngineWorker(self._takeEnginePort(), protocol_file, self.getEngineCommand,
+                                  self._onEngineWorkerMessage, self._onEngineWorkerError, self._backendLog)
+            worker.start()
+            self._engine_workers.append(worker)
+        for worker in self._engine_workers[worker_count:]:  # Workers that are not needed any more are closed once they're done.
+            if not worker.isBusy():
+                worker.close()
+                self._engine_workers.remove(worker)
+
+        num_objects = self._numObjectsPerBuildPlate()
+        for worker in self._engine_workers[:worker_count]:
+            while not worker.isBusy() and self._build_plates_to_be_sliced:
+                build_plate_number = self._build_plates_to_be_sliced.pop(0)
+                if num_objects[build_plate_number] == 0:
+                    self._scene.gcode_dict[build_plate_number] = GCodeBuffer()
+                    Logger.log("d", "Build plate %s has no objects to be sliced, skipping", build_plate_number)
+                    continue
+
+                Logger.log("d", "Going to slice build plate [%s] with an additional engine!" % build_plate_number)
+                self._startSliceResult(build_plate_number)
+                self._scene.gcode_dict[build_plate_number] = GCodeBuffer()
+                job = StartSliceJob.StartSliceJob(worker.createSliceMessage())
+                job.setBuildPlate(build_plate_number)
+                job.setSettingsSnapshots(self._settings_snapshots)
+                job.setSliceResultCache(self._slice_result_cache)
+                worker.startSlice(build_plate_number, job)
+                job.finished.connect(self._onEngineWorkerStartSliceCompleted)
+                job.start()
+
+    ##  Called when the slice message for an additional engine is ready.
+    def _onEngineWorkerStartSliceCompleted(self, job):
+        worker = next((worker for worker in self._engine_workers if worker.getStartSliceJob() is job), None)
+        if worker is None or job.isCancelled():  # The slice was stopped in the meantime.
+            return
+
+        build_plate_number = worker.getBuildPlate()
+        if job.getError() or job.getResult() != StartSliceJob.StartJobResult.Finished:
+            # Let our own engine slice it instead, which shows what went wrong.
+            Logger.log("w", "Unable to slice build plate %s with an additional engine: %s", build_plate_number, job.getResult())
+            worker.finishSlice()
+            self._discardSliceResult(build_plate_number)
+            self._requeueBuildPlate(build_plate_number)
+            return
+
+        self._slice_fingerprints[build_plate_number] = job.getFingerprint()
+        slice_result = self._slice_result_cache.get(job.getFingerprint(), job.getStoredSliceResult())
+        if slice_result is not None:
+            Logger.log("d", "Using the stored result of an identical slice for build plate %s.", build_plate_number)
+            self._restoreSliceResult(build_plate_number, slice_result)
+            self._onEngineWorkerSlicingFinished(worker)
+            return
+
+        worker.sendSliceMessage(job.getSliceMessage())
+        self.backendStateChange.emit(BackendState.Processing)
+
+    ##  Called for each message that an additional engine sends.
+    def _onEngineWorkerMessage(self, worker, message):
+        build_plate_number = worker.getBuildPlate()
+        message_type = message.getTypeName()
+        if message_type == "cura.proto.LayerOptimized":
+            self._storeOptimizedLayer(build_plate_number, message)
+        elif message_type == "cura.proto.GCodeLayer":
+            self._storeGCodeLayer(build_plate_number, message.data)
+        elif message_type == "cura.proto.GCodePrefix":
+            self._storeGCodePrefix(build_plate_number, message.data)
+        elif message_type == "cura.proto.PrintTimeMaterialEstimates":
+            self._storePrintTimeMaterialEstimates(build_plate_number, message)
+        elif message_type == "cura.proto.Progress":
+            worker.setProgress(message.amount)
+            self._emitProgress()
+        elif message_type == "cura.proto.SlicingFinished":
+            self._onEngineWorkerSlicingFinished(worker)
+
+    ##  Called when an additional engine has sliced its build plate.
+    def _onEngineWorkerSlicingFinished(self, worker):
+        build_plate_number = worker.getBuildPlate()
+        worker.finishSlice()
+        self._finishSliceResult(build_plate_number)
+        Logger.log("d", "Build plate %s was sliced by an additional engine.", build_plate_number)
+
+        if self._slicing or any(other_worker.isBusy() for other_worker in self._engine_workers):
+            self._emitProgress()
+        else:
+            self.backendStateChange.emit(BackendState.Done)
+            self.processingProgress.emit(1.0)
+
+        self._processLayersIfShown(build_plate_number)
+        self._startEngineWorkers()
+
+    ##  Called when an additional engine was lost while it was slicing.
+    def _onEngineWorkerError(self, worker):
+        build_plate_number = worker.getBuildPlate()
+        Logger.log("w", "An additional engine was lost while slicing build plate %s.", build_plate_number)
+        worker.finishSlice()
+        self._discardSliceResult(build_plate_number)
+        self._requeueBuildPlate(build_plate_number)
+
+    ##  Slice a build plate again that an additional engine couldn't slice.
+    def _requeueBuildPlate(self, build_plate_number):
+        if build_plate_number not in self._build_plates_to_be_sliced:
+            self._build_plates_to_be_sliced.insert(0, build_plate_number)
+        if not self._slicing:
+            self.enableTimer()  # manually enable timer to be able to invoke slice, also when in manual slice mode
+            self._invokeSlice()
+
     ##  Called when a g-code message is received from the engine.
     #
     #   \param message The protobuf message containing g-code, encoded as UTF-8.
     def _onGCodeLayerMessage(self, message):
-        self._scene.gcode_dict[self._start_slice_job_build_plate].append(message.data.decode("utf-8", "replace"))
+        self._storeGCodeLayer(self._start_slice_job_build_plate, message.data)
 
     ##  Called when a g-code prefix message is received from the engine.
     #
     #   \param message The protobuf message containing the g-code prefix,
     #   encoded as UTF-8.
     def _onGCodePrefixMessage(self, message):
-        self._scene.gcode_dict[self._start_slice_job_build_plate].insert(0, message.data.decode("utf-8", "replace"))
+        self._storeGCodePrefix(self._start_slice_job_build_plate, message.data)
+
+    ##  Add a chunk of g-code to the g-code of a build plate, remembering
+    #   whether it has tokens to replace when slicing is finished.
+    #
+    #   \param gcode The g-code, encoded as UTF-8. It is kept as it is.
+    def _storeGCodeLayer(self, build_plate_number, gcode):
+        gcode_list = self._scene.gcode_dict[build_plate_number]
+        if build_plate_number in self._token_chunks and _gcode_token_bytes_pattern.search(gcode):
+            self._token_chunks[build_plate_number].add(len(gcode_list))
+        gcode_list.append(gcode)
+
+    ##  Put the g-code prefix in front of the g-code of a build plate.
+    def _storeGCodePrefix(self, build_plate_number, gcode):
+        if build_plate_number in self._token_chunks:
+            token_chunks = {index + 1 for index in self._token_chunks[build_plate_number]}
+            if _gcode_token_bytes_pattern.search(gcode):
+                token_chunks.add(0)
+            self._token_chunks[build_plate_number] = token_chunks
+        self._scene.gcode_dict[build_plate_number].insert(0, gcode)
 
     ##  Creates a new socket connection.
     def _createSocket(self):
         super()._createSocket(os.path.abspath(os.path.join(PluginRegistry.getInstance().getPluginPath(self.getPluginId()), "Cura.proto")))
         self._engine_is_fresh = True
 
+    ##  Get a new engine for our own socket, after the old engine was
+    #   terminated.
+    #
+    #   If one of the warm engines is ready, its socket and process take the
+    #   place of ours and a new warm engine is started in the background to
+    #   replace it. Otherwise a new engine is started by calling
+    #   _createSocket().
+    def _startFreshEngine(self):
+        worker = next((worker for worker in self._warm_engines if worker.isReady()), None)
+        if worker is None or Application.getInstance().getUseExternalBackend():
+            self._cold_engine_starts += 1
+            Logger.log("d", "Starting a new engine (cold starts: %s, warm starts: %s).", self._cold_engine_starts, self._warm_engine_starts)
+            self._createSocket()
+            return
+
+        self._warm_engine_starts += 1
+        Logger.log("d", "Using a warm engine (cold starts: %s, warm starts: %s).", self._cold_engine_starts, self._warm_engine_starts)
+        socket, process, port = worker.detach()
+        old_port = self._port
+        if self._socket is not None:
+            self._socket.stateChanged.disconnect(self._onSocketStateChanged)
+            self._socket.messageReceived.disconnect(self._onMessageReceived)
+            self._socket.error.disconnect(self._onSocketError)
+            # Closing a socket that is still opening deadlocks on some platforms.
+            while self._socket.getState() == Arcus.SocketState.Opening:
+                sleep(0.1)
+            self._socket.close()
+        self._socket = socket
+        self._socket.stateChanged.connect(self._onSocketStateChanged)
+        self._socket.messageReceived.connect(self._onMessageReceived)
+        self._socket.error.connect(self._onSocketError)
+        self._process = process
+        self._port = port
+        self._engine_is_fresh = True
+
+        # The port that our old socket used is free now, so the replacement can use it.
+        worker.setPort(old_port)
+        worker.start()
+
+    ##  Start or stop warm engines to match the "backend/warm_engines"
+    #   preference.
+    def _updateWarmEngines(self):
+        warm_engine_count = max(int(Application.getInstance().getPreferences().getValue("backend/warm_engines")), 0)
+        if Application.getInstance().getUseExternalBackend():
+            warm_engine_count = 0
+        protocol_file = os.path.abspath(os.path.join(PluginRegistry.getInstance().getPluginPath(self.getPluginId()), "Cura.proto"))
+        while len(self._warm_engines) < warm_engine_count:
+            # Warm engines never slice, so they don't send messages or report errors while slicing. Their output goes to
+            # our log, since they become our own engine.
+            worker = EngineWorker(self._takeEnginePort(), protocol_file, self.getEngineCommand, self._onEngineWorkerMessage,
+                                  self._onEngineWorkerError, self._backendLog)
+            worker.start()
+            self._warm_engines.append(worker)
+        while len(self._warm_engines) > warm_engine_count:
+            self._warm_engines.pop().close()
+
+    ##  Get the port for a new additional or warm engine.
+    #
+    #   The ports are handed out one after the other, starting after the port
+    #   of our own engine, so that no two engines are given the same port.
+    def _takeEnginePort(self):
+        port = max(self._next_engine_port, self._port + 1)
+        self._next_engine_port = port + 1
+        return port
+
     ##  Called when anything has changed to the stuff that needs to be sliced.
     #
     #   This indicates that we should probably re-slice soon.
@@ -678,12 +1169,16 @@ class CuraEngineBackend(QObject, Backend):
     #   \param message The protobuf message containing the print time per feature and
     #   material amount per extruder
     def _onPrintTimeMaterialEstimates(self, message):
+        self._storePrintTimeMaterialEstimates(self._start_slice_job_build_plate, message)
+
+    def _storePrintTimeMaterialEstimates(self, build_plate_number, message):
         material_amounts = []
         for index in range(message.repeatedMessageCount("materialEstimates")):
             material_amounts.append(message.getRepeatedMessage("materialEstimates", index).material_amount)
 
         times = self._parseMessagePrintTimes(message)
-        self.printDurationMessage.emit(self._start_slice_job_build_plate, times, material_amounts)
+        self._print_time_estimates[build_plate_number] = (times, material_amounts)
+        self.printDurationMessage.emit(build_plate_number, times, material_amounts)
 
     ##  Called for parsing message to retrieve estimated time per feature
     #
@@ -722,7 +1217,7 @@ class CuraEngineBackend(QObject, Backend):
         # Restart engine as soon as possible, we know we want to slice afterwards
         if not self._engine_is_fresh:
             self._terminate()
-            self._createSocket()
+            self._startFreshEngine()
 
     ##  Called when the user stops using some tool.
     #
@@ -738,6 +1233,7 @@ class CuraEngineBackend(QObject, Backend):
             self._onSceneChanged(source)
 
     def _startProcessSlicedLayersJob(self, build_plate_number):
+        self._process_layers_start_time = time()
         self._process_layers_job = ProcessSlicedLayersJob.ProcessSlicedLayersJob(self._stored_optimized_layer_data[build_plate_number])
         self._process_layers_job.setBuildPlate(build_plate_number)
         self._process_layers_job.finished.connect(self._onProcessLayersFinished)
@@ -782,6 +1278,8 @@ class CuraEngineBackend(QObject, Backend):
             for extruder in extruders:
                 extruder.propertyChanged.disconnect(self._onSettingChanged)
                 extruder.containersChanged.disconnect(self._onChanged)
+                extruder.containersChanged.disconnect(self._onStackContainersChanged)
+            self._global_container_stack.containersChanged.disconnect(self._onStackContainersChanged)
 
         self._global_container_stack = Application.getInstance().getGlobalContainerStack()
 
@@ -792,11 +1290,30 @@ class CuraEngineBackend(QObject, Backend):
             for extruder in extruders:
                 extruder.propertyChanged.connect(self._onSettingChanged)
                 extruder.containersChanged.connect(self._onChanged)
+                extruder.containersChanged.connect(self._onStackContainersChanged)
+            self._global_container_stack.containersChanged.connect(self._onStackContainersChanged)
+            self._settings_snapshots = {stack.getId(): SettingsSnapshot(stack) for stack in [self._global_container_stack] + extruders}
             self._onChanged()
+        else:
+            self._settings_snapshots = {}
+
+    ##  Called when the containers of the global stack or an extruder stack
+    #   change, e.g. when another profile or material is selected.
+    def _onStackContainersChanged(self, *args, **kwargs):
+        # Any setting may have changed, in any stack.
+        for snapshot in self._settings_snapshots.values():
+            snapshot.invalidate()
 
     def _onProcessLayersFinished(self, job):
-        del self._stored_optimized_layer_data[job.getBuildPlate()]
-        self._process_layers_job = None
+        # An aborted job may finish after its build plate is being sliced again, so it leaves the new layers alone.
+        if job is self._process_layers_job:
+            self._recordSliceDuration(job.getBuildPlate(), "layers", time() - self._process_layers_start_time)
+            self._stored_optimized_layer_data.pop(job.getBuildPlate(), None)
+            self._process_layers_job = None
+
+            if self._layer_cache.hasBuildPlate(job.getBuildPlate()):
+                self._markLayerDataResident(job.getBuildPlate())
+
         Logger.log("d", "See if there is more to slice(2)...")
         self._invokeSlice()
 
@@ -814,18 +1331,36 @@ class CuraEngineBackend(QObject, Backend):
             self._change_timer.timeout.disconnect(self.slice)
 
     def _onPreferencesChanged(self, preference):
+        if preference in ("backend/slice_result_cache_size", "backend/slice_result_cache_on_disk"):
+            self._updateSliceResultCache()
+            return
+        if preference == "backend/warm_engines":
+            self._updateWarmEngines()
+            return
         if preference != "general/auto_slice":
             return
         auto_slice = self.determineAutoSlicing()
         if auto_slice:
             self._change_timer.start()
 
+    ##  Apply the preferences of the slice result cache.
+    def _updateSliceResultCache(self):
+        preferences = Application.getInstance().getPreferences()
+        self._slice_result_cache.setMaxEntries(int(preferences.getValue("backend/slice_result_cache_size")))
+        if preferences.getValue("backend/slice_result_cache_on_disk"):
+            self._slice_result_cache.setPath(os.path.join(Resources.getCacheStoragePath(), "slices"))
+        else:
+            self._slice_result_cache.setPath(None)
+
     ##   Tickle the backend so in case of auto slicing, it starts the timer.
     def tickle(self):
         if self._use_timer:
             self._change_timer.start()
 
     def _extruderChanged(self):
+        # Settings that depend on the enabled extruders don't report a change of their value.
+        for snapshot in self._settings_snapshots.values():
+            snapshot.invalidate()
         for build_plate_number in range(self._multi_build_plate_model.maxBuildPlate + 1):
             if build_plate_number not in self._build_plates_to_be_sliced:
                 self._build_plates_to_be_sliced.append(build_plate_number)
@@ -0,0 +1,244 @@
+# Copyright (c) 2018 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import subprocess
+import sys
+import threading
+from time import sleep
+
+from UM.Backend.SignalSocket import SignalSocket
+from UM.Logger import Logger
+
+import Arcus
+
+
+##  An additional CuraEngine process, to slice a build plate next to the one
+#   that CuraEngineBackend is slicing itself.
+#
+#   Each worker has its own socket on its own port and its own engine process,
+#   which is started as soon as the socket is listening. The messages that the
+#   engine sends are passed on to CuraEngineBackend, together with the worker
+#   so that it knows which build plate they belong to.
+class EngineWorker:
+    ##  Creates the worker.
+    #
+    #   \param port The port to listen on. If it is taken, the next free port
+    #   is used.
+    #   \param protocol_file The file with the message types of the engine.
+    #   \param get_engine_command A function that gets the command to start the
+    #   engine with, given the port it should connect to.
+    #   \param on_message A function that is called with the worker and each
+    #   message that its engine sends.
+    #   \param on_error A function that is called with the worker when its
+    #   engine is lost while it is slicing.
+    #   \param on_output A function that is called with each line (as bytes)
+    #   that the engine writes to its output, from another thread. If it is
+    #   None, the output is dropped.
+    def __init__(self, port, protocol_file, get_engine_command, on_message, on_error, on_output = None):
+        self._port = port
+        self._protocol_file = protocol_file
+        self._get_engine_command = get_engine_command
+        self._on_message = on_message
+        self._on_error = on_error
+        self._on_output = on_output
+
+        self._socket = None
+        self._process = None
+        self._connected = False
+
+        self._build_plate_number = None  # The build plate that is being sliced, or None if the worker is idle.
+        self._start_slice_job = None  # The job that builds the slice message for it.
+        self._pending_slice_message = None  # Slice message to send as soon as the engine is connected.
+        self._progress = 0.0
+
+    def getBuildPlate(self):
+        return self._build_plate_number
+
+    def getStartSliceJob(self):
+        return self._start_slice_job
+
+    def isBusy(self):
+        return self._build_plate_number is not None
+
+    def getProgress(self):
+        return self._progress
+
+    def setProgress(self, progress):
+        self._progress = progress
+
+    def setPort(self, port):
+        self._port = port
+
+    ##  Whether the engine of the worker is running and connected, so that it
+    #   can start slicing right away.
+    def isReady(self):
+        return self._connected and self._process is not None and self._process.poll() is None
+
+    ##  Start listening for the engine, which starts the engine process.
+    def start(self):
+        if self._socket is None:
+            self._createSocket()
+
+    ##  Create a slice message to send to the engine of this worker.
+    def createSliceMessage(self):
+        self.start()
+        return self._socket.createMessage("cura.proto.Slice")
+
+    ##  Mark the worker as slicing a build plate.
+    #
+    #   \param build_plate_number The build plate to slice.
+    #   \param start_slice_job The job that builds the slice message.
+    def startSlice(self, build_plate_number, start_slice_job):
+        self._build_plate_number = build_plate_number
+        self._start_slice_job = start_slice_job
+        self._progress = 0.0
+
+    ##  Send the slice message to the engine, as soon as it is connected.
+    def sendSliceMessage(self, slice_message):
+        if self._connected:
+            self._socket.sendMessage(slice_message)
+        else:
+            self._pending_slice_message = slice_message
+
+    ##  Mark the worker as idle again, after its slice is finished.
+    def finishSlice(self):
+        self._build_plate_number = None
+        self._start_slice_job = None
+        self._pending_slice_message = None
+        self._progress = 0.0
+
+    ##  Stop the slice the worker is doing, by restarting its engine.
+    def cancelSlice(self):
+        if self._start_slice_job is not None:
+            self._start_slice_job.cancel()
+        busy = self.isBusy()
+        self.finishSlice()
+        if busy:
+            self._terminateEngine()
+            self._createSocket()
+
+    ##  Stop the engine and close the socket, e.g. when the worker is not
+    #   needed any more.
+    def close(self):
+        self.cancelSlice()
+        self._terminateEngine()
+        self._closeSocket()
+
+    ##  Take the socket and the engine process away from the worker, for
+    #   someone else to use them. The worker is left without an engine until
+    #   start() is called again.
+    #
+    #   \return A tuple of the socket, the engine process and the port of the
+    #   socket. The signals of the socket are not connected to anything.
+    def detach(self):
+        self.cancelSlice()
+        self._socket.stateChanged.disconnect(self._onSocketStateChanged)
+        self._socket.messageReceived.disconnect(self._onMessageReceived)
+        self._socket.error.disconnect(self._onSocketError)
+        result = (self._socket, self._process, self._port)
+        self._socket = None
+        self._process = None
+        self._connected = False
+        return result
+
+    def _createSocket(self):
+        self._closeSocket()
+        self._connected = False
+        self._socket = SignalSocket()
+        self._socket.stateChanged.connect(self._onSocketStateChanged)
+        self._socket.messageReceived.connect(self._onMessageReceived)
+        self._socket.error.connect(self._onSocketError)
+        if not self._socket.registerAllMessageTypes(self._protocol_file):
+            Logger.log("e", "Could not register the message types of the engine: %s", self._socket.getLastError())
+        self._socket.listen("127.0.0.1", self._port)
+
+    def _closeSocket(self):
+        if self._socket is None:
+            return
+        self._socket.stateChanged.disconnect(self._onSocketStateChanged)
+        self._socket.messageReceived.disconnect(self._onMessageReceived)
+        self._socket.error.disconnect(self._onSocketError)
+        # Closing a socket that is still opening deadlocks on some platforms.
+        while self._socket.getState() == Arcus.SocketState.Opening:
+            sleep(0.1)
+        self._socket.close()
+        self._socket = None
+        self._connected = False
+
+    def _startEngine(self):
+        self._terminateEngine()
+        command = self._get_engine_command(self._port)
+        kwargs = {}
+        if sys.platform == "win32":
+            startup_info = subprocess.STARTUPINFO()
+            startup_info.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+            startup_info.wShowWindow = subprocess.SW_HIDE
+            kwargs["startupinfo"] = startup_info
+            kwargs["creationflags"] = 0x00004000  # BELOW_NORMAL_PRIORITY_CLASS
+        # Without anyone to read the output, it must not go to a pipe that can fill up.
+        output = subprocess.DEVNULL if self._on_output is None else subprocess.PIPE
+        try:
+            self._process = subprocess.Popen(command, stdin = subprocess.DEVNULL, stdout = output, stderr = output, **kwargs)
+        except (EnvironmentError, ValueError):
+            Logger.logException("e", "Unable to start an additional engine process: %s", command)
+            self._process = None
+            return
+        Logger.log("d", "Started an additional engine process on port %s.", self._port)
+
+        if self._on_output is not None:
+            self._on_output(bytes("Calling engine with: %s\n" % command, "utf-8"))
+            for handle in (self._process.stdout, self._process.stderr):
+                thread = threading.Thread(target = self._readOutput, args = (handle, ))
+                thread.daemon = True
+                thread.start()
+
+    ##  Pass the output of the engine on, until the engine closes it.
+    #
+    #   This runs on a thread of its own for stdout and one for stderr.
+    def _readOutput(self, handle):
+        while True:
+            try:
+                line = handle.readline()
+            except (OSError, ValueError):  # The handle is closed when the engine is terminated.
+                break
+            if line == b"":
+                break
+            self._on_output(line)
+
+    def _terminateEngine(self):
+        if self._process is None:
+            return
+        try:
+            self._process.terminate()
+            self._process.wait()
+        except Exception as e:  # Terminating a process that is already terminating causes an exception.
+            Logger.log("d", "Exception occurred while trying to kill an additional engine: %s", str(e))
+        self._process = None
+
+    def _onSocketStateChanged(self, state):
+        if state == Arcus.SocketState.Listening:
+            self._startEngine()
+        elif state == Arcus.SocketState.Connected:
+            self._connected = True
+            if self._pending_slice_message is not None:
+                self._socket.sendMessage(self._pending_slice_message)
+                self._pending_slice_message = None
+
+    def _onMessageReceived(self):
+        message = self._socket.takeNextMessage()
+        if self.isBusy():  # Messages that arrive after a slice was cancelled are ignored.
+            self._on_message(self, message)
+
+    def _onSocketError(self, error):
+        if error.getErrorCode() == Arcus.ErrorCode.Debug:
+            return
+        if error.getErrorCode() == Arcus.ErrorCode.BindFailedError:
+            self._port += 1
+            Logger.log("d", "An additional engine socket was unable to bind to its port, increasing the port number to %s.", self._port)
+        elif error.getErrorCode() != Arcus.ErrorCode.ConnectionResetError:
+            Logger.log("w", "An additional engine socket had an error: %s", str(error))
+
+        if self.isBusy():  # The slice is lost.
+            self._on_error(self)
+        self._terminateEngine()
+        self._createSocket()
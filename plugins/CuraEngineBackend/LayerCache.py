@@ -0,0 +1,138 @@
+# Copyright (c) 2018 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import collections
+import os
+import shutil
+
+from UM.Job import Job
+from UM.Logger import Logger
+
+from cura import LayerColumnFiles, LayerDecoder
+
+
+##  Keeps the sliced layers of build plates on disk instead of in memory.
+#
+#   Once a build plate is sliced, its layers are decoded and their columns are
+#   written to files in the cache directory, see LayerColumnFiles. That is done
+#   by a job, see writeLayers(). When the layers are needed again, the files
+#   are memory-mapped.
+#
+#   The cache also keeps track of which build plates have their layer data in
+#   the scene, so that the least recently used ones can be removed from the
+#   scene and be processed from the cache again when they are needed.
+class LayerCache:
+    ##  Creates the cache.
+    #
+    #   \param path The directory to store the layers in. Anything that was in
+    #   it is removed.
+    def __init__(self, path):
+        self._path = path
+        self._generation = 0  # Every time a build plate is stored, it gets a new directory.
+
+        self._directories = {}  # Build plate number -> directory with the column files.
+        self._indices = {}  # Build plate number -> list of (layer ID, height, thickness, path count, line count, point count).
+        self._resident_build_plates = collections.OrderedDict()  # The build plates with layer data in the scene, least recently used first.
+
+        self.removeDirectory(self._path)
+
+    ##  Get a new directory to write the layers of a build plate to.
+    #
+    #   Every time a build plate is stored it gets a new directory, so that
+    #   the files of the layers that were stored before can still be mapped.
+    def createDirectoryName(self, build_plate_number):
+        self._generation += 1
+        return os.path.join(self._path, "{0}_{1}".format(build_plate_number, self._generation))
+
+    ##  Decode layer messages and write their columns to a directory.
+    #
+    #   This doesn't change the cache, so it can be called from a job thread.
+    #   Pass the result to addBuildPlate() to use the layers.
+    #
+    #   \param directory The directory, as given by createDirectoryName().
+    #   \param layers The cura.proto.LayerOptimized messages.
+    #   \param is_aborted A function that tells whether to stop writing.
+    #   \return The index of the layers, or None if writing them failed or was
+    #   aborted. The directory is removed then.
+    def writeLayers(self, directory, layers, is_aborted):
+        index = []
+        try:
+            os.makedirs(directory)
+            with LayerColumnFiles.ColumnFileWriter(directory) as writer:
+                for layer in layers:
+                    if is_aborted():
+                        break
+                    layer_id, height, thickness, columns = LayerDecoder.decodeLayer(LayerDecoder.extractLayer(layer))
+                    index.append((layer_id, height, thickness) + writer.write(columns))
+                    Job.yieldThread()
+        except EnvironmentError:
+            Logger.logException("w", "Unable to write the layer cache in %s.", directory)
+            self.removeDirectory(directory)
+            return None
+        if is_aborted():
+            self.removeDirectory(directory)
+            return None
+        return index
+
+    ##  Use the layers that were written for a build plate, replacing any
+    #   layers that were stored for it before.
+    #
+    #   \param directory The directory that the layers were written to.
+    #   \param index The index of the layers, as given by writeLayers().
+    def addBuildPlate(self, build_plate_number, directory, index):
+        self.removeBuildPlate(build_plate_number)
+        self._directories[build_plate_number] = directory
+        self._indices[build_plate_number] = index
+
+    def hasBuildPlate(self, build_plate_number):
+        return build_plate_number in self._directories
+
+    ##  Get the layers of a build plate, with their columns memory-mapped.
+    #
+    #   \return A list of the layers as returned by LayerDecoder.decodeLayer(),
+    #   sorted by layer ID. The columns are read-only.
+    def getLayers(self, build_plate_number):
+        index = self._indices[build_plate_number]
+        columns = LayerColumnFiles.readColumnFiles(self._directories[build_plate_number], [entry[3:] for entry in index])
+        layers = [(entry[0], entry[1], entry[2], layer_columns) for entry, layer_columns in zip(index, columns)]
+        layers.sort(key = lambda layer: layer[0])
+        return layers
+
+    ##  Remove the layers of a build plate from the cache.
+    def removeBuildPlate(self, build_plate_number):
+        self._indices.pop(build_plate_number, None)
+        self._resident_build_plates.pop(build_plate_number, None)
+        directory = self._directories.pop(build_plate_number, None)
+        if directory is not None:
+            self.removeDirectory(directory)
+
+    ##  Remove the layers of all build plates from the cache.
+    def clear(self):
+        for build_plate_number in list(self._directories):
+            self.removeBuildPlate(build_plate_number)
+
+    ##  Mark that the layer data of a build plate was put in the scene.
+    #
+    #   \param max_resident The number of build plates that may have their
+    #   layer data in the scene.
+    #   \return The least recently used build plates that exceed that number.
+    #   Their layer data should be removed from the scene. They're still in the
+    #   cache, so their layers can be processed again later.
+    def markResident(self, build_plate_number, max_resident):
+        self._resident_build_plates.pop(build_plate_number, None)
+        self._resident_build_plates[build_plate_number] = True
+
+        evicted = []
+        while len(self._resident_build_plates) > max(max_resident, 1):
+            evicted.append(self._resident_build_plates.popitem(last = False)[0])
+        return evicted
+
+    ##  Remove a directory, e.g. one that layers were written to but that is
+    #   not used.
+    def removeDirectory(self, directory):
+        try:
+            shutil.rmtree(directory)
+        except FileNotFoundError:
+            pass
+        except EnvironmentError:  # E.g. files that are still mapped on Windows. They're removed the next time.
+            Logger.log("w", "Unable to remove the layer cache in %s.", directory)
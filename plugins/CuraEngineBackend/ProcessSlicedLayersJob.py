@@ -2,6 +2,10 @@
 #Cura is released under the terms of the LGPLv3 or higher.
 
 import gc
+import math
+import multiprocessing
+import multiprocessing.pool
+import os
 
 from UM.Job import Job
 from UM.Application import Application
@@ -18,8 +22,9 @@ from cura.Scene.BuildPlateDecorator import BuildPlateDecorator
 from cura.Scene.CuraSceneNode import CuraSceneNode
 from cura.Settings.ExtruderManager import ExtruderManager
 from cura import LayerDataBuilder
+from cura import LayerDecoder
 from cura import LayerDataDecorator
-from cura import LayerPolygon
+from cura.CompactLayerData import CompactLayerData
 
 import numpy
 from time import time
@@ -41,7 +46,31 @@ def colorCodeToRGBA(color_code):
         1.0]
 
 
+##  Get the ID of a layer to process.
+#
+#   \param layer A layer message, or a layer that was already decoded.
+def _getLayerId(layer):
+    if _isDecoded(layer):
+        return layer[0]
+    return layer.id
+
+
+##  Whether a layer to process was already decoded, as returned by
+#   LayerDecoder.decodeLayer(), instead of being a layer message.
+def _isDecoded(layer):
+    return isinstance(layer, tuple)
+
+
 class ProcessSlicedLayersJob(Job):
+    # Pool of workers to decode layers with, shared by all jobs, and the (type, worker count) it was started with.
+    _pool = None
+    _pool_settings = None
+
+    ##  Creates the job.
+    #
+    #   \param layers The cura.proto.LayerOptimized messages to process, or
+    #   layers that were decoded already as returned by
+    #   LayerDecoder.decodeLayer().
     def __init__(self, layers):
         super().__init__()
         self._layers = layers
@@ -50,6 +79,9 @@ class ProcessSlicedLayersJob(Job):
         self._abort_requested = False
         self._build_plate_number = None
 
+        # Number of times the layer mesh is extended while processing, so the layer view can show a partial result.
+        self._mesh_update_count = 10
+
     ##  Aborts the processing of layers.
     #
     #   This abort is made on a best-effort basis, meaning that the actual
@@ -92,8 +124,13 @@ class ProcessSlicedLayersJob(Job):
 
         mesh = MeshData()
         layer_data = LayerDataBuilder.LayerDataBuilder()
+        if Application.getInstance().getPreferences().getValue("view/compact_layer_data"):
+            layer_data.setQuantizationBounds(*self._getQuantizationBounds())
         layer_count = len(self._layers)
 
+        # Process the layers from the bottom up, so the layer mesh can be extended while we go.
+        self._layers = sorted(self._layers, key = _getLayerId)
+
         # Find the minimum layer number
         # When using a raft, the raft layers are sent as layers < 0. Instead of allowing layers < 0, we
         # instead simply offset all other layers so the lowest layer is always 0. It could happens that
@@ -101,81 +138,156 @@ class ProcessSlicedLayersJob(Job):
         min_layer_number = 0
         negative_layers = 0
         for layer in self._layers:
-            if layer.id < min_layer_number:
-                min_layer_number = layer.id
-            if layer.id < 0:
+            layer_id = _getLayerId(layer)
+            if layer_id < min_layer_number:
+                min_layer_number = layer_id
+            if layer_id < 0:
                 negative_layers += 1
 
-        current_layer = 0
+        material_color_map = self._getMaterialColorMap()
 
-        for layer in self._layers:
-            # Negative layers are offset by the minimum layer number, but the positive layers are just
-            # offset by the number of negative layers so there is no layer gap between raft and model
-            abs_layer_number = layer.id + abs(min_layer_number) if layer.id < 0 else layer.id + negative_layers
+        # We have to scale the colors for compatibility mode
+        if OpenGLContext.isLegacyOpenGL() or bool(Application.getInstance().getPreferences().getValue("view/force_layer_view_compatibility_mode")):
+            line_type_brightness = 0.5  # for compatibility mode
+        else:
+            line_type_brightness = 1.0
 
-            layer_data.addLayer(abs_layer_number)
-            this_layer = layer_data.getLayer(abs_layer_number)
-            layer_data.setLayerHeight(abs_layer_number, layer.height)
-            layer_data.setLayerThickness(abs_layer_number, layer.thickness)
+        # The layer mesh is extended every time a chunk of layers has been processed. When the layer view is
+        # active, the partial mesh is shown right away so the preview fills in while the job is still running.
+        layers_per_chunk = max(math.ceil(layer_count / self._mesh_update_count), 1)
+        show_progress_in_view = view.getPluginId() == "SimulationView"
+        layer_mesh = None
 
-            for p in range(layer.repeatedMessageCount("path_segment")):
-                polygon = layer.getRepeatedMessage("path_segment", p)
+        current_layer = 0
+        pool = self._getPool()
 
-                extruder = polygon.extruder
+        for chunk_start in range(0, layer_count, layers_per_chunk):
+            chunk = self._layers[chunk_start:chunk_start + layers_per_chunk]
+            for layer_id, layer_height, layer_thickness, columns in self._decodeLayers(chunk, pool):
+                # Negative layers are offset by the minimum layer number, but the positive layers are just
+                # offset by the number of negative layers so there is no layer gap between raft and model
+                abs_layer_number = layer_id + abs(min_layer_number) if layer_id < 0 else layer_id + negative_layers
 
-                line_types = numpy.fromstring(polygon.line_type, dtype="u1")  # Convert bytearray to numpy array
-                line_types = line_types.reshape((-1,1))
+                layer_data.addLayer(abs_layer_number)
+                this_layer = layer_data.getLayer(abs_layer_number)
+                layer_data.setLayerHeight(abs_layer_number, layer_height)
+                layer_data.setLayerThickness(abs_layer_number, layer_thickness)
+                this_layer.addPaths(*columns)
 
-                points = numpy.fromstring(polygon.points, dtype="f4")  # Convert bytearray to numpy array
-                if polygon.point_type == 0: # Point2D
-                    points = points.reshape((-1,2))  # We get a linear list of pairs that make up the points, so make numpy interpret them correctly.
-                else:  # Point3D
-                    points = points.reshape((-1,3))
+                Job.yieldThread()
+                current_layer += 1
+                progress = (current_layer / layer_count) * 99
+
+                if self._abort_requested:
+                    self._removeNode(new_node)
+                    if self._progress_message:
+                        self._progress_message.hide()
+                    return
+                if self._progress_message:
+                    self._progress_message.setProgress(progress)
 
-                line_widths = numpy.fromstring(polygon.line_width, dtype="f4")  # Convert bytearray to numpy array
-                line_widths = line_widths.reshape((-1,1))  # We get a linear list of pairs that make up the points, so make numpy interpret them correctly.
+            # Only the layers that were processed since the last chunk are added to the layer mesh.
+            layer_mesh = layer_data.build(material_color_map, line_type_brightness)
+            if show_progress_in_view and not self._abort_requested:
+                self._setLayerMesh(new_node, mesh, layer_mesh)
 
-                line_thicknesses = numpy.fromstring(polygon.line_thickness, dtype="f4")  # Convert bytearray to numpy array
-                line_thicknesses = line_thicknesses.reshape((-1,1))  # We get a linear list of pairs that make up the points, so make numpy interpret them correctly.
+        # We are done processing all the layers we got from the engine, the layer mesh is complete now.
+        if layer_mesh is None:
+            layer_mesh = layer_data.build(material_color_map, line_type_brightness)
 
-                line_feedrates = numpy.fromstring(polygon.line_feedrate, dtype="f4")  # Convert bytearray to numpy array
-                line_feedrates = line_feedrates.reshape((-1,1))  # We get a linear list of pairs that make up the points, so make numpy interpret them correctly.
+        if self._abort_requested:
+            self._removeNode(new_node)
+            if self._progress_message:
+                self._progress_message.hide()
+            return
 
-                # Create a new 3D-array, copy the 2D points over and insert the right height.
-                # This uses manual array creation + copy rather than numpy.insert since this is
-                # faster.
-                new_points = numpy.empty((len(points), 3), numpy.float32)
-                if polygon.point_type == 0:  # Point2D
-                    new_points[:, 0] = points[:, 0]
-                    new_points[:, 1] = layer.height / 1000  # layer height value is in backend representation
-                    new_points[:, 2] = -points[:, 1]
-                else: # Point3D
-                    new_points[:, 0] = points[:, 0]
-                    new_points[:, 1] = points[:, 2]
-                    new_points[:, 2] = -points[:, 1]
+        self._setLayerMesh(new_node, mesh, layer_mesh)  # Note: After this we can no longer abort!
 
-                this_poly = LayerPolygon.LayerPolygon(extruder, line_types, new_points, line_widths, line_thicknesses, line_feedrates)
-                this_poly.buildCache()
+        if isinstance(layer_mesh, CompactLayerData):
+            Logger.log("d", "Compact layer data takes %.1f MB instead of %.1f MB", layer_mesh.getByteSize() / 2 ** 20, layer_mesh.getExpandedByteSize() / 2 ** 20)
 
-                this_layer.polygons.append(this_poly)
+        if self._progress_message:
+            self._progress_message.setProgress(100)
 
-                Job.yieldThread()
-            Job.yieldThread()
-            current_layer += 1
-            progress = (current_layer / layer_count) * 99
-            # TODO: Rebuild the layer data mesh once the layer has been processed.
-            # This needs some work in LayerData so we can add the new layers instead of recreating the entire mesh.
+        if self._progress_message:
+            self._progress_message.hide()
 
-            if self._abort_requested:
-                if self._progress_message:
-                    self._progress_message.hide()
-                return
-            if self._progress_message:
-                self._progress_message.setProgress(progress)
+        # Clear the unparsed layers. This saves us a bunch of memory if the Job does not get destroyed.
+        self._layers = None
 
-        # We are done processing all the layers we got from the engine, now create a mesh out of the data
+        Logger.log("d", "Processing layers took %s seconds", time() - start_time)
 
-        # Find out colors per extruder
+    ##  Decode the layer messages of one chunk, in the same order.
+    #
+    #   \param layers The layer messages to decode.
+    #   \param pool The pool of workers to decode the layers with, or None to
+    #   decode them on this thread.
+    #   \return A generator of decoded layers, as returned by
+    #   LayerDecoder.decodeLayer().
+    def _decodeLayers(self, layers, pool):
+        if layers and _isDecoded(layers[0]):  # E.g. layers from the layer cache.
+            yield from layers
+            return
+
+        if pool is None:
+            for layer in layers:
+                yield LayerDecoder.decodeLayer(LayerDecoder.extractLayer(layer))
+            return
+
+        # The messages can only be read on this thread, the decoding itself is done by the workers.
+        extracted_layers = [LayerDecoder.extractLayer(layer) for layer in layers]
+        decoded_count = 0
+        try:
+            for decoded_layer in pool.imap(LayerDecoder.decodeLayer, extracted_layers):
+                yield decoded_layer
+                decoded_count += 1
+        except Exception:
+            Logger.logException("w", "Decoding layers in a pool of workers failed. Decoding them on the job thread instead.")
+            self._closePool()
+            for extracted_layer in extracted_layers[decoded_count:]:
+                yield LayerDecoder.decodeLayer(extracted_layer)
+
+    ##  Get the pool of workers to decode the layers with, as configured in the
+    #   preferences.
+    #
+    #   The pool is shared by all jobs, since starting the workers takes time.
+    #   \return A multiprocessing pool, or None to decode the layers on the job
+    #   thread itself.
+    @classmethod
+    def _getPool(cls):
+        preferences = Application.getInstance().getPreferences()
+        pool_type = preferences.getValue("backend/layer_processing_pool")
+        worker_count = int(preferences.getValue("backend/layer_processing_workers")) or os.cpu_count() or 1
+        if pool_type == "process" and "fork" not in multiprocessing.get_all_start_methods():
+            # Any other way of starting the worker processes runs the start-up script of Cura again in each worker.
+            Logger.log("w", "Worker processes are not supported on this platform, using threads to process layers instead.")
+            pool_type = "thread"
+        if pool_type not in ("thread", "process"):
+            cls._closePool()
+            return None
+
+        pool_settings = (pool_type, worker_count)
+        if cls._pool is None or cls._pool_settings != pool_settings:
+            cls._closePool()
+            Logger.log("d", "Starting a %s pool of %s workers to process layers.", pool_type, worker_count)
+            if pool_type == "process":
+                cls._pool = multiprocessing.get_context("fork").Pool(worker_count)
+            else:
+                cls._pool = multiprocessing.pool.ThreadPool(worker_count)
+            cls._pool_settings = pool_settings
+        return cls._pool
+
+    @classmethod
+    def _closePool(cls):
+        if cls._pool is not None:
+            cls._pool.terminate()
+            cls._pool = None
+            cls._pool_settings = None
+
+    ##  Find out the colors to use per extruder.
+    #
+    #   \return A numpy array with an [r, g, b, a] row for each extruder.
+    def _getMaterialColorMap(self):
         global_container_stack = Application.getInstance().getGlobalContainerStack()
         manager = ExtruderManager.getInstance()
         extruders = list(manager.getMachineExtruders(global_container_stack.getId()))
@@ -196,44 +308,62 @@ class ProcessSlicedLayersJob(Job):
             color_code = global_container_stack.material.getMetaDataEntry("color_code", default="#e0e000")
             color = colorCodeToRGBA(color_code)
             material_color_map[0, :] = color
+        return material_color_map
 
-        # We have to scale the colors for compatibility mode
-        if OpenGLContext.isLegacyOpenGL() or bool(Application.getInstance().getPreferences().getValue("view/force_layer_view_compatibility_mode")):
-            line_type_brightness = 0.5  # for compatibility mode
+    ##  Get the bounds to quantize the vertices of the layer mesh in.
+    #
+    #   These are the bounds of the build volume in the coordinates of the
+    #   layer mesh, with a margin around them for e.g. travel moves to prime
+    #   positions outside of the build volume.
+    #
+    #   \return The lowest and highest [x, y, z] of the vertices.
+    def _getQuantizationBounds(self):
+        settings = Application.getInstance().getGlobalContainerStack()
+        size = numpy.array([settings.getProperty("machine_width", "value"), settings.getProperty("machine_height", "value"), settings.getProperty("machine_depth", "value")], dtype = numpy.float32)
+        if settings.getProperty("machine_center_is_zero", "value"):
+            minimum = numpy.array([-size[0] / 2, 0, -size[2] / 2], dtype = numpy.float32)
         else:
-            line_type_brightness = 1.0
-        layer_mesh = layer_data.build(material_color_map, line_type_brightness)
+            minimum = numpy.array([0, 0, -size[2]], dtype = numpy.float32)  # The y axis of the engine is flipped into the z axis.
+        margin = size / 4
+        return minimum - margin, minimum + size + margin
 
-        if self._abort_requested:
-            if self._progress_message:
-                self._progress_message.hide()
+    ##  Show a (partial) layer mesh on the layer data node.
+    #
+    #   The first time this is called the node is added to the scene. After
+    #   that, only the layer data of the node is replaced.
+    #
+    #   \param node The scene node that holds the layer data.
+    #   \param mesh The (empty) mesh data of the node.
+    #   \param layer_mesh The LayerData to show.
+    def _setLayerMesh(self, node, mesh, layer_mesh):
+        decorator = node.getDecorator(LayerDataDecorator.LayerDataDecorator)
+        if decorator is not None:
+            if decorator.getLayerData() is not layer_mesh:
+                decorator.setLayerData(layer_mesh)
+                node.meshDataChanged.emit(node)
             return
 
         # Add LayerDataDecorator to scene node to indicate that the node has layer data
         decorator = LayerDataDecorator.LayerDataDecorator()
         decorator.setLayerData(layer_mesh)
-        new_node.addDecorator(decorator)
+        node.addDecorator(decorator)
 
-        new_node.setMeshData(mesh)
-        # Set build volume as parent, the build volume can move as a result of raft settings.
-        # It makes sense to set the build volume as parent: the print is actually printed on it.
-        new_node_parent = Application.getInstance().getBuildVolume()
-        new_node.setParent(new_node_parent)  # Note: After this we can no longer abort!
+        node.setMeshData(mesh)
 
         settings = Application.getInstance().getGlobalContainerStack()
         if not settings.getProperty("machine_center_is_zero", "value"):
-            new_node.setPosition(Vector(-settings.getProperty("machine_width", "value") / 2, 0.0, settings.getProperty("machine_depth", "value") / 2))
-
-        if self._progress_message:
-            self._progress_message.setProgress(100)
+            node.setPosition(Vector(-settings.getProperty("machine_width", "value") / 2, 0.0, settings.getProperty("machine_depth", "value") / 2))
 
-        if self._progress_message:
-            self._progress_message.hide()
-
-        # Clear the unparsed layers. This saves us a bunch of memory if the Job does not get destroyed.
-        self._layers = None
+        # Set build volume as parent, the build volume can move as a result of raft settings.
+        # It makes sense to set the build volume as parent: the print is actually printed on it.
+        new_node_parent = Application.getInstance().getBuildVolume()
+        node.setParent(new_node_parent)
 
-        Logger.log("d", "Processing layers took %s seconds", time() - start_time)
+    ##  Remove a partially built layer data node from the scene again.
+    def _removeNode(self, node):
+        parent = node.getParent()
+        if parent is not None:
+            parent.removeChild(node)
 
     def _onActiveViewChanged(self):
         if self.isRunning():
@@ -0,0 +1,99 @@
+# Copyright (c) 2018 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import collections
+import threading
+
+from UM.Settings.SettingRelation import RelationType
+
+
+##  The properties of a setting that are sent to the engine.
+SettingProperties = collections.namedtuple("SettingProperties", ["value", "settable_per_extruder", "limit_to_extruder"])
+
+
+##  Keeps the evaluated properties of all settings of a stack, so that they
+#   don't need to be evaluated again for every slice.
+#
+#   When settings change, only the changed settings and the settings that
+#   depend on them are marked to be evaluated again. The next call to
+#   getProperties() evaluates those and reuses the rest. Changing the
+#   containers of the stack marks all settings.
+#
+#   The properties may be requested from a job while settings are invalidated
+#   on the main thread.
+class SettingsSnapshot:
+    def __init__(self, stack):
+        self._stack = stack
+        self._properties = {}  # Setting key -> SettingProperties.
+        self._dirty_keys = None  # Keys to evaluate again, or None to evaluate all of them.
+        self._version = 0  # Increased every time that settings are invalidated.
+
+        self._dirty_lock = threading.Lock()
+        self._evaluate_lock = threading.Lock()
+
+    def getStack(self):
+        return self._stack
+
+    ##  Get the version of the snapshot, which changes every time that settings
+    #   are invalidated.
+    def getVersion(self):
+        return self._version
+
+    ##  Mark settings to be evaluated again.
+    #
+    #   \param keys The keys of the settings, or None to mark all settings.
+    def invalidate(self, keys = None):
+        with self._dirty_lock:
+            if keys is None:
+                self._dirty_keys = None
+            elif self._dirty_keys is not None:
+                self._dirty_keys.update(keys)
+            self._version += 1
+
+    ##  Get the properties of all settings of the stack.
+    #
+    #   \return A dictionary of setting key -> SettingProperties. It must not
+    #   be modified.
+    def getProperties(self):
+        with self._evaluate_lock:
+            with self._dirty_lock:
+                dirty_keys = self._dirty_keys
+                self._dirty_keys = set()
+
+            if dirty_keys is None:
+                properties = {}
+                dirty_keys = self._stack.getAllKeys()
+            else:
+                if not dirty_keys:
+                    return self._properties
+                properties = dict(self._properties)  # Don't change the dictionary that was returned before.
+
+            for key in dirty_keys:
+                properties[key] = SettingProperties(self._stack.getProperty(key, "value"),
+                                                    self._stack.getProperty(key, "settable_per_extruder"),
+                                                    self._stack.getProperty(key, "limit_to_extruder"))
+            self._properties = properties
+            return properties
+
+    ##  Find the settings whose value depends on a setting.
+    #
+    #   \param stack A stack with the definition of the setting.
+    #   \param key The key of the setting.
+    #   \return A set with the key and the keys of all settings that depend on
+    #   it, directly or indirectly.
+    @staticmethod
+    def getAffectedKeys(stack, key):
+        affected_keys = {key}
+        definition = stack.getSettingDefinition(key)
+        if definition is None:
+            return affected_keys
+
+        relations = list(definition.relations)
+        while relations:
+            relation = relations.pop()
+            if relation.type == RelationType.RequiresTarget or relation.role not in ("value", "limit_to_extruder"):
+                continue
+            if relation.target.key not in affected_keys:
+                affected_keys.add(relation.target.key)
+                relations.extend(relation.target.relations)
+        return affected_keys
@@ -0,0 +1,173 @@
+# Copyright (c) 2018 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import collections
+import os
+import pickle
+
+import numpy
+
+from UM.Job import Job
+from UM.Logger import Logger
+
+from cura import LayerDecoder
+
+
+##  What the engine sent back for a slice.
+class SliceResult:
+    ##  Creates the slice result.
+    #
+    #   \param gcode_list The g-code, before the print time and material
+    #   tokens are replaced.
+    #   \param print_times The estimated print time per feature.
+    #   \param material_amounts The estimated material amount per extruder.
+    #   \param layers The cura.proto.LayerOptimized messages, or layers that
+    #   were decoded already as returned by LayerDecoder.decodeLayer().
+    #   \param token_chunks The indices of the g-code chunks that contain
+    #   tokens, or None if they are not known.
+    def __init__(self, gcode_list, print_times, material_amounts, layers, token_chunks = None):
+        self.gcode_list = gcode_list
+        self.print_times = print_times
+        self.material_amounts = material_amounts
+        self.layers = layers
+        self.token_chunks = token_chunks
+
+
+##  Remembers the results of the last slices, so that slicing the same scene
+#   with the same settings again doesn't need the engine.
+#
+#   The results are looked up by the fingerprint of the slice message, see
+#   StartSliceJob.getFingerprint(). The least recently used results are
+#   dropped when there are more than the maximum number of them. Optionally
+#   the results are also stored on disk, so that they survive being dropped
+#   from memory.
+class SliceResultCache:
+    ##  Creates the cache.
+    #
+    #   \param max_entries The number of results to keep, in memory and on
+    #   disk.
+    #   \param path The directory to store the results in, or None to keep
+    #   them in memory only.
+    def __init__(self, max_entries, path = None):
+        self._max_entries = max_entries
+        self._path = path
+        self._entries = collections.OrderedDict()  # Fingerprint -> SliceResult, least recently used first.
+
+    def setMaxEntries(self, max_entries):
+        self._max_entries = max_entries
+        self._trim()
+
+    def setPath(self, path):
+        self._path = path
+
+    ##  Get the result of a slice.
+    #
+    #   Only the results in memory are looked up here. Results on disk have to
+    #   be loaded with load() first, on a job thread.
+    #
+    #   \param fingerprint The fingerprint of the slice message.
+    #   \param loaded_result The result as returned by load(), used if it is
+    #   not in memory.
+    #   \return The SliceResult, or None if it is not in the cache.
+    def get(self, fingerprint, loaded_result = None):
+        if fingerprint is None or self._max_entries <= 0:
+            return None
+
+        result = self._entries.pop(fingerprint, None)
+        if result is None:
+            result = loaded_result
+        if result is None:
+            return None
+        self._entries[fingerprint] = result
+        return result
+
+    ##  Load the result of a slice from disk, if it is not in memory.
+    #
+    #   This doesn't change the cache, so it can be called from a job thread.
+    #   Pass the result to get() to use it.
+    #
+    #   \param fingerprint The fingerprint of the slice message.
+    #   \return The SliceResult, or None if it is in memory or not on disk.
+    def load(self, fingerprint):
+        if fingerprint is None or self._max_entries <= 0 or self._path is None or fingerprint in self._entries:
+            return None
+        return self._load(fingerprint)
+
+    ##  Store the result of a slice.
+    #
+    #   \param fingerprint The fingerprint of the slice message.
+    #   \param result The SliceResult.
+    def put(self, fingerprint, result):
+        if fingerprint is None or self._max_entries <= 0:
+            return
+
+        self._entries.pop(fingerprint, None)
+        self._entries[fingerprint] = result
+        self._trim()
+
+        if self._path is not None and not os.path.exists(self._getFileName(fingerprint)):
+            _StoreSliceResultJob(self._getFileName(fingerprint), result, list(result.layers), self._path, self._max_entries).start()
+
+    def clear(self):
+        self._entries.clear()
+
+    def _trim(self):
+        while len(self._entries) > max(self._max_entries, 0):
+            self._entries.popitem(last = False)
+
+    def _getFileName(self, fingerprint):
+        return os.path.join(self._path, fingerprint + ".slice")
+
+    def _load(self, fingerprint):
+        file_name = self._getFileName(fingerprint)
+        if not os.path.exists(file_name):
+            return None
+        try:
+            with open(file_name, "rb") as f:
+                result = SliceResult(*pickle.load(f))
+            os.utime(file_name)  # The modification time is used to find the least recently used results on disk.
+        except Exception:
+            Logger.logException("w", "Unable to load the slice result from %s.", file_name)
+            return None
+        return result
+
+
+##  Writes a slice result to disk, and removes the least recently used slice
+#   results on disk if there are too many.
+class _StoreSliceResultJob(Job):
+    ##  Creates the job.
+    #
+    #   \param layers The layers of the result, either decoded or as layer
+    #   messages.
+    def __init__(self, file_name, result, layers, path, max_entries):
+        super().__init__()
+        self._file_name = file_name
+        self._result = result
+        self._layers = layers
+        self._path = path
+        self._max_entries = max_entries
+
+    def run(self):
+        layers = []
+        for layer in self._layers:
+            if isinstance(layer, tuple):  # Decoded already.
+                layers.append((layer[0], layer[1], layer[2], tuple(numpy.array(column) for column in layer[3])))  # Copy memory-mapped columns.
+            else:
+                layers.append(LayerDecoder.decodeLayer(LayerDecoder.extractLayer(layer)))
+            Job.yieldThread()
+        # Stored as a plain tuple, so it doesn't depend on the module name of this plug-in.
+        result = (self._result.gcode_list, self._result.print_times, self._result.material_amounts, layers, self._result.token_chunks)
+
+        try:
+            os.makedirs(self._path, exist_ok = True)
+            temporary_file_name = self._file_name + ".tmp"
+            with open(temporary_file_name, "wb") as f:
+                pickle.dump(result, f, protocol = pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_file_name, self._file_name)
+
+            file_names = [os.path.join(self._path, file_name) for file_name in os.listdir(self._path) if file_name.endswith(".slice")]
+            file_names.sort(key = os.path.getmtime)
+            for file_name in file_names[:max(len(file_names) - self._max_entries, 0)]:
+                os.remove(file_name)
+        except EnvironmentError:
+            Logger.logException("w", "Unable to store the slice result in %s.", self._file_name)
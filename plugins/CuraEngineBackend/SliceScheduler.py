@@ -0,0 +1,102 @@
+# Copyright (c) 2018 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import collections
+
+
+##  Decides when to slice after the scene or the settings change, based on how
+#   long the last slices took.
+#
+#   The time of each phase of a slice is recorded per build plate: building the
+#   slice message ("start"), slicing in the engine ("engine") and processing
+#   the sliced layers ("layers"). Quick slices are started soon after a change,
+#   while slow slices wait longer for the user to stop editing so that they
+#   aren't restarted for every change.
+class SliceScheduler:
+    Phases = ("start", "engine", "layers")
+
+    ##  Creates the scheduler.
+    #
+    #   \param default_interval The time to wait after a change in
+    #   milliseconds, as long as no slices were timed.
+    #   \param minimum_interval The shortest time to wait in milliseconds.
+    #   \param maximum_interval The longest time to wait in milliseconds.
+    #   \param interval_factor The part of the estimated slice time to wait.
+    #   \param history_size The number of recent times to average per phase.
+    def __init__(self, default_interval = 500, minimum_interval = 250, maximum_interval = 3000, interval_factor = 0.5, history_size = 5):
+        self._default_interval = default_interval
+        self._minimum_interval = minimum_interval
+        self._maximum_interval = maximum_interval
+        self._interval_factor = interval_factor
+        self._history_size = history_size
+        self._durations = {}  # Build plate number -> phase -> deque of the most recent durations in seconds.
+
+    ##  Record how long a phase of slicing a build plate took.
+    #
+    #   \param phase One of Phases.
+    #   \param duration The duration in seconds.
+    def recordDuration(self, build_plate_number, phase, duration):
+        phases = self._durations.setdefault(build_plate_number, {})
+        if phase not in phases:
+            phases[phase] = collections.deque(maxlen = self._history_size)
+        phases[phase].append(duration)
+
+    ##  Get the expected duration of a phase of slicing a build plate.
+    #
+    #   \return The mean of the recent durations in seconds, or None if the
+    #   phase was not timed for the build plate yet.
+    def getEstimatedDuration(self, build_plate_number, phase):
+        durations = self._durations.get(build_plate_number, {}).get(phase)
+        if not durations:
+            return None
+        return sum(durations) / len(durations)
+
+    ##  Get the expected duration of slicing a build plate, from the start of
+    #   the slice until its layers are shown.
+    #
+    #   \return The duration in seconds, or None if the build plate was never
+    #   sliced.
+    def getEstimatedSliceDuration(self, build_plate_number):
+        estimates = [self.getEstimatedDuration(build_plate_number, phase) for phase in self.Phases]
+        if all(estimate is None for estimate in estimates):
+            return None
+        return sum(estimate for estimate in estimates if estimate is not None)
+
+    ##  Get the time to wait after a change before slicing, in milliseconds.
+    #
+    #   A change to the settings reslices all build plates, so this is sized to
+    #   the slowest one.
+    def getDebounceInterval(self):
+        estimates = [self.getEstimatedSliceDuration(build_plate_number) for build_plate_number in self._durations]
+        estimates = [estimate for estimate in estimates if estimate is not None]
+        if not estimates:
+            return self._default_interval
+        interval = int(max(estimates) * 1000 * self._interval_factor)
+        return min(max(interval, self._minimum_interval), self._maximum_interval)
+
+    ##  Estimate how long the engine still needs for the slice it is doing.
+    #
+    #   \param elapsed The time since the slice message was sent to the engine,
+    #   in seconds.
+    #   \param progress The last progress the engine reported, from 0 to 1.
+    #   \return The remaining time in seconds, or None if it can't be
+    #   estimated.
+    def getEstimatedRemainingDuration(self, build_plate_number, elapsed, progress):
+        if progress > 0:
+            return elapsed * (1 - progress) / progress
+        estimate = self.getEstimatedDuration(build_plate_number, "engine")
+        if estimate is None:
+            return None
+        return max(estimate - elapsed, 0)
+
+    ##  Decide whether a slice that is outdated by a change should be finished
+    #   rather than stopped.
+    #
+    #   The next slice doesn't start before the debounce interval has passed
+    #   anyway, so a slice that finishes before then costs nothing and its
+    #   result can still be reused by the slice result cache.
+    def shouldFinishSlice(self, build_plate_number, elapsed, progress):
+        remaining = self.getEstimatedRemainingDuration(build_plate_number, elapsed, progress)
+        if remaining is None:
+            return False
+        return remaining * 1000 < self.getDebounceInterval()
@@ -1,11 +1,14 @@
 # Copyright (c) 2017 Ultimaker B.V.
 # Cura is released under the terms of the LGPLv3 or higher.
 
+import hashlib
 import numpy
 from string import Formatter
 from enum import IntEnum
 import time
 import re
+import threading
+import weakref
 
 from UM.Job import Job
 from UM.Application import Application
@@ -20,9 +23,14 @@ from cura.Scene.CuraSceneNode import CuraSceneNode
 from cura.OneAtATimeIterator import OneAtATimeIterator
 from cura.Settings.ExtruderManager import ExtruderManager
 
+from .SettingsSnapshot import SettingsSnapshot
+
 
 NON_PRINTING_MESH_SETTINGS = ["anti_overhang_mesh", "infill_mesh", "cutting_mesh"]
 
+# Tokens that change all the time, but don't change the result of the slice. They are left out of the fingerprint.
+VOLATILE_TOKENS = ["time", "date", "day"]
+
 
 class StartJobResult(IntEnum):
     Finished = 1
@@ -74,6 +82,11 @@ class GcodeStartEndFormatter(Formatter):
 
 ##  Job class that builds up the message of scene data to send to CuraEngine.
 class StartSliceJob(Job):
+    # The vertices of meshes and nodes, kept between slices. See _getEngineVertices().
+    _flat_mesh_vertices = {}  # id(mesh data) -> (weak reference to the mesh data, flattened vertices)
+    _node_vertices = {}  # id(node) -> (weak reference to the node, weak reference to its mesh data, world transformation, vertices, digest)
+    _vertex_caches_lock = threading.Lock()  # Several jobs can run at the same time, see CuraEngineBackend._startEngineWorkers().
+
     def __init__(self, slice_message):
         super().__init__()
 
@@ -83,13 +96,56 @@ class StartSliceJob(Job):
         self._build_plate_number = None
 
         self._all_extruders_settings = None # cache for all setting values from all stacks (global & extruder) for the current machine
+        self._fingerprint = hashlib.sha1()  # Of everything that is put in the slice message.
+        self._settings_snapshots = {}  # Stack ID -> SettingsSnapshot, to reuse the setting values of previous slices.
+        self._slice_result_cache = None
+        self._stored_slice_result = None
 
     def getSliceMessage(self):
         return self._slice_message
 
+    ##  Get a fingerprint of the slice message.
+    #
+    #   Slice messages with the same fingerprint give the same slice result.
+    #   \return A hexadecimal string, or None if the slice message wasn't
+    #   completed.
+    def getFingerprint(self):
+        if self.getResult() != StartJobResult.Finished:
+            return None
+        return self._fingerprint.hexdigest()
+
     def setBuildPlate(self, build_plate_number):
         self._build_plate_number = build_plate_number
 
+    ##  Set the cache to load the result of an identical slice from, if it is
+    #   stored on disk. See getStoredSliceResult().
+    def setSliceResultCache(self, slice_result_cache):
+        self._slice_result_cache = slice_result_cache
+
+    ##  Get the result of an identical slice that was loaded from disk.
+    #
+    #   \return The SliceResult, or None if it was not on disk or it is still
+    #   in the memory of the cache.
+    def getStoredSliceResult(self):
+        return self._stored_slice_result
+
+    ##  Set the snapshots of the settings of the global and extruder stacks.
+    #
+    #   \param settings_snapshots A dictionary of stack ID -> SettingsSnapshot.
+    #   Stacks without a snapshot are evaluated completely.
+    def setSettingsSnapshots(self, settings_snapshots):
+        self._settings_snapshots = dict(settings_snapshots)
+
+    ##  Get the properties of all settings of a stack, from its snapshot if
+    #   there is one.
+    #
+    #   \return A dictionary of setting key -> SettingProperties.
+    def _getSettingProperties(self, stack):
+        snapshot = self._settings_snapshots.get(stack.getId())
+        if snapshot is None or snapshot.getStack() is not stack:
+            snapshot = SettingsSnapshot(stack)
+        return snapshot.getProperties()
+
     ##  Check if a stack has any errors.
     ##  returns true if it has errors, false otherwise.
     def _checkStackForErrors(self, stack):
@@ -248,34 +304,19 @@ class StartSliceJob(Job):
             for extruder_stack in ExtruderManager.getInstance().getMachineExtruders(stack.getId()):
                 self._buildExtruderMessage(extruder_stack)
 
+            self._pruneVertexCaches()
             for group in filtered_object_groups:
                 group_message = self._slice_message.addRepeatedMessage("object_lists")
+                self._addToFingerprint("object_lists")
                 if group[0].getParent() is not None and group[0].getParent().callDecoration("isGroup"):
                     self._handlePerObjectSettings(group[0].getParent(), group_message)
                 for object in group:
-                    mesh_data = object.getMeshData()
-                    rot_scale = object.getWorldTransformation().getTransposed().getData()[0:3, 0:3]
-                    translate = object.getWorldTransformation().getData()[:3, 3]
-
-                    # This effectively performs a limited form of MeshData.getTransformed that ignores normals.
-                    verts = mesh_data.getVertices()
-                    verts = verts.dot(rot_scale)
-                    verts += translate
-
-                    # Convert from Y up axes to Z up axes. Equals a 90 degree rotation.
-                    verts[:, [1, 2]] = verts[:, [2, 1]]
-                    verts[:, 1] *= -1
-
                     obj = group_message.addRepeatedMessage("objects")
                     obj.id = id(object)
 
-                    indices = mesh_data.getIndices()
-                    if indices is not None:
-                        flat_verts = numpy.take(verts, indices.flatten(), axis=0)
-                    else:
-                        flat_verts = numpy.array(verts)
-
+                    flat_verts, flat_verts_digest = self._getEngineVertices(object)
                     obj.vertices = flat_verts
+                    self._addToFingerprint("objects", flat_verts_digest)
 
                     self._handlePerObjectSettings(object, obj)
 
@@ -283,6 +324,64 @@ class StartSliceJob(Job):
 
         self.setResult(StartJobResult.Finished)
 
+        # Loading a stored result can take a while, so it's done here rather than when the slice is started.
+        if self._slice_result_cache is not None:
+            self._stored_slice_result = self._slice_result_cache.load(self.getFingerprint())
+
+    ##  Get the vertices of a node as they are sent to the engine: one vertex
+    #   per corner of each face, transformed to the world coordinates of the
+    #   engine.
+    #
+    #   The vertices are kept for every node, so they only have to be computed
+    #   again if the mesh data or the transformation of the node changes. The
+    #   flattened vertices are shared between nodes with the same mesh data.
+    #
+    #   \param node The scene node to get the vertices of.
+    #   \return A tuple of the vertices and a digest of them.
+    @classmethod
+    def _getEngineVertices(cls, node):
+        mesh_data = node.getMeshData()
+        transformation = node.getWorldTransformation().getData()
+        with cls._vertex_caches_lock:
+            cached = cls._node_vertices.get(id(node))
+        if cached is not None and cached[0]() is node and cached[1]() is mesh_data and numpy.array_equal(cached[2], transformation):
+            return cached[3], cached[4]
+
+        with cls._vertex_caches_lock:
+            cached = cls._flat_mesh_vertices.get(id(mesh_data))
+        if cached is not None and cached[0]() is mesh_data:
+            flat_verts = cached[1]
+        else:
+            indices = mesh_data.getIndices()
+            if indices is not None:
+                flat_verts = numpy.take(mesh_data.getVertices(), indices.flatten(), axis=0)
+            else:
+                flat_verts = mesh_data.getVertices()
+            with cls._vertex_caches_lock:
+                cls._flat_mesh_vertices[id(mesh_data)] = (weakref.ref(mesh_data), flat_verts)
+
+        # This effectively performs a limited form of MeshData.getTransformed that ignores normals.
+        # The conversion from Y up axes to Z up axes, a 90 degree rotation, is done by the same matrix multiplication.
+        rot_scale = transformation.transpose()[0:3, [0, 2, 1]]
+        rot_scale[:, 1] *= -1
+        translate = transformation[[0, 2, 1], 3]
+        translate[1] *= -1
+        engine_verts = flat_verts.dot(rot_scale)
+        engine_verts += translate
+
+        digest = hashlib.sha1(engine_verts).digest()
+        with cls._vertex_caches_lock:
+            cls._node_vertices[id(node)] = (weakref.ref(node), weakref.ref(mesh_data), transformation.copy(), engine_verts, digest)
+        return engine_verts, digest
+
+    ##  Forget the vertices of meshes and nodes that don't exist any more.
+    @classmethod
+    def _pruneVertexCaches(cls):
+        with cls._vertex_caches_lock:
+            for cache in (cls._flat_mesh_vertices, cls._node_vertices):
+                for key in [key for key, entry in cache.items() if entry[0]() is None]:
+                    del cache[key]
+
     def cancel(self):
         super().cancel()
         self._is_cancelled = True
@@ -298,11 +397,7 @@ class StartSliceJob(Job):
     #   \return A dictionary of replacement tokens to the values they should be
     #   replaced with.
     def _buildReplacementTokens(self, stack) -> dict:
-        result = {}
-        for key in stack.getAllKeys():
-            value = stack.getProperty(key, "value")
-            result[key] = value
-            Job.yieldThread()
+        result = {key: properties.value for key, properties in self._getSettingProperties(stack).items()}
 
         result["print_bed_temperature"] = result["material_bed_temperature"] # Renamed settings.
         result["print_temperature"] = result["material_print_temperature"]
@@ -346,8 +441,10 @@ class StartSliceJob(Job):
     def _buildExtruderMessage(self, stack):
         message = self._slice_message.addRepeatedMessage("extruders")
         message.id = int(stack.getMetaDataEntry("position"))
+        self._addToFingerprint("extruders", message.id)
 
         settings = self._buildReplacementTokens(stack)
+        setting_properties = self._getSettingProperties(stack)
 
         # Also send the material GUID. This is a setting in fdmprinter, but we have no interface for it.
         settings["material_guid"] = stack.material.getMetaDataEntry("GUID", "")
@@ -359,11 +456,13 @@ class StartSliceJob(Job):
 
         for key, value in settings.items():
             # Do not send settings that are not settable_per_extruder.
-            if not stack.getProperty(key, "settable_per_extruder"):
+            if key not in setting_properties or not setting_properties[key].settable_per_extruder:
                 continue
             setting = message.getMessage("settings").addRepeatedMessage("settings")
             setting.name = key
             setting.value = str(value).encode("utf-8")
+            if key not in VOLATILE_TOKENS:
+                self._addToFingerprint(key, setting.value)
             Job.yieldThread()
 
     ##  Sends all global settings to the engine.
@@ -395,6 +494,8 @@ class StartSliceJob(Job):
             setting_message = self._slice_message.getMessage("global_settings").addRepeatedMessage("settings")
             setting_message.name = key
             setting_message.value = str(value).encode("utf-8")
+            if key not in VOLATILE_TOKENS:
+                self._addToFingerprint(key, setting_message.value)
             Job.yieldThread()
 
     ##  Sends for some settings which extruder they should fallback to if not
@@ -406,12 +507,13 @@ class StartSliceJob(Job):
     #   \param stack The global stack with all settings, from which to read the
     #   limit_to_extruder property.
     def _buildGlobalInheritsStackMessage(self, stack):
-        for key in stack.getAllKeys():
-            extruder_position = int(round(float(stack.getProperty(key, "limit_to_extruder"))))
+        for key, properties in self._getSettingProperties(stack).items():
+            extruder_position = int(round(float(properties.limit_to_extruder)))
             if extruder_position >= 0:  # Set to a specific extruder.
                 setting_extruder = self._slice_message.addRepeatedMessage("limit_to_extruder")
                 setting_extruder.name = key
                 setting_extruder.extruder = extruder_position
+                self._addToFingerprint("limit_to_extruder", key, extruder_position)
             Job.yieldThread()
 
     ##  Check if a node has per object settings and ensure that they are set correctly in the message
@@ -438,8 +540,8 @@ class StartSliceJob(Job):
         if stack.getProperty("machine_extruder_count", "value") > 1:
             changed_setting_keys.add("extruder_nr")
 
-        # Get values for all changed settings
-        for key in changed_setting_keys:
+        # Get values for all changed settings. They're sorted, so the fingerprint doesn't depend on the order of the set.
+        for key in sorted(changed_setting_keys):
             setting = message.addRepeatedMessage("settings")
             setting.name = key
             extruder = int(round(float(stack.getProperty(key, "limit_to_extruder"))))
@@ -451,9 +553,22 @@ class StartSliceJob(Job):
                 limited_stack = stack
 
             setting.value = str(limited_stack.getProperty(key, "value")).encode("utf-8")
+            self._addToFingerprint(key, setting.value)
 
             Job.yieldThread()
 
+    ##  Add parts of the slice message to its fingerprint.
+    #
+    #   \param parts Strings, numbers, bytes or contiguous arrays.
+    def _addToFingerprint(self, *parts):
+        for part in parts:
+            if isinstance(part, str) or not hasattr(part, "__len__"):
+                part = str(part).encode("utf-8")
+            part = memoryview(part).cast("B")
+            # Prefix the length, so that moving data from one part to the next changes the fingerprint.
+            self._fingerprint.update(str(len(part)).encode("ascii") + b":")
+            self._fingerprint.update(part)
+
     ##  Recursive function to put all settings that require each other for value changes in a list
     #   \param relations_set \type{set} Set of keys (strings) of settings that are influenced
     #   \param relations list of relation objects that need to be checked.
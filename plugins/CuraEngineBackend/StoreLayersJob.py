@@ -0,0 +1,50 @@
+# Copyright (c) 2018 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+from time import time
+
+from UM.Job import Job
+from UM.Logger import Logger
+
+
+##  Decodes the layers of a build plate that was just sliced and writes them to
+#   the layer cache, so that decoding them and writing them to disk doesn't
+#   block the GUI thread. See LayerCache.writeLayers.
+class StoreLayersJob(Job):
+    def __init__(self, layer_cache, build_plate_number, layers) -> None:
+        super().__init__()
+        self._layer_cache = layer_cache
+        self._build_plate_number = build_plate_number
+        self._layers = layers
+        self._directory = layer_cache.createDirectoryName(build_plate_number)
+        self._index = None
+        self._abort_requested = False
+
+    def getBuildPlate(self):
+        return self._build_plate_number
+
+    ##  Get the layer messages that are written.
+    def getLayers(self):
+        return self._layers
+
+    def getDirectory(self):
+        return self._directory
+
+    ##  Get the index of the layers that were written, as given by
+    #   LayerCache.writeLayers, or None if they were not written.
+    def getIndex(self):
+        return self._index
+
+    ##  Aborts the job, e.g. because the build plate is going to be sliced
+    #   again.
+    def abort(self) -> None:
+        self._abort_requested = True
+
+    def isAborted(self) -> bool:
+        return self._abort_requested
+
+    def run(self) -> None:
+        start_time = time()
+        self._index = self._layer_cache.writeLayers(self._directory, self._layers, self.isAborted)
+        if self._index is not None:
+            Logger.log("d", "Storing the layers of build plate %s took %s seconds", self._build_plate_number, time() - start_time)
@@ -17,10 +17,10 @@ class GCodeGzReader(MeshReader):
         self._supported_extensions = [".gcode.gz"]
 
     def _read(self, file_name):
-        with open(file_name, "rb") as file:
-            file_data = file.read()
-        uncompressed_gcode = gzip.decompress(file_data).decode("utf-8")
-        PluginRegistry.getInstance().getPluginObject("GCodeReader").preReadFromStream(uncompressed_gcode)
-        result = PluginRegistry.getInstance().getPluginObject("GCodeReader").readFromStream(uncompressed_gcode)
-
-        return result
+        gcode_reader = PluginRegistry.getInstance().getPluginObject("GCodeReader")
+        # The g-code is decompressed while it's parsed, so it never needs to be in memory completely. The size of the
+        # uncompressed g-code is not known, so no progress is shown.
+        with gzip.open(file_name, "rb") as file:
+            gcode_reader.preReadFromFile(file)
+        with gzip.open(file_name, "rb") as file:
+            return gcode_reader.readFromFile(file)
@@ -1,9 +1,12 @@
 # Copyright (c) 2018 Ultimaker B.V.
 # Cura is released under the terms of the LGPLv3 or higher.
 
+import collections
+import concurrent.futures
 import gzip
-from io import StringIO, BufferedIOBase #To write the g-code to a temporary buffer, and for typing.
-from typing import List
+import os
+from io import BufferedIOBase #For typing.
+from typing import Iterable, Iterator, List
 
 from UM.Logger import Logger
 from UM.Mesh.MeshWriter import MeshWriter #The class we're extending/implementing.
@@ -13,7 +16,14 @@ from UM.Scene.SceneNode import SceneNode #For typing.
 ##  A file writer that writes gzipped g-code.
 #
 #   If you're zipping g-code, you might as well use gzip!
+#
+#   The g-code is compressed in blocks, by a few threads at once, while it is
+#   written. Each block is a separate gzip member. A file of several members
+#   one after the other is a valid gzip file, which decompresses to the
+#   blocks one after the other.
 class GCodeGzWriter(MeshWriter):
+    _block_size = 4 * 1024 * 1024  # Minimum size of the g-code in a block. Smaller blocks compress a bit worse.
+
     ##  Writes the gzipped g-code to a stream.
     #
     #   Note that even though the function accepts a collection of nodes, the
@@ -31,11 +41,33 @@ class GCodeGzWriter(MeshWriter):
             return False
 
         #Get the g-code from the g-code writer.
-        gcode_textio = StringIO() #We have to convert the g-code into bytes.
-        success = PluginRegistry.getInstance().getPluginObject("GCodeWriter").write(gcode_textio, None)
-        if not success: #Writing the g-code failed. Then I can also not write the gzipped g-code.
+        chunks = PluginRegistry.getInstance().getPluginObject("GCodeWriter").getGCodeChunks()
+        if chunks is None: #There is no g-code. Then I can also not write the gzipped g-code.
             return False
 
-        result = gzip.compress(gcode_textio.getvalue().encode("utf-8"))
-        stream.write(result)
+        # Compressing releases the GIL, so the blocks are really compressed at the same time. Only a few blocks are
+        # compressed ahead of the one that is written, so that the compressed g-code is never all in memory.
+        thread_count = os.cpu_count() or 1
+        pending = collections.deque()
+        with concurrent.futures.ThreadPoolExecutor(max_workers = thread_count) as executor:
+            for block in self._getBlocks(chunks):
+                pending.append(executor.submit(gzip.compress, block))
+                if len(pending) > thread_count:
+                    stream.write(pending.popleft().result())
+            while pending:
+                stream.write(pending.popleft().result())
         return True
+
+    ##  Join chunks of g-code into blocks of at least the block size.
+    def _getBlocks(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        block = []
+        block_size = 0
+        for chunk in chunks:
+            block.append(chunk)
+            block_size += len(chunk)
+            if block_size >= self._block_size:
+                yield b"".join(block)
+                block = []
+                block_size = 0
+        if block:
+            yield b"".join(block)
@@ -3,6 +3,7 @@
 
 import re #Regular expressions for parsing escape characters in the settings.
 import json
+import os
 
 from UM.Settings.ContainerFormatError import ContainerFormatError
 from UM.Settings.InstanceContainer import InstanceContainer
@@ -49,19 +50,17 @@ class GCodeProfileReader(ProfileReader):
         if file_name.split(".")[-1] != "gcode":
             return None
 
-        prefix = ";SETTING_" + str(GCodeProfileReader.version) + " "
-        prefix_length = len(prefix)
+        prefix = (";SETTING_" + str(GCodeProfileReader.version) + " ").encode("utf-8")
 
         # Loading all settings from the file.
-        # They are all at the end, but Python has no reverse seek any more since Python3.
-        # TODO: Consider moving settings to the start?
-        serialized = ""  # Will be filled with the serialized profile.
+        # They are all at the end, so only the end of the file is read, unless there is no complete profile there.
         try:
-            with open(file_name, "r", encoding = "utf-8") as f:
-                for line in f:
-                    if line.startswith(prefix):
-                        # Remove the prefix and the newline from the line and add it to the rest.
-                        serialized += line[prefix_length : -1]
+            with open(file_name, "rb") as f:
+                serialized = self._readSettingsFromEnd(f, prefix)
+                if serialized is None:
+                    Logger.log("d", "No complete profile at the end of %s. Looking for it in the whole file.", file_name)
+                    f.seek(0)
+                    serialized = self._readSettings(f, prefix)
         except IOError as e:
             Logger.log("e", "Unable to open file %s for reading: %s", file_name, str(e))
             return None
@@ -94,6 +93,60 @@ class GCodeProfileReader(ProfileReader):
             profiles.append(readQualityProfileFromString(profile_string))
         return profiles
 
+    _block_size = 64 * 1024  # Size of the blocks in which the end of the file is read.
+
+    ##  Read the serialized profile from the ;SETTING_ lines at the end of a
+    #   file, reading the file backwards.
+    #
+    #   \param file The file, opened in binary mode.
+    #   \param prefix The prefix of the lines with the profile.
+    #   \return The serialized profile, still escaped, or None if the lines at
+    #   the end of the file are not a complete profile.
+    def _readSettingsFromEnd(self, file, prefix):
+        lines = []
+        for line in _readLinesBackwards(file, self._block_size):
+            line = line.rstrip(b"\r")
+            if line.startswith(prefix):
+                lines.append(line[len(prefix):])
+            elif lines or line.strip():  # Only empty lines may come after the profile.
+                break
+        serialized = b"".join(reversed(lines)).decode("utf-8", "replace").strip()
+        if not serialized.startswith("{") or not serialized.endswith("}"):
+            return None
+        return serialized
+
+    ##  Read the serialized profile from the ;SETTING_ lines anywhere in a
+    #   file.
+    #
+    #   \param file The file, opened in binary mode.
+    #   \param prefix The prefix of the lines with the profile.
+    #   \return The serialized profile, still escaped.
+    def _readSettings(self, file, prefix):
+        serialized = b""
+        for line in file:
+            if line.startswith(prefix):
+                # Remove the prefix and the newline from the line and add it to the rest.
+                serialized += line[len(prefix):].rstrip(b"\r\n")
+        return serialized.decode("utf-8", "replace")
+
+##  Read the lines of a file from its end to its start.
+#
+#   \param file The file, opened in binary mode.
+#   \param block_size The size of the blocks in which the file is read.
+#   \return The lines without their newlines, last line first.
+def _readLinesBackwards(file, block_size):
+    file.seek(0, os.SEEK_END)
+    position = file.tell()
+    remainder = b""  # The start of the first line of the blocks that were read, which may continue in the block before.
+    while position > 0:
+        size = min(block_size, position)
+        position -= size
+        file.seek(position)
+        lines = (file.read(size) + remainder).split(b"\n")
+        remainder = lines.pop(0)
+        yield from reversed(lines)
+    yield remainder
+
 ##  Unescape a string which has been escaped for use in a gcode comment.
 #
 #   \param string The string to unescape.
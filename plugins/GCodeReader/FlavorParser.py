@@ -8,24 +8,41 @@ from UM.Logger import Logger
 from UM.Math.AxisAlignedBox import AxisAlignedBox
 from UM.Math.Vector import Vector
 from UM.Message import Message
+from UM.Resources import Resources
 from cura.Scene.CuraSceneNode import CuraSceneNode
 from UM.i18n import i18nCatalog
 
 catalog = i18nCatalog("cura")
 
 from cura import LayerDataBuilder
+from cura.GCodeBuffer import GCodeBuffer
 from cura.LayerDataDecorator import LayerDataDecorator
 from cura.LayerPolygon import LayerPolygon
 from cura.Scene.GCodeListDecorator import GCodeListDecorator
 from cura.Settings.ExtruderManager import ExtruderManager
 
+from . import GCodeChunkParser
+from . import GCodeTokenizer
+from .GCodeLayerIndex import GCodeLayerIndex
+from .GCodePath import GCodePath
+from .LazyLayerDataDecorator import LazyLayerDataDecorator
+from .GCodeTokenizer import X, Y, Z, F, E
+
+import copy
+import io
+import mmap
+import multiprocessing
+import multiprocessing.pool
 import numpy
 import math
+import os
 import re
-from typing import Dict, List, NamedTuple, Optional, Union
-from collections import namedtuple
+from typing import Any, Callable, Dict, IO, List, Optional, Tuple, Union
 
-Position = NamedTuple("Position", [("x", float), ("y", float), ("z", float), ("f", float), ("e", float)])
+# The X, Y, Z position, F feedrate and the E extruder values per extruder, indexed like the parameters of GCodeTokenizer.
+Position = List[Union[float, List[float]]]
+# The parameters of a move, as returned by GCodeTokenizer.
+Parameters = List[Optional[float]]
 
 ##  This parser is intended to interpret the common firmware codes among all the
 #   different flavors
@@ -39,14 +56,20 @@ class FlavorParser:
         self._extruder_number = 0
         self._clearValues()
         self._scene_node = None
-        # X, Y, Z position, F feedrate and E extruder values are stored
-        self._position = namedtuple('Position', ['x', 'y', 'z', 'f', 'e'])
+        self._gcode_handlers = self._getGCodeHandlers()  # G-code -> method that handles it.
         self._is_layers_in_file = False  # Does the Gcode have the layers comment?
         self._extruder_offsets = {}  # Offsets for multi extruders. key is index, value is [x-offset, y-offset]
         self._current_layer_thickness = 0.2  # default
         self._filament_diameter = 2.85       # default
 
         Application.getInstance().getPreferences().addPreference("gcodereader/show_caution", True)
+        # The number of processes to parse big files with. 1 parses them line by line on the reading thread, 0 uses one per CPU.
+        Application.getInstance().getPreferences().addPreference("gcodereader/parsing_workers", 1)
+        # Whether to keep an index of the layers of big files in the cache directory, to open them again without parsing.
+        Application.getInstance().getPreferences().addPreference("gcodereader/layer_index", False)
+        # The number of layers below the current layer to show paths of for big files, of which only those layers are
+        # decoded. 0 decodes all layers when the file is opened.
+        Application.getInstance().getPreferences().addPreference("gcodereader/lazy_layer_count", 0)
 
     def _clearValues(self) -> None:
         self._extruder_number = 0
@@ -57,6 +80,21 @@ class FlavorParser:
         self._layer_data_builder = LayerDataBuilder.LayerDataBuilder()
         self._is_absolute_positioning = True    # It can be absolute (G90) or relative (G91)
         self._is_absolute_extrusion = True  # It can become absolute (M82, default) or relative (M83)
+        self._min_layer_number = 0
+        self._negative_layers = 0
+        self._previous_layer = 0
+
+    _value_end_pattern = re.compile("[;\s]")
+    _gcode_handler_pattern = re.compile(r"_gCode(\d+)$")
+
+    ##  Find the methods that handle G-codes, like _gCode0 for G0.
+    def _getGCodeHandlers(self) -> Dict[int, Callable[[Position, Parameters, GCodePath], Position]]:
+        handlers = {}
+        for name in dir(self):
+            match = self._gcode_handler_pattern.match(name)
+            if match is not None:
+                handlers[int(match.group(1))] = getattr(self, name)
+        return handlers
 
     @staticmethod
     def _getValue(line: str, code: str) -> Optional[Union[str, int, float]]:
@@ -64,8 +102,7 @@ class FlavorParser:
         if n < 0:
             return None
         n += len(code)
-        pattern = re.compile("[;\s]")
-        match = pattern.search(line, n)
+        match = FlavorParser._value_end_pattern.search(line, n)
         m = match.start() if match is not None else -1
         try:
             if m < 0:
@@ -96,50 +133,34 @@ class FlavorParser:
     def _getNullBoundingBox() -> AxisAlignedBox:
         return AxisAlignedBox(minimum=Vector(0, 0, 0), maximum=Vector(10, 10, 10))
 
-    def _createPolygon(self, layer_thickness: float, path: List[List[Union[float, int]]], extruder_offsets: List[float]) -> bool:
-        countvalid = 0
-        for point in path:
-            if point[5] > 0:
-                countvalid += 1
-                if countvalid >= 2:
-                    # we know what to do now, no need to count further
-                    continue
-        if countvalid < 2:
+    def _createPolygon(self, layer_thickness: float, path: GCodePath, extruder_offsets: List[float]) -> bool:
+        if len(path) < 2:
+            return False
+        path_points = path.getArray()
+        if numpy.count_nonzero(path_points[:, GCodePath.TYPE] > 0) < 2:
             return False
         try:
             self._layer_data_builder.addLayer(self._layer_number)
-            self._layer_data_builder.setLayerHeight(self._layer_number, path[0][2])
+            self._layer_data_builder.setLayerHeight(self._layer_number, path_points[0, GCodePath.Z])
             self._layer_data_builder.setLayerThickness(self._layer_number, layer_thickness)
             this_layer = self._layer_data_builder.getLayer(self._layer_number)
         except ValueError:
             return False
-        count = len(path)
-        line_types = numpy.empty((count - 1, 1), numpy.int32)
-        line_widths = numpy.empty((count - 1, 1), numpy.float32)
-        line_thicknesses = numpy.empty((count - 1, 1), numpy.float32)
-        line_feedrates = numpy.empty((count - 1, 1), numpy.float32)
-        line_widths[:, 0] = 0.35  # Just a guess
-        line_thicknesses[:, 0] = layer_thickness
+        count = len(path_points)
         points = numpy.empty((count, 3), numpy.float32)
-        extrusion_values = numpy.empty((count, 1), numpy.float32)
-        i = 0
-        for point in path:
-            points[i, :] = [point[0] + extruder_offsets[0], point[2], -point[1] - extruder_offsets[1]]
-            extrusion_values[i] = point[4]
-            if i > 0:
-                line_feedrates[i - 1] = point[3]
-                line_types[i - 1] = point[5]
-                if point[5] in [LayerPolygon.MoveCombingType, LayerPolygon.MoveRetractionType]:
-                    line_widths[i - 1] = 0.1
-                    line_thicknesses[i - 1] = 0.0 # Travels are set as zero thickness lines
-                else:
-                    line_widths[i - 1] = self._calculateLineWidth(points[i], points[i-1], extrusion_values[i], extrusion_values[i-1], layer_thickness)
-            i += 1
-
-        this_poly = LayerPolygon(self._extruder_number, line_types, points, line_widths, line_thicknesses, line_feedrates)
-        this_poly.buildCache()
-
-        this_layer.polygons.append(this_poly)
+        points[:, 0] = path_points[:, GCodePath.X] + extruder_offsets[0]
+        points[:, 1] = path_points[:, GCodePath.Z]
+        points[:, 2] = -path_points[:, GCodePath.Y] - extruder_offsets[1]
+        extrusion_values = path_points[:, GCodePath.E].astype(numpy.float32)
+
+        # Every line goes from the previous point to the next one and gets the type and feedrate of its end point.
+        line_types = path_points[1:, GCodePath.TYPE].astype(numpy.int32).reshape((count - 1, 1))
+        line_feedrates = path_points[1:, GCodePath.F].astype(numpy.float32).reshape((count - 1, 1))
+        is_travel = (line_types == LayerPolygon.MoveCombingType) | (line_types == LayerPolygon.MoveRetractionType)
+        line_widths = numpy.where(is_travel, numpy.float32(0.1), self._calculateLineWidths(points, extrusion_values, layer_thickness).reshape((count - 1, 1))).astype(numpy.float32)
+        line_thicknesses = numpy.where(is_travel, numpy.float32(0.0), numpy.float32(layer_thickness)).astype(numpy.float32)  # Travels are set as zero thickness lines
+
+        this_layer.addPath(self._extruder_number, line_types, points, line_widths, line_thicknesses, line_feedrates)
         return True
 
     def _createEmptyLayer(self, layer_number: int) -> None:
@@ -147,44 +168,49 @@ class FlavorParser:
         self._layer_data_builder.setLayerHeight(layer_number, 0)
         self._layer_data_builder.setLayerThickness(layer_number, 0)
 
-    def _calculateLineWidth(self, current_point: Position, previous_point: Position, current_extrusion: float, previous_extrusion: float, layer_thickness: float) -> float:
+    ##  Estimate the widths of the lines of a path from how much filament is
+    #   extruded along them.
+    #
+    #   \param points The points of the path, as created by _createPolygon.
+    #   \param extrusion_values The extrusion value at each of the points.
+    #   \param layer_thickness The thickness of the lines.
+    #   \return The width of each line between two points.
+    def _calculateLineWidths(self, points: numpy.ndarray, extrusion_values: numpy.ndarray, layer_thickness: float) -> numpy.ndarray:
         # Area of the filament
         Af = (self._filament_diameter / 2) ** 2 * numpy.pi
         # Length of the extruded filament
-        de = current_extrusion - previous_extrusion
+        de = numpy.diff(extrusion_values)
         # Volumne of the extruded filament
         dVe = de * Af
         # Length of the printed line
-        dX = numpy.sqrt((current_point[0] - previous_point[0])**2 + (current_point[2] - previous_point[2])**2)
+        dX = numpy.sqrt(numpy.diff(points[:, 0]) ** 2 + numpy.diff(points[:, 2]) ** 2)
+        with numpy.errstate(divide = "ignore", invalid = "ignore"):
+            # Area of the printed line. This area is a rectangle
+            Ae = dVe / dX
+            # This area is a rectangle with area equal to layer_thickness * layer_width
+            line_widths = Ae / layer_thickness
+
+            # A threshold is set to avoid weird paths in the GCode
+            line_widths = numpy.where(line_widths > 1.2, numpy.float32(0.35), line_widths)
         # When the extruder recovers from a retraction, we get zero distance
-        if dX == 0:
-            return 0.1
-        # Area of the printed line. This area is a rectangle
-        Ae = dVe / dX
-        # This area is a rectangle with area equal to layer_thickness * layer_width
-        line_width = Ae / layer_thickness
-
-        # A threshold is set to avoid weird paths in the GCode
-        if line_width > 1.2:
-            return 0.35
-        return line_width
-
-    def _gCode0(self, position: Position, params: Position, path: List[List[Union[float, int]]]) -> Position:
+        return numpy.where(dX == 0, numpy.float32(0.1), line_widths)
+
+    def _gCode0(self, position: Position, params: Parameters, path: GCodePath) -> Position:
         x, y, z, f, e = position
 
         if self._is_absolute_positioning:
-            x = params.x if params.x is not None else x
-            y = params.y if params.y is not None else y
-            z = params.z if params.z is not None else z
+            x = params[X] if params[X] is not None else x
+            y = params[Y] if params[Y] is not None else y
+            z = params[Z] if params[Z] is not None else z
         else:
-            x += params.x if params.x is not None else 0
-            y += params.y if params.y is not None else 0
-            z += params.z if params.z is not None else 0
+            x += params[X] if params[X] is not None else 0
+            y += params[Y] if params[Y] is not None else 0
+            z += params[Z] if params[Z] is not None else 0
 
-        f = params.f if params.f is not None else f
+        f = params[F] if params[F] is not None else f
 
-        if params.e is not None:
-            new_extrusion_value = params.e if self._is_absolute_extrusion else e[self._extruder_number] + params.e
+        if params[E] is not None:
+            new_extrusion_value = params[E] if self._is_absolute_extrusion else e[self._extruder_number] + params[E]
             if new_extrusion_value > e[self._extruder_number]:
                 path.append([x, y, z, f, new_extrusion_value + self._extrusion_length_offset[self._extruder_number], self._layer_type])  # extrusion
             else:
@@ -198,84 +224,78 @@ class FlavorParser:
                 self._previous_z = z
         else:
             path.append([x, y, z, f, e[self._extruder_number] + self._extrusion_length_offset[self._extruder_number], LayerPolygon.MoveCombingType])
-        return self._position(x, y, z, f, e)
+
+        position[X] = x
+        position[Y] = y
+        position[Z] = z
+        position[F] = f
+        return position
 
 
     # G0 and G1 should be handled exactly the same.
     _gCode1 = _gCode0
 
     ##  Home the head.
-    def _gCode28(self, position: Position, params: Position, path: List[List[Union[float, int]]]) -> Position:
-        return self._position(
-            params.x if params.x is not None else position.x,
-            params.y if params.y is not None else position.y,
-            params.z if params.z is not None else position.z,
-            position.f,
-            position.e)
+    def _gCode28(self, position: Position, params: Parameters, path: GCodePath) -> Position:
+        for index in (X, Y, Z):
+            if params[index] is not None:
+                position[index] = params[index]
+        return position
 
     ##  Set the absolute positioning
-    def _gCode90(self, position: Position, params: Position, path: List[List[Union[float, int]]]) -> Position:
+    def _gCode90(self, position: Position, params: Parameters, path: GCodePath) -> Position:
         self._is_absolute_positioning = True
         self._is_absolute_extrusion = True
         return position
 
     ##  Set the relative positioning
-    def _gCode91(self, position: Position, params: Position, path: List[List[Union[float, int]]]) -> Position:
+    def _gCode91(self, position: Position, params: Parameters, path: GCodePath) -> Position:
         self._is_absolute_positioning = False
         self._is_absolute_extrusion = False
         return position
 
     ##  Reset the current position to the values specified.
     #   For example: G92 X10 will set the X to 10 without any physical motion.
-    def _gCode92(self, position: Position, params: Position, path: List[List[Union[float, int]]]) -> Position:
-        if params.e is not None:
+    def _gCode92(self, position: Position, params: Parameters, path: GCodePath) -> Position:
+        if params[E] is not None:
             # Sometimes a G92 E0 is introduced in the middle of the GCode so we need to keep those offsets for calculate the line_width
-            self._extrusion_length_offset[self._extruder_number] += position.e[self._extruder_number] - params.e
-            position.e[self._extruder_number] = params.e
-        return self._position(
-            params.x if params.x is not None else position.x,
-            params.y if params.y is not None else position.y,
-            params.z if params.z is not None else position.z,
-            params.f if params.f is not None else position.f,
-            position.e)
-
-    def processGCode(self, G: int, line: str, position: Position, path: List[List[Union[float, int]]]) -> Position:
-        func = getattr(self, "_gCode%s" % G, None)
-        line = line.split(";", 1)[0]  # Remove comments (if any)
-        if func is not None:
-            s = line.upper().split(" ")
-            x, y, z, f, e = None, None, None, None, None
-            for item in s[1:]:
-                if len(item) <= 1:
-                    continue
-                if item.startswith(";"):
-                    continue
-                if item[0] == "X":
-                    x = float(item[1:])
-                if item[0] == "Y":
-                    y = float(item[1:])
-                if item[0] == "Z":
-                    z = float(item[1:])
-                if item[0] == "F":
-                    f = float(item[1:]) / 60
-                if item[0] == "E":
-                    e = float(item[1:])
-            params = self._position(x, y, z, f, e)
-            return func(position, params, path)
+            self._extrusion_length_offset[self._extruder_number] += position[E][self._extruder_number] - params[E]
+            position[E][self._extruder_number] = params[E]
+        for index in (X, Y, Z, F):
+            if params[index] is not None:
+                position[index] = params[index]
         return position
 
-    def processTCode(self, T: int, line: str, position: Position, path: List[List[Union[float, int]]]) -> Position:
+    ##  Process a G-code.
+    #
+    #   \param G The code of the G-code.
+    #   \param line The line with the G-code.
+    #   \param params The parameters of the line as returned by GCodeTokenizer,
+    #   if it was tokenized already.
+    def processGCode(self, G: int, line: str, position: Position, path: GCodePath, params: Optional[Parameters] = None) -> Position:
+        func = self._gcode_handlers.get(G)
+        if func is None:
+            return position
+        if params is None:
+            tokens = GCodeTokenizer.tokenizeLine(line)
+            params = tokens[2] if tokens is not None else [None] * GCodeTokenizer.PARAMETER_COUNT
+        if params[F] is not None:
+            params[F] /= 60  # Feedrates are in mm/min in the g-code, but in mm/s in the layer data.
+        return func(position, params, path)
+
+    def processTCode(self, T: int, line: str, position: Position, path: GCodePath) -> Position:
         self._extruder_number = T
-        if self._extruder_number + 1 > len(position.e):
-            self._extrusion_length_offset.extend([0] * (self._extruder_number - len(position.e) + 1))
-            position.e.extend([0] * (self._extruder_number - len(position.e) + 1))
+        if self._extruder_number + 1 > len(position[E]):
+            self._extrusion_length_offset.extend([0] * (self._extruder_number - len(position[E]) + 1))
+            position[E].extend([0] * (self._extruder_number - len(position[E]) + 1))
         return position
 
-    def processMCode(self, M: int, line: str, position: Position, path: List[List[Union[float, int]]]) -> Position:
+    def processMCode(self, M: int, line: str, position: Position, path: GCodePath) -> Position:
         pass
 
     _type_keyword = ";TYPE:"
     _layer_keyword = ";LAYER:"
+    _lines_per_yield = 10000  # When the size of the file is not known, give other threads a chance every so many lines.
 
     ##  For showing correct x, y offsets for each extruder
     def _extruderOffsets(self) -> Dict[int, List[float]]:
@@ -286,7 +306,536 @@ class FlavorParser:
                 extruder.getProperty("machine_nozzle_offset_y", "value")]
         return result
 
+    _layer_types = {
+        "WALL-INNER": LayerPolygon.InsetXType,
+        "WALL-OUTER": LayerPolygon.Inset0Type,
+        "SKIN": LayerPolygon.SkinType,
+        "SKIRT": LayerPolygon.SkirtType,
+        "SUPPORT": LayerPolygon.SupportType,
+        "FILL": LayerPolygon.InfillType
+    }
+
+    ##  Process a comment line, which may start a new feature type or layer.
+    def _processComment(self, line: str, current_position: Position, current_path: GCodePath) -> None:
+        if line.startswith(self._type_keyword):
+            type = line[len(self._type_keyword):].strip()
+            if type in self._layer_types:
+                self._layer_type = self._layer_types[type]
+            else:
+                Logger.log("w", "Encountered a unknown type (%s) while parsing g-code.", type)
+
+        # When the layer change is reached, the polygon is computed so we have just one layer per extruder
+        elif self._is_layers_in_file and line.startswith(self._layer_keyword):
+            try:
+                layer_number = int(line[len(self._layer_keyword):])
+                self._createPolygon(self._current_layer_thickness, current_path, self._extruder_offsets.get(self._extruder_number, [0, 0]))
+                current_path.clear()
+                # Start the new layer at the end position of the last layer
+                current_path.append([current_position[X], current_position[Y], current_position[Z], current_position[F], current_position[E][self._extruder_number], LayerPolygon.MoveCombingType])
+
+                # When using a raft, the raft layers are stored as layers < 0, it mimics the same behavior
+                # as in ProcessSlicedLayersJob
+                if layer_number < self._min_layer_number:
+                    self._min_layer_number = layer_number
+                if layer_number < 0:
+                    layer_number += abs(self._min_layer_number)
+                    self._negative_layers += 1
+                else:
+                    layer_number += self._negative_layers
+
+                # In case there is a gap in the layer count, empty layers are created
+                for empty_layer in range(self._previous_layer + 1, layer_number):
+                    self._createEmptyLayer(empty_layer)
+
+                self._layer_number = layer_number
+                self._previous_layer = layer_number
+            except:
+                pass
+
+    ##  Process a line of g-code.
+    #
+    #   \param line The line, without its line ending and not empty.
+    #   \return The position after the line.
+    def _processLine(self, line: str, current_position: Position, current_path: GCodePath) -> Position:
+        if line[0] == ";":  # This line is a comment. Ignore it, except for the type and layer keywords.
+            self._processComment(line, current_position, current_path)
+            return current_position
+
+        tokens = GCodeTokenizer.tokenizeLine(line)
+        if tokens is None:
+            return current_position
+        letter, code, params = tokens
+
+        if letter == "G":
+            # When find a movement, the new posistion is calculated and added to the current_path, but
+            # don't need to create a polygon until the end of the layer
+            return self.processGCode(code, line, current_position, current_path, params)
+
+        # When changing the extruder, the polygon with the stored paths is computed
+        if letter == "T":
+            self._createPolygon(self._current_layer_thickness, current_path, self._extruder_offsets.get(self._extruder_number, [0, 0]))
+            current_path.clear()
+
+            # When changing tool, store the end point of the previous path, then process the code and finally
+            # add another point with the new position of the head.
+            current_path.append([current_position[X], current_position[Y], current_position[Z], current_position[F], current_position[E][self._extruder_number], LayerPolygon.MoveCombingType])
+            current_position = self.processTCode(code, line, current_position, current_path)
+            current_path.append([current_position[X], current_position[Y], current_position[Z], current_position[F], current_position[E][self._extruder_number], LayerPolygon.MoveCombingType])
+
+        elif letter == "M":
+            self.processMCode(code, line, current_position, current_path)
+        return current_position
+
+    ##  Get the state of the parser that carries over from one line to the
+    #   next, so that parsing can continue from there elsewhere.
+    #
+    #   \param position The current position.
+    #   \return The state, as a dictionary that can be pickled.
+    def _getParseState(self, position: Position) -> Dict[str, Any]:
+        return {
+            "position": copy.deepcopy(position),
+            "extruder_number": self._extruder_number,
+            "extrusion_length_offset": list(self._extrusion_length_offset),
+            "layer_type": self._layer_type,
+            "layer_number": self._layer_number,
+            "previous_z": self._previous_z,
+            "current_layer_thickness": self._current_layer_thickness,
+            "is_absolute_positioning": self._is_absolute_positioning,
+            "is_absolute_extrusion": self._is_absolute_extrusion,
+            "min_layer_number": self._min_layer_number,
+            "negative_layers": self._negative_layers,
+            "previous_layer": self._previous_layer,
+            "is_layers_in_file": self._is_layers_in_file,
+            "filament_diameter": self._filament_diameter,
+            "extruder_offsets": self._extruder_offsets
+        }
+
+    ##  Continue parsing from a state given by _getParseState, with new layer
+    #   data.
+    #
+    #   This also prepares a parser that was created without __init__, as in
+    #   the worker processes that parse chunks of g-code.
+    def _setParseState(self, state: Dict[str, Any]) -> None:
+        self._cancelled = False
+        self._gcode_handlers = self._getGCodeHandlers()
+        self._layer_data_builder = LayerDataBuilder.LayerDataBuilder()
+        self._extruder_number = state["extruder_number"]
+        self._extrusion_length_offset = list(state["extrusion_length_offset"])
+        self._layer_type = state["layer_type"]
+        self._layer_number = state["layer_number"]
+        self._previous_z = state["previous_z"]
+        self._current_layer_thickness = state["current_layer_thickness"]
+        self._is_absolute_positioning = state["is_absolute_positioning"]
+        self._is_absolute_extrusion = state["is_absolute_extrusion"]
+        self._min_layer_number = state["min_layer_number"]
+        self._negative_layers = state["negative_layers"]
+        self._previous_layer = state["previous_layer"]
+        self._is_layers_in_file = state["is_layers_in_file"]
+        self._filament_diameter = state["filament_diameter"]
+        self._extruder_offsets = state["extruder_offsets"]
+
+    ##  Parse a file line by line.
+    #
+    #   \param file The file, opened in binary or in text mode.
+    #   \param file_size The size of the file, if it's known.
+    #   \param gcode_list The g-code list to add the layers of the file to.
+    #   \return Whether the file was parsed, or False if it was cancelled.
+    def _parseGCodeFile(self, file: IO, file_size: Optional[int], gcode_list: GCodeBuffer) -> bool:
+        is_binary = not isinstance(file, io.TextIOBase)
+        newline = b"\n" if is_binary else "\n"
+        empty = b"" if is_binary else ""
+        layer_keyword = self._layer_keyword.encode("utf-8") if is_binary else self._layer_keyword
+        chunk_lines = []  # type: List[Union[str, bytes]]
+
+        current_position = [0, 0, 0, 0, [0]]  # type: Position
+        current_path = GCodePath()
+
+        # Show the progress every percent of the file, or every so many lines if the size is not known.
+        progress_step = max(file_size // 100, 1) if file_size else None
+        next_progress = progress_step
+        read_size = 0
+        current_line = 0
+
+        for line in file:
+            if self._cancelled:
+                return False
+            current_line += 1
+            read_size += len(line)
+
+            if progress_step is not None:
+                if read_size >= next_progress:
+                    self._message.setProgress(min(math.floor(read_size / file_size * 100), 100))
+                    next_progress = read_size + progress_step
+                    Job.yieldThread()
+            elif current_line % self._lines_per_yield == 0:
+                Job.yieldThread()
+
+            # Every layer starts a new chunk of the g-code list.
+            if line.startswith(layer_keyword):
+                self._is_layers_in_file = True
+                if chunk_lines:
+                    gcode_list.append(empty.join(chunk_lines))
+                    chunk_lines = []
+            chunk_lines.append(line)
+
+            if is_binary:
+                line = line.decode("utf-8", "replace")
+            line = line.rstrip()
+            if len(line) == 0:
+                continue
+            current_position = self._processLine(line, current_position, current_path)
+
+        if chunk_lines:
+            if not chunk_lines[-1].endswith(newline):
+                chunk_lines[-1] += newline
+            gcode_list.append(empty.join(chunk_lines))
+            chunk_lines = []
+
+        # "Flush" leftovers. Last layer paths are still stored
+        if len(current_path) > 1:
+            if self._createPolygon(self._current_layer_thickness, current_path, self._extruder_offsets.get(self._extruder_number, [0, 0])):
+                self._layer_number += 1
+                current_path.clear()
+        return True
+
+    ##  Parse a file in chunks of layers, with a pool of worker processes.
+    #
+    #   The state of the parser at the start of each chunk is found first, by
+    #   processing only the lines that change it: commands other than moves,
+    #   the ;TYPE: and ;LAYER: comments and the last moves before the start of
+    #   each chunk. The chunks are then parsed by the workers and their layers
+    #   are added to the layer data in order.
+    #
+    #   \param file The file, opened in binary mode.
+    #   \param gcode_list The g-code list to add the layers of the file to.
+    #   \param pool The pool of worker processes.
+    #   \return Whether the file was parsed, False if it was cancelled, or
+    #   None if it can't be parsed in chunks, e.g. because it has no layers.
+    def _parseGCodeFileInParallel(self, file: IO, gcode_list: GCodeBuffer, pool: multiprocessing.pool.Pool) -> Optional[bool]:
+        try:
+            data = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)  # Doesn't need to read the file into memory.
+        except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+            data = file.read()
+        try:
+            layer_offsets = GCodeChunkParser.findLayerOffsets(data)
+            if not layer_offsets:
+                return None
+            self._splitGCodeList(data, layer_offsets, gcode_list)
+
+            # A few chunks per worker, so that they are still all busy if some chunks take longer.
+            chunk_size = max(len(data) // (self._pool_worker_count * self._chunks_per_worker), 1)
+            chunk_starts = self._getChunkStarts(data, layer_offsets, chunk_size)
+            states = self._getChunkStates(data, layer_offsets[0], chunk_starts)
+            tasks = []
+            for index, state in enumerate(states):
+                chunk_end = chunk_starts[index + 1] if index + 1 < len(chunk_starts) else len(data)
+                tasks.append((type(self), state, data[chunk_starts[index]:chunk_end]))
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+        Logger.log("d", "Parsing g-code in %s chunks with %s worker processes.", len(tasks), self._pool_worker_count)
+        self._clearValues()
+        try:
+            for index, (layer_number, layers) in enumerate(pool.imap(GCodeChunkParser.parseChunk, tasks)):
+                if self._cancelled:
+                    return False
+                self._addLayerColumns(layers)
+                self._layer_number = layer_number
+                self._message.setProgress(math.floor((index + 1) / len(tasks) * 100))
+                Job.yieldThread()
+        except Exception:
+            Logger.logException("w", "Parsing g-code in a pool of workers failed. Parsing it line by line instead.")
+            self._closePool()
+            return None
+        return True
+
+    ##  Split g-code into the chunks of the g-code list, one per layer, like
+    #   when the file is parsed line by line.
+    #
+    #   \param data The g-code.
+    #   \param layer_offsets Where the ;LAYER: lines are.
+    #   \param gcode_list The g-code list to add the chunks to.
+    #   \return The offset in the g-code where each chunk starts.
+    def _splitGCodeList(self, data: bytes, layer_offsets: List[int], gcode_list: GCodeBuffer) -> List[int]:
+        chunk_offsets = []
+        for start, end in zip([0] + layer_offsets, layer_offsets + [len(data)]):
+            if end > start:
+                gcode_list.append(data[start:end])
+                chunk_offsets.append(start)
+        if data[-1:] != b"\n":
+            gcode_list[-1] += "\n"
+        return chunk_offsets
+
+    ##  Choose the layers where the chunks to parse separately start.
+    #
+    #   \param data The g-code.
+    #   \param layer_offsets Where the ;LAYER: lines are.
+    #   \param chunk_size The size in bytes that the chunks should at least
+    #   have. With a size of 1, every layer is a chunk.
+    #   \return The offsets where the chunks start, beginning with 0.
+    def _getChunkStarts(self, data: bytes, layer_offsets: List[int], chunk_size: int) -> List[int]:
+        split_limit = GCodeChunkParser.findSplitLimit(data, layer_offsets[0])
+        chunk_starts = [0]
+        for offset in layer_offsets:
+            if offset >= split_limit:
+                break
+            if offset - chunk_starts[-1] < chunk_size:
+                continue
+            try:
+                int(GCodeChunkParser.getLine(data, offset)[len(self._layer_keyword):])
+            except ValueError:  # Not a layer after all, see _processComment.
+                continue
+            chunk_starts.append(offset)
+        return chunk_starts
+
+    ##  Find the state of the parser at the start of each chunk.
+    #
+    #   The lines before the first layer are all processed. After that, only
+    #   the lines that change the state are processed: commands other than
+    #   moves, the ;TYPE: and ;LAYER: comments, the last moves that set each
+    #   parameter before the start of a chunk, the moves that set the
+    #   extrusion before a G92 or a tool change and the moves that change the
+    #   height, with the first extrusion after them.
+    #
+    #   \param data The g-code.
+    #   \param first_layer_offset Where the first layer starts.
+    #   \param chunk_starts Where the chunks start, as given by _getChunkStarts.
+    #   \return The state at the start of each chunk.
+    def _getChunkStates(self, data: bytes, first_layer_offset: int, chunk_starts: List[int]) -> List[Dict[str, Any]]:
+        current_position = [0, 0, 0, 0, [0]]  # type: Position
+        current_path = GCodePath()  # Only there for the handlers. Nothing is created from it.
+        states = [self._getParseState(current_position)]
+        states[0]["is_layers_in_file"] = True
+        if len(chunk_starts) == 1:
+            return states
+
+        # All of the start g-code, which may use relative moves.
+        for line in data[:first_layer_offset].decode("utf-8", "replace").split("\n"):
+            line = line.rstrip()
+            if line:
+                current_position = self._processLine(line, current_position, current_path)
+                current_path.clear()
+        self._is_layers_in_file = True
+
+        codes = "|".join(str(code) for code in self._gcode_handlers if code not in (0, 1))
+        state_line_pattern = re.compile(r"\n(?:G(?:{codes})\b|[MT]\d|;TYPE:|;LAYER:)".format(codes = codes).encode("utf-8"))
+        line_offsets = set()
+        for index in range(1, len(chunk_starts)):
+            start = max(chunk_starts[index - 1], first_layer_offset)
+            end = chunk_starts[index]
+            state_line_offsets = [match.start() + 1 for match in state_line_pattern.finditer(data, max(start - 1, 0), end)]
+            line_offsets.update(state_line_offsets)
+            for offset in state_line_offsets:
+                # The extrusion value before it is reset or before the extruder changes.
+                if data[offset:offset + 3] == b"G92" or data[offset:offset + 1] == b"T":
+                    line_offsets.add(GCodeChunkParser.findLastMove(data, start, offset, E))
+            for parameter in (X, Y, Z, F, E):
+                line_offsets.add(GCodeChunkParser.findLastMove(data, start, end, parameter))
+            # The layer thickness follows from the height of the first move with extrusion after each change of
+            # height, so those are needed as well.
+            height_changes = GCodeChunkParser.findMoves(data, start, end, Z)
+            line_offsets.update(height_changes)
+            for height_change, next_height_change in zip(height_changes, height_changes[1:] + [end]):
+                line_offsets.update(GCodeChunkParser.findMoves(data, height_change, next_height_change, E, first = True))
+        line_offsets.discard(None)
+        line_offsets.update(chunk_starts[1:])
+
+        chunk_start_set = set(chunk_starts)
+        for offset in sorted(line_offsets):
+            if offset in chunk_start_set:
+                states.append(self._getParseState(current_position))
+            line = GCodeChunkParser.getLine(data, offset)
+            if line:
+                current_position = self._processLine(line, current_position, current_path)
+                current_path.clear()
+        return states
+
+    _parallel_minimum_size = 4 * 1024 * 1024  # Smaller files are parsed line by line, since starting to parse in parallel takes time too.
+    _chunks_per_worker = 4
+    _pool = None  # type: Optional[multiprocessing.pool.Pool]
+    _pool_worker_count = 0
+
+    ##  Get the pool of worker processes to parse g-code with, as configured
+    #   in the preferences.
+    #
+    #   The pool is shared by all flavor parsers, since starting the workers
+    #   takes time.
+    #   \return A multiprocessing pool, or None to parse the g-code line by
+    #   line.
+    @classmethod
+    def _getPool(cls) -> Optional[multiprocessing.pool.Pool]:
+        worker_count = int(Application.getInstance().getPreferences().getValue("gcodereader/parsing_workers"))
+        if worker_count == 0:
+            worker_count = os.cpu_count() or 1
+        if worker_count <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+            # Any other way of starting the worker processes runs the start-up script of Cura again in each worker.
+            cls._closePool()
+            return None
+
+        if cls._pool is None or cls._pool_worker_count != worker_count:
+            cls._closePool()
+            Logger.log("d", "Starting a pool of %s worker processes to parse g-code.", worker_count)
+            cls._pool = multiprocessing.get_context("fork").Pool(worker_count)
+            cls._pool_worker_count = worker_count
+        return cls._pool
+
+    @classmethod
+    def _closePool(cls) -> None:
+        if cls._pool is not None:
+            cls._pool.terminate()
+            cls._pool = None
+            cls._pool_worker_count = 0
+
+    ##  Get the layers that were created, as columns.
+    #
+    #   \return The layers in the order in which they were created. Each layer
+    #   is a tuple of its number, height, thickness and its paths as columns,
+    #   like the arguments of Layer.addPaths.
+    def _getLayerColumns(self) -> List[Tuple]:
+        layers = []
+        for layer_number, layer in self._layer_data_builder.getLayers().items():
+            layers.append((layer_number, layer.height, layer.thickness, layer.extruders, numpy.diff(layer.pathOffsets),
+                           layer.types, layer.points, layer.lineWidths, layer.lineThicknesses, layer.lineFeedrates))
+        return layers
+
+    ##  Add layers as given by _getLayerColumns.
+    def _addLayerColumns(self, layers: List[Tuple]) -> None:
+        for layer_id, height, thickness, extruders, point_counts, line_types, points, line_widths, line_thicknesses, line_feedrates in layers:
+            self._layer_data_builder.addLayer(layer_id)
+            self._layer_data_builder.setLayerHeight(layer_id, height)
+            self._layer_data_builder.setLayerThickness(layer_id, thickness)
+            self._layer_data_builder.getLayer(layer_id).addPaths(extruders, point_counts, line_types, points, line_widths, line_thicknesses, line_feedrates)
+
+    _layer_index = None  # type: Optional[GCodeLayerIndex]
+    _layer_index_minimum_size = 4 * 1024 * 1024  # Smaller files are parsed quickly enough.
+
+    ##  Get the key of a file in the layer index, if the layer index is used
+    #   for it.
+    #
+    #   \return The key as given by GCodeLayerIndex.getKey, or None if the
+    #   layer index is not used for the file.
+    def _getLayerIndexKey(self, file: IO, file_size: Optional[int]) -> Optional[Dict[str, Any]]:
+        if not Application.getInstance().getPreferences().getValue("gcodereader/layer_index"):
+            return None
+        file_name = getattr(file, "name", None)
+        if isinstance(file, io.TextIOBase) or not isinstance(file_name, str) or not os.path.isfile(file_name):
+            return None
+        if file_size is None or file_size < self._layer_index_minimum_size:
+            return None
+        if FlavorParser._layer_index is None:
+            FlavorParser._layer_index = GCodeLayerIndex(os.path.join(Resources.getCacheStoragePath(), "gcode_index"))
+        try:
+            return self._layer_index.getKey(file_name, file)
+        except EnvironmentError:
+            return None
+
+    ##  The settings that the layer data of a file depends on.
+    def _getLayerIndexSettings(self) -> Dict[str, Any]:
+        return {
+            "parser": type(self).__name__,
+            "filament_diameter": self._filament_diameter,
+            "extruder_offsets": {str(extruder): list(offsets) for extruder, offsets in self._extruder_offsets.items()}
+        }
+
+    ##  Get the layers and g-code list of a file from its layer index, without
+    #   parsing the file.
+    #
+    #   \param file The file, opened in binary mode and at its start.
+    #   \param key The key of the file, as given by _getLayerIndexKey.
+    #   \param gcode_list The g-code list to add the layers of the file to.
+    #   \return Whether there was a valid index of the file.
+    def _loadLayerIndex(self, file: IO, key: Dict[str, Any], gcode_list: GCodeBuffer) -> bool:
+        index = self._layer_index.load(key, self._getLayerIndexSettings())
+        if index is None:
+            return False
+        chunk_sizes, layer_number, layers = index
+        Logger.log("d", "Loading g-code from its layer index, without parsing it.")
+        for chunk_size in chunk_sizes:
+            gcode_list.append(file.read(chunk_size))
+        if gcode_list and not gcode_list.getBytes(len(gcode_list) - 1).endswith(b"\n"):
+            gcode_list[-1] += "\n"
+        self._addLayerColumns(layers)
+        self._layer_number = layer_number
+        return True
+
+    _lazy_layers_minimum_size = 4 * 1024 * 1024  # Smaller files are parsed quickly enough.
+
+    ##  Index the layers of a file, so that only the layers that are shown
+    #   need to be decoded, see LazyLayerDataDecorator.
+    #
+    #   The file is split into the chunks of the g-code list and the state of
+    #   the parser at the start of every layer is found, like when the file is
+    #   parsed in parallel, but none of the layers is parsed.
+    #
+    #   \param file The file, opened in binary mode.
+    #   \param gcode_list The g-code list to add the layers of the file to.
+    #   \return The chunks of the file that can be decoded separately, as
+    #   tuples of the state of the parser at their start, the number of their
+    #   layer and the chunks of the g-code list that they consist of. None if
+    #   the file can't be split into layers, False if it was cancelled.
+    def _indexGCodeFile(self, file: IO, gcode_list: GCodeBuffer) -> Union[List[Tuple[Dict[str, Any], int, List[bytes]]], bool, None]:
+        try:
+            data = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+        except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+            data = file.read()
+        try:
+            layer_offsets = GCodeChunkParser.findLayerOffsets(data)
+            if not layer_offsets:
+                return None
+            list_offsets = self._splitGCodeList(data, layer_offsets, gcode_list)
+            chunk_starts = self._getChunkStarts(data, layer_offsets, 1)
+            states = self._getChunkStates(data, layer_offsets[0], chunk_starts)
+            first_lines = [GCodeChunkParser.getLine(data, start) for start in chunk_starts]
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+        self._clearValues()
+        if self._cancelled:
+            return False
+
+        # Every chunk starts with a layer, so with a chunk of the g-code list. The chunks share the bytes of those.
+        list_indices = {offset: index for index, offset in enumerate(list_offsets)}
+        list_starts = [list_indices[start] for start in chunk_starts] + [len(gcode_list)]
+        chunks = []
+        for index, state in enumerate(states):
+            parts = [gcode_list.getBytes(list_index) for list_index in range(list_starts[index], list_starts[index + 1])]
+            chunks.append((state, self._getChunkLayerNumber(state, first_lines[index]), parts))
+        Logger.log("d", "Indexed %s layers of g-code to decode when they are shown.", len(chunks))
+        return chunks
+
+    ##  Find the number of the layer of a chunk, from the state at its start
+    #   and its ;LAYER: line.
+    def _getChunkLayerNumber(self, state: Dict[str, Any], first_line: str) -> int:
+        parser = type(self).__new__(type(self))
+        parser._setParseState(state)
+        parser._processComment(first_line, copy.deepcopy(state["position"]), GCodePath())
+        return parser._layer_number
+
+    ##  Parse g-code from a string.
+    #
+    #   This is the same as processGCodeFile, for g-code that is in memory
+    #   already.
     def processGCodeStream(self, stream: str) -> Optional[CuraSceneNode]:
+        return self.processGCodeFile(io.StringIO(stream), len(stream))
+
+    ##  Parse g-code from a file, reading it line by line.
+    #
+    #   The file is read just once. Its lines are kept in the g-code list of
+    #   the scene node, one chunk per layer, but no other copy of the file is
+    #   kept in memory.
+    #
+    #   Big files may be parsed in chunks of layers by a pool of worker
+    #   processes instead, see the "gcodereader/parsing_workers" preference,
+    #   or only indexed, to decode only the layers that are shown, see the
+    #   "gcodereader/lazy_layer_count" preference.
+    #
+    #   \param file A file object opened for reading, in binary mode or in
+    #   text mode.
+    #   \param file_size The size of the file in bytes (or characters, for
+    #   text files), to show the progress. If it's not known, the progress is
+    #   not shown.
+    def processGCodeFile(self, file: IO, file_size: Optional[int] = None) -> Optional[CuraSceneNode]:
         Logger.log("d", "Preparing to load GCode")
         self._cancelled = False
         # We obtain the filament diameter from the selected extruder to calculate line widths
@@ -298,131 +847,62 @@ class FlavorParser:
         # real data to calculate it from.
         scene_node.getBoundingBox = self._getNullBoundingBox
 
-        gcode_list = []
-        self._is_layers_in_file = False
+        # The g-code of the file, one chunk per layer. Binary files are kept as they are, without decoding them.
+        gcode_list = GCodeBuffer()
 
         self._extruder_offsets = self._extruderOffsets()  # dict with index the extruder number. can be empty
 
         ##############################################################################################
         ##  This part is where the action starts
         ##############################################################################################
-        file_lines = 0
-        current_line = 0
-        for line in stream.split("\n"):
-            file_lines += 1
-            gcode_list.append(line + "\n")
-            if not self._is_layers_in_file and line[:len(self._layer_keyword)] == self._layer_keyword:
-                self._is_layers_in_file = True
-
-        file_step = max(math.floor(file_lines / 100), 1)
-
         self._clearValues()
+        # The ;LAYER: comments are only processed once one of them is found.
+        self._is_layers_in_file = False
 
         self._message = Message(catalog.i18nc("@info:status", "Parsing G-code"),
                                 lifetime=0,
                                 title = catalog.i18nc("@info:title", "G-code Details"))
 
-        self._message.setProgress(0)
+        self._message.setProgress(0 if file_size else -1)
         self._message.show()
 
         Logger.log("d", "Parsing Gcode...")
 
-        current_position = self._position(0, 0, 0, 0, [0])
-        current_path = []
-        min_layer_number = 0
-        negative_layers = 0
-        previous_layer = 0
-
-        for line in stream.split("\n"):
-            if self._cancelled:
-                Logger.log("d", "Parsing Gcode file cancelled")
-                return None
-            current_line += 1
-
-            if current_line % file_step == 0:
-                self._message.setProgress(math.floor(current_line / file_lines * 100))
-                Job.yieldThread()
-            if len(line) == 0:
-                continue
-
-            if line.find(self._type_keyword) == 0:
-                type = line[len(self._type_keyword):].strip()
-                if type == "WALL-INNER":
-                    self._layer_type = LayerPolygon.InsetXType
-                elif type == "WALL-OUTER":
-                    self._layer_type = LayerPolygon.Inset0Type
-                elif type == "SKIN":
-                    self._layer_type = LayerPolygon.SkinType
-                elif type == "SKIRT":
-                    self._layer_type = LayerPolygon.SkirtType
-                elif type == "SUPPORT":
-                    self._layer_type = LayerPolygon.SupportType
-                elif type == "FILL":
-                    self._layer_type = LayerPolygon.InfillType
-                else:
-                    Logger.log("w", "Encountered a unknown type (%s) while parsing g-code.", type)
-
-            # When the layer change is reached, the polygon is computed so we have just one layer per extruder
-            if self._is_layers_in_file and line[:len(self._layer_keyword)] == self._layer_keyword:
-                try:
-                    layer_number = int(line[len(self._layer_keyword):])
-                    self._createPolygon(self._current_layer_thickness, current_path, self._extruder_offsets.get(self._extruder_number, [0, 0]))
-                    current_path.clear()
-                    # Start the new layer at the end position of the last layer
-                    current_path.append([current_position.x, current_position.y, current_position.z, current_position.f, current_position.e[self._extruder_number], LayerPolygon.MoveCombingType])
-
-                    # When using a raft, the raft layers are stored as layers < 0, it mimics the same behavior
-                    # as in ProcessSlicedLayersJob
-                    if layer_number < min_layer_number:
-                        min_layer_number = layer_number
-                    if layer_number < 0:
-                        layer_number += abs(min_layer_number)
-                        negative_layers += 1
-                    else:
-                        layer_number += negative_layers
-
-                    # In case there is a gap in the layer count, empty layers are created
-                    for empty_layer in range(previous_layer + 1, layer_number):
-                        self._createEmptyLayer(empty_layer)
-
-                    self._layer_number = layer_number
-                    previous_layer = layer_number
-                except:
-                    pass
-
-            # This line is a comment. Ignore it (except for the layer_keyword)
-            if line.startswith(";"):
-                continue
-
-            G = self._getInt(line, "G")
-            if G is not None:
-                # When find a movement, the new posistion is calculated and added to the current_path, but
-                # don't need to create a polygon until the end of the layer
-                current_position = self.processGCode(G, line, current_position, current_path)
-                continue
-
-            # When changing the extruder, the polygon with the stored paths is computed
-            if line.startswith("T"):
-                T = self._getInt(line, "T")
-                if T is not None:
-                    self._createPolygon(self._current_layer_thickness, current_path, self._extruder_offsets.get(self._extruder_number, [0, 0]))
-                    current_path.clear()
-
-                    # When changing tool, store the end point of the previous path, then process the code and finally
-                    # add another point with the new position of the head.
-                    current_path.append([current_position.x, current_position.y, current_position.z, current_position.f, current_position.e[self._extruder_number], LayerPolygon.MoveCombingType])
-                    current_position = self.processTCode(T, line, current_position, current_path)
-                    current_path.append([current_position.x, current_position.y, current_position.z, current_position.f, current_position.e[self._extruder_number], LayerPolygon.MoveCombingType])
-
-            if line.startswith("M"):
-                M = self._getInt(line, "M")
-                self.processMCode(M, line, current_position, current_path)
-
-        # "Flush" leftovers. Last layer paths are still stored
-        if len(current_path) > 1:
-            if self._createPolygon(self._current_layer_thickness, current_path, self._extruder_offsets.get(self._extruder_number, [0, 0])):
-                self._layer_number += 1
-                current_path.clear()
+        parsed = None
+        layer_index_key = self._getLayerIndexKey(file, file_size)
+        if layer_index_key is not None and self._loadLayerIndex(file, layer_index_key, gcode_list):
+            parsed = True
+            layer_index_key = None  # Up to date already.
+
+        is_binary = not isinstance(file, io.TextIOBase)
+        lazy_layer_chunks = None
+        lazy_layer_count = int(Application.getInstance().getPreferences().getValue("gcodereader/lazy_layer_count"))
+        if parsed is None and lazy_layer_count > 0 and is_binary and file_size is not None and file_size >= self._lazy_layers_minimum_size and file.seekable():
+            lazy_layer_chunks = self._indexGCodeFile(file, gcode_list)
+            if lazy_layer_chunks is None:  # Parse it after all.
+                file.seek(0)
+                gcode_list.clear()
+                self._is_layers_in_file = False
+            else:
+                parsed = bool(lazy_layer_chunks)
+                layer_index_key = None  # The layers are not all there to index.
+        if parsed is None and is_binary and file_size is not None and file_size >= self._parallel_minimum_size and file.seekable():
+            pool = self._getPool()
+            if pool is not None:
+                parsed = self._parseGCodeFileInParallel(file, gcode_list, pool)
+                if parsed is None:  # Parse it line by line after all.
+                    file.seek(0)
+                    gcode_list.clear()
+                    self._clearValues()
+                    self._is_layers_in_file = False
+        if parsed is None:
+            parsed = self._parseGCodeFile(file, file_size, gcode_list)
+        if not parsed:
+            Logger.log("d", "Parsing Gcode file cancelled")
+            return None
+        if layer_index_key is not None:
+            chunk_sizes = [len(gcode_list.getBytes(index)) for index in range(len(gcode_list))]
+            self._layer_index.save(layer_index_key, self._getLayerIndexSettings(), chunk_sizes, self._layer_number, self._getLayerColumns())
 
         material_color_map = numpy.zeros((8, 4), dtype = numpy.float32)
         material_color_map[0, :] = [0.0, 0.7, 0.9, 1.0]
@@ -433,9 +913,13 @@ class FlavorParser:
         material_color_map[5, :] = [0.0, 0.0, 0.7, 1.0]
         material_color_map[6, :] = [0.3, 0.3, 0.3, 1.0]
         material_color_map[7, :] = [0.7, 0.7, 0.7, 1.0]
-        layer_mesh = self._layer_data_builder.build(material_color_map)
-        decorator = LayerDataDecorator()
-        decorator.setLayerData(layer_mesh)
+        if lazy_layer_chunks:
+            decorator = LazyLayerDataDecorator(type(self), lazy_layer_chunks, material_color_map, lazy_layer_count)
+            self._layer_number = max(layer_number for state, layer_number, parts in lazy_layer_chunks) + 1
+        else:
+            layer_mesh = self._layer_data_builder.build(material_color_map)
+            decorator = LayerDataDecorator()
+            decorator.setLayerData(layer_mesh)
         scene_node.addDecorator(decorator)
 
         gcode_list_decorator = GCodeListDecorator()
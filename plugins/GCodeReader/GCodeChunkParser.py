@@ -0,0 +1,136 @@
+# Copyright (c) 2018 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import copy
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+
+from . import GCodeTokenizer
+from .GCodePath import GCodePath
+
+##  Helpers to parse g-code in chunks of layers, in parallel.
+#
+#   G-code of CuraEngine is split into layers by its ;LAYER: comments. Only a
+#   little state carries over from one layer to the next: the position, the
+#   extrusion offsets, the extruder, the feature type and the layer numbering.
+#   FlavorParser finds that state at the start of every chunk with a quick
+#   scan over only the lines that change it. The chunks are then parsed by
+#   parseChunk, in worker processes, and the layers that come out of them are
+#   merged in order.
+
+# Lines that start a layer, as FlavorParser splits the g-code list. The patterns of lines start with the newline
+# before them rather than with ^, since searching for a fixed first character is much faster.
+_layer_line_pattern = re.compile(rb"\n;LAYER:")
+
+# Commands after which the meaning of a move depends on all moves before it, and lower-case commands, which
+# the scan for the state at the start of the chunks doesn't look for.
+_unsplittable_pattern = re.compile(rb"\n(?:[Gg]91\b|[Mm]83\b|[a-z])")
+
+##  Find where the lines that start a layer are.
+#
+#   \param data The g-code.
+#   \return The offset of each ;LAYER: line.
+def findLayerOffsets(data: bytes) -> List[int]:
+    offsets = [match.start() + 1 for match in _layer_line_pattern.finditer(data)]
+    if data[:len(b";LAYER:")] == b";LAYER:":
+        offsets.insert(0, 0)
+    return offsets
+
+
+##  Find how far the g-code can be split into chunks.
+#
+#   After relative moves or lower-case commands the state at the start of a
+#   chunk can't be found without parsing everything in between, so chunks
+#   may only start before those.
+#
+#   \param data The g-code.
+#   \param start Where to start looking.
+#   \return The offset of the first line that chunks must not start after,
+#   or the length of the g-code if there is none.
+def findSplitLimit(data: bytes, start: int) -> int:
+    match = _unsplittable_pattern.search(data, max(start - 1, 0))
+    return match.start() + 1 if match is not None else len(data)
+
+
+##  Find the last G0 or G1 move that sets a parameter, within a part of the
+#   g-code.
+#
+#   \param data The g-code.
+#   \param start The offset of the line where the part starts.
+#   \param end Where the part ends.
+#   \param parameter The index of the parameter, as in GCodeTokenizer.
+#   \return The offset of the line of the move, or None if there is none.
+def findLastMove(data: bytes, start: int, end: int, parameter: int) -> Optional[int]:
+    letter = b"XYZFE"[parameter:parameter + 1]
+    position = end
+    while True:
+        position = data.rfind(letter, start, position)
+        if position < 0:
+            return None
+        line_start = max(data.rfind(b"\n", start, position) + 1, start)
+        line_end = data.find(b"\n", position)
+        tokens = GCodeTokenizer.tokenizeLine(data[line_start:line_end if line_end >= 0 else len(data)].decode("utf-8", "replace"))
+        if tokens is not None and tokens[0] == "G" and tokens[1] in (0, 1) and tokens[2][parameter] is not None:
+            return line_start
+        position = line_start
+
+
+##  Find the G0 and G1 moves that set a parameter, within a part of the
+#   g-code.
+#
+#   \param data The g-code.
+#   \param start The offset of the line where the part starts.
+#   \param end Where the part ends.
+#   \param parameter The index of the parameter, as in GCodeTokenizer.
+#   \param first Whether to only find the first move.
+#   \return The offsets of the lines of the moves.
+def findMoves(data: bytes, start: int, end: int, parameter: int, first: bool = False) -> List[int]:
+    letter = b"XYZFE"[parameter:parameter + 1]
+    offsets = []
+    position = start
+    while True:
+        position = data.find(letter, position, end)
+        if position < 0:
+            return offsets
+        line_start = max(data.rfind(b"\n", start, position) + 1, start)
+        line_end = data.find(b"\n", position)
+        if line_end < 0:
+            line_end = len(data)
+        tokens = GCodeTokenizer.tokenizeLine(data[line_start:line_end].decode("utf-8", "replace"))
+        if tokens is not None and tokens[0] == "G" and tokens[1] in (0, 1) and tokens[2][parameter] is not None:
+            offsets.append(line_start)
+            if first:
+                return offsets
+        position = line_end
+
+
+##  Get the line that starts at an offset.
+def getLine(data: bytes, start: int) -> str:
+    end = data.find(b"\n", start)
+    return data[start:end if end >= 0 else len(data)].decode("utf-8", "replace").rstrip()
+
+
+##  Parse a chunk of g-code. This is run in the worker processes.
+#
+#   \param task A tuple of the class of the flavor parser, the state of the
+#   parser at the start of the chunk as given by FlavorParser._getParseState
+#   and the g-code of the chunk.
+#   \return A tuple of the layer number after the chunk and the
+#   layers that were created, as given by FlavorParser._getLayerColumns.
+def parseChunk(task: Tuple[type, Dict[str, Any], bytes]) -> Tuple[int, List[Tuple]]:
+    parser_class, state, data = task
+    parser = parser_class.__new__(parser_class)  # Without __init__, which needs the application.
+    parser._setParseState(state)
+    current_position = copy.deepcopy(state["position"])  # The state may be used again, to parse the chunk again.
+    current_path = GCodePath()
+    for line in data.decode("utf-8", "replace").split("\n"):
+        line = line.rstrip()
+        if line:
+            current_position = parser._processLine(line, current_position, current_path)
+    # The next chunk starts with a new layer, which ends the path of this one. After the last chunk, the layer
+    # number counts the last layer too, like at the end of FlavorParser.processGCodeFile.
+    if parser._createPolygon(parser._current_layer_thickness, current_path, parser._extruder_offsets.get(parser._extruder_number, [0, 0])):
+        parser._layer_number += 1
+
+    return parser._layer_number, parser._getLayerColumns()
@@ -0,0 +1,169 @@
+# Copyright (c) 2018 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import hashlib
+import json
+import os
+import shutil
+from typing import Any, Dict, IO, List, Optional, Tuple
+
+import numpy
+
+from UM.Logger import Logger
+
+from cura import LayerColumnFiles
+
+##  An index of a g-code file that was parsed before, kept in the cache
+#   directory so that the file can be opened again without parsing it.
+#
+#   The index of a file is a directory with an index.json and the column files
+#   of the layer data, see LayerColumnFiles. The index.json has the size and
+#   modification time of the g-code file and a hash of parts of it, to tell
+#   whether the file is still the same, and the settings that the layer data
+#   depends on. It has the size of every chunk of the g-code list, i.e. the
+#   byte offsets of the layers in the file, and for every layer its height,
+#   thickness, bounding box, extruders and line types and where its rows are
+#   in the column files. The column files are memory-mapped when the file is
+#   opened again.
+class GCodeLayerIndex:
+    _version = 1
+
+    _sample_count = 64  # Number of parts of the file that are hashed.
+    _sample_size = 4096
+
+    ##  Creates the index cache.
+    #
+    #   \param path The directory to keep the indices in.
+    #   \param max_entries The number of files to keep an index of. The least
+    #   recently used ones are removed.
+    def __init__(self, path: str, max_entries: int = 8) -> None:
+        self._path = path
+        self._max_entries = max_entries
+
+    ##  Find out what identifies a g-code file: its path, size, modification
+    #   time and the hash of a few parts of it.
+    #
+    #   \param file_name The path of the file.
+    #   \param file The file, opened in binary mode. It's read and then put
+    #   back at its start.
+    #   \return The key of the file.
+    def getKey(self, file_name: str, file: IO) -> Dict[str, Any]:
+        stat = os.fstat(file.fileno())
+        hash = hashlib.sha1()
+        step = max(stat.st_size // self._sample_count, self._sample_size)
+        for offset in range(0, stat.st_size, step):
+            file.seek(offset)
+            hash.update(file.read(self._sample_size))
+        file.seek(max(stat.st_size - self._sample_size, 0))
+        hash.update(file.read(self._sample_size))
+        file.seek(0)
+        return {
+            "path": os.path.abspath(file_name),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "hash": hash.hexdigest()
+        }
+
+    ##  Load the index of a g-code file.
+    #
+    #   \param key The key of the file, as given by getKey().
+    #   \param settings The settings that the layer data depends on, which
+    #   must be the same as when the index was saved.
+    #   \return A tuple of the sizes of the chunks of the g-code list, the
+    #   layer number at the end of the file and the layers, as tuples of their
+    #   ID, height, thickness and their columns in the order of
+    #   Layer.addPaths(), with the columns memory-mapped. None if there is no
+    #   valid index for the file.
+    def load(self, key: Dict[str, Any], settings: Dict[str, Any]) -> Optional[Tuple[List[int], int, List[Tuple]]]:
+        directory = self._getDirectory(key)
+        try:
+            with open(os.path.join(directory, "index.json"), "r", encoding = "utf-8") as index_file:
+                index = json.load(index_file)
+        except (EnvironmentError, ValueError):
+            return None
+        if index.get("version") != self._version or index.get("key") != key or index.get("settings") != settings:
+            return None
+
+        layers = index["layers"]
+        try:
+            columns = LayerColumnFiles.readColumnFiles(directory, [(layer["path_count"], layer["line_count"], layer["point_count"]) for layer in layers])
+        except (EnvironmentError, ValueError):
+            Logger.logException("w", "Unable to read the g-code layer index in %s.", directory)
+            return None
+        os.utime(os.path.join(directory, "index.json"))  # Recently used.
+
+        result = [(layer["id"], layer["height"], layer["thickness"]) + layer_columns for layer, layer_columns in zip(layers, columns)]
+        return index["chunk_sizes"], index["layer_number"], result
+
+    ##  Save the index of a g-code file, replacing any index it had before.
+    #
+    #   \param key The key of the file, as given by getKey().
+    #   \param settings The settings that the layer data depends on.
+    #   \param chunk_sizes The size in bytes of each chunk of the g-code list.
+    #   \param layer_number The layer number at the end of the file.
+    #   \param layers The layers, as tuples of their ID, height, thickness and
+    #   their columns in the order of Layer.addPaths().
+    def save(self, key: Dict[str, Any], settings: Dict[str, Any], chunk_sizes: List[int], layer_number: int, layers: List[Tuple]) -> None:
+        directory = self._getDirectory(key)
+        self._removeDirectory(directory)
+        index_layers = []
+        try:
+            os.makedirs(directory)
+            with LayerColumnFiles.ColumnFileWriter(directory) as writer:
+                for layer_id, height, thickness, *columns in layers:
+                    path_count, line_count, point_count = writer.write(columns)
+                    points = columns[3]
+                    index_layers.append({
+                        "id": int(layer_id),
+                        "height": float(height),
+                        "thickness": float(thickness),
+                        "path_count": path_count,
+                        "line_count": line_count,
+                        "point_count": point_count,
+                        "minimum": points.min(axis = 0).tolist() if len(points) else None,
+                        "maximum": points.max(axis = 0).tolist() if len(points) else None,
+                        "extruders": numpy.unique(columns[0]).tolist(),
+                        "line_types": numpy.unique(columns[2]).tolist()
+                    })
+
+            # The index itself is written last, so that an index that wasn't completely written is never used.
+            index = {
+                "version": self._version,
+                "key": key,
+                "settings": settings,
+                "chunk_sizes": chunk_sizes,
+                "layer_number": layer_number,
+                "layers": index_layers
+            }
+            with open(os.path.join(directory, "index.json"), "w", encoding = "utf-8") as index_file:
+                json.dump(index, index_file)
+        except EnvironmentError:
+            Logger.logException("w", "Unable to write the g-code layer index in %s.", directory)
+            self._removeDirectory(directory)
+            return
+        self._removeOldEntries()
+
+    ##  Each file has its own directory, so that a new index of a file that
+    #   was changed replaces the old one.
+    def _getDirectory(self, key: Dict[str, Any]) -> str:
+        return os.path.join(self._path, hashlib.sha1(key["path"].encode("utf-8")).hexdigest())
+
+    def _removeOldEntries(self) -> None:
+        entries = []
+        for name in os.listdir(self._path):
+            directory = os.path.join(self._path, name)
+            try:
+                entries.append((os.path.getmtime(os.path.join(directory, "index.json")), directory))
+            except EnvironmentError:  # Not a complete index. It may be written right now.
+                continue
+        entries.sort()
+        for last_used, directory in entries[:max(len(entries) - self._max_entries, 0)]:
+            self._removeDirectory(directory)
+
+    def _removeDirectory(self, directory: str) -> None:
+        try:
+            shutil.rmtree(directory)
+        except FileNotFoundError:
+            pass
+        except EnvironmentError:  # E.g. files that are still mapped on Windows. They're removed the next time.
+            Logger.log("w", "Unable to remove the g-code layer index in %s.", directory)
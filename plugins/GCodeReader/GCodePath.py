@@ -0,0 +1,46 @@
+# Copyright (c) 2018 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import array
+from typing import Sequence
+
+import numpy
+
+##  The points of a path while the g-code is parsed, in a growable array.
+#
+#   Each point is an X, Y, Z position, a feedrate, an extrusion value and the
+#   line type of the line towards the point. The points are added one at a
+#   time, like to a list, but they are stored as doubles in one array that
+#   grows as needed, so the whole path can be turned into a numpy array at
+#   once when the polygons of a layer are created.
+class GCodePath:
+    # Indices of the values of a point in the array of the path.
+    X = 0
+    Y = 1
+    Z = 2
+    F = 3
+    E = 4
+    TYPE = 5
+    POINT_SIZE = 6
+
+    def __init__(self) -> None:
+        self._values = array.array("d")
+
+    def __len__(self) -> int:
+        return len(self._values) // self.POINT_SIZE
+
+    ##  Add a point to the end of the path.
+    #
+    #   \param point The X, Y, Z, F, E and line type of the point.
+    def append(self, point: Sequence[float]) -> None:
+        self._values.extend(point)
+
+    ##  Remove all points.
+    def clear(self) -> None:
+        del self._values[:]
+
+    ##  Get the points as a numpy array of doubles, with one row per point.
+    #
+    #   The array is a copy, so the path can still grow afterwards.
+    def getArray(self) -> numpy.ndarray:
+        return numpy.array(self._values, dtype = numpy.float64).reshape((-1, self.POINT_SIZE))
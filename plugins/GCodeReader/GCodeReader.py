@@ -1,6 +1,9 @@
 # Copyright (c) 2017 Aleph Objects, Inc.
 # Cura is released under the terms of the LGPLv3 or higher.
 
+import io
+import os
+
 from UM.FileHandler.FileReader import FileReader
 from UM.Mesh.MeshReader import MeshReader
 from UM.i18n import i18nCatalog
@@ -35,7 +38,16 @@ class GCodeReader(MeshReader):
         Application.getInstance().getPreferences().addPreference("gcodereader/show_caution", True)
 
     def preReadFromStream(self, stream, *args, **kwargs):
-        for line in stream.split("\n"):
+        return self.preReadFromFile(io.StringIO(stream))
+
+    ##  Find the flavor of the g-code, reading only the lines up to the
+    #   ;FLAVOR: comment.
+    #
+    #   \param file A file object opened for reading, in binary or in text mode.
+    def preReadFromFile(self, file):
+        for line in file:
+            if isinstance(line, bytes):
+                line = line.decode("utf-8", "replace")
             if line[:len(self._flavor_keyword)] == self._flavor_keyword:
                 try:
                     self._flavor_reader = self._flavor_readers_dict[line[len(self._flavor_keyword):].rstrip()]
@@ -50,14 +62,20 @@ class GCodeReader(MeshReader):
 
     # PreRead is used to get the correct flavor. If not, Marlin is set by default
     def preRead(self, file_name, *args, **kwargs):
-        with open(file_name, "r", encoding = "utf-8") as file:
-            file_data = file.read()
-        return self.preReadFromStream(file_data, args, kwargs)
+        with open(file_name, "rb") as file:
+            return self.preReadFromFile(file)
 
     def readFromStream(self, stream):
         return self._flavor_reader.processGCodeStream(stream)
 
+    ##  Parse g-code from a file object, line by line.
+    #
+    #   \param file A file object opened for reading, in binary or in text mode.
+    #   \param file_size The size of the file, to show the progress, if known.
+    def readFromFile(self, file, file_size = None):
+        return self._flavor_reader.processGCodeFile(file, file_size)
+
     def _read(self, file_name):
-        with open(file_name, "r", encoding = "utf-8") as file:
-            file_data = file.read()
-        return self.readFromStream(file_data)
+        # The file is parsed while it's read, so it never needs to be in memory completely.
+        with open(file_name, "rb") as file:
+            return self.readFromFile(file, os.fstat(file.fileno()).st_size)
@@ -0,0 +1,58 @@
+# Copyright (c) 2018 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import re
+from typing import List, Optional, Tuple
+
+##  Splits lines of g-code into their command and the parameters of moves.
+#
+#   A line like "G1 X10.5 Y20 E0.3 ;comment" becomes the command letter "G",
+#   the code 1 and the flat parameter list [10.5, 20.0, None, None, 0.3], in
+#   the order X, Y, Z, F, E. Parameters that are not in the line are None.
+#   Feedrates are returned as they are in the g-code, in mm/min.
+
+# Indices of the parameters in a parameter list.
+X = 0
+Y = 1
+Z = 2
+F = 3
+E = 4
+PARAMETER_COUNT = 5
+
+_parameter_indices = {"X": X, "Y": Y, "Z": Z, "F": F, "E": E, "x": X, "y": Y, "z": Z, "f": F, "e": E}
+
+# For parameters that are written without spaces between them, like "X10Y20".
+_parameter_pattern = re.compile(r"([XYZFExyzfe])\s*([-+]?(?:\d+\.?\d*|\.\d+))")
+
+##  Tokenize a line of g-code.
+#
+#   \param line The line, without its line ending.
+#   \return A tuple of the command letter (upper case), the command code and
+#   the parameter list, or None if the line has no command, e.g. because it is
+#   empty or a comment.
+def tokenizeLine(line: str) -> Optional[Tuple[str, int, List[Optional[float]]]]:
+    comment_start = line.find(";")
+    if comment_start >= 0:
+        line = line[:comment_start]
+    words = line.split()
+    if not words:
+        return None
+
+    command = words[0]
+    try:
+        code = int(command[1:])
+    except ValueError:
+        return None
+
+    parameters = [None, None, None, None, None]  # type: List[Optional[float]]
+    for word in words[1:]:
+        index = _parameter_indices.get(word[0])
+        if index is None:
+            continue
+        try:
+            parameters[index] = float(word[1:])
+        except ValueError:
+            for letter, value in _parameter_pattern.findall(word):
+                parameters[_parameter_indices[letter]] = float(value)
+    return command[0].upper(), code, parameters
+
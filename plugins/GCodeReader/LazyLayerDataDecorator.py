@@ -0,0 +1,168 @@
+# Copyright (c) 2018 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import collections
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy
+
+from UM.Application import Application
+from UM.Job import Job
+from UM.Logger import Logger
+
+from cura.LayerData import LayerData
+from cura.LayerDataBuilder import LayerDataBuilder
+from cura.LayerDataDecorator import LayerDataDecorator
+
+from . import GCodeChunkParser
+
+##  Layer data of a g-code file of which only the layers around the shown
+#   ones are decoded.
+#
+#   FlavorParser indexes the file: it splits it into chunks of one layer and
+#   finds the state of the parser at the start of each of them, but it
+#   doesn't parse any of them. The layer data has all layers, but only the
+#   layers in a window below the current layer of the layer view have their
+#   paths, the others are empty. When the layer view shows other layers, it
+#   calls setVisibleLayers(). The layers of the new window are then decoded
+#   in a job and the layer data is built again. The most recently decoded
+#   layers are kept, so that moving the slider back and forth doesn't decode
+#   them again.
+#
+#   The lowest and the highest layer with paths always keep their paths, so
+#   that the layer view keeps the same range of layers.
+class LazyLayerDataDecorator(LayerDataDecorator):
+    _margin = 5  # Number of layers above the current layer that are decoded too, to move the slider up smoothly.
+    _cache_size = 200  # Number of decoded chunks to keep, at least.
+
+    ##  Creates the layer data and decodes the highest layers.
+    #
+    #   \param parser_class The class of the flavor parser that indexed the
+    #   file.
+    #   \param chunks The chunks of the file, as given by
+    #   FlavorParser._indexGCodeFile.
+    #   \param material_color_map [r, g, b, a] for each extruder row.
+    #   \param window_size The number of layers to show below the current
+    #   layer, including the current layer.
+    def __init__(self, parser_class: type, chunks: List[Tuple[Dict[str, Any], int, List[bytes]]], material_color_map: numpy.ndarray, window_size: int) -> None:
+        super().__init__()
+        self._parser_class = parser_class
+        self._chunks = chunks
+        self._material_color_map = material_color_map
+        self._window_size = max(window_size, 1)
+        self._layer_count = max(layer_number for state, layer_number, parts in chunks) + 1
+
+        self._lock = threading.Lock()  # For the decoded chunks, which are decoded in jobs.
+        self._decoded = collections.OrderedDict()  # type: collections.OrderedDict  # Chunk index -> layers, as given by FlavorParser._getLayerColumns. Least recently used first.
+        self._pinned = {}  # type: Dict[int, List[Tuple]]  # The chunks of the lowest and highest layers with paths.
+        self._window = None  # type: Optional[Tuple[int, int]]
+        self._job = None  # type: Optional[_DecodeLayersJob]
+
+        for indices in (range(len(chunks)), reversed(range(len(chunks)))):
+            for index in indices:
+                layers = self._decodeChunk(index)
+                self._decoded.pop(index, None)
+                self._pinned[index] = layers
+                if any(len(point_counts) > 0 for layer_id, height, thickness, extruders, point_counts, *columns in layers):
+                    break
+
+        self._window = self._getWindow(0, self._layer_count - 1)
+        self._layer_data = self._buildLayerData(self._getChunksInWindow(self._window))
+
+    ##  Decode the layers around the ones that the layer view shows.
+    #
+    #   The layers are decoded in a job. Once they are, the layer data is
+    #   replaced and the scene is changed, so that it is drawn again.
+    #
+    #   \param minimum The lowest layer that is shown.
+    #   \param current The current layer.
+    def setVisibleLayers(self, minimum: int, current: int) -> None:
+        window = self._getWindow(minimum, current)
+        if window == self._window:
+            return
+        self._window = window
+
+        if self._job is not None:
+            self._job.cancel()
+        self._job = _DecodeLayersJob(self, self._getChunksInWindow(window))
+        self._job.finished.connect(self._onJobFinished)
+        self._job.start()
+
+    def _onJobFinished(self, job: "_DecodeLayersJob") -> None:
+        if job is not self._job or not job.getResult():
+            return
+        self._job = None
+        self._layer_data = job.getResult()
+        Application.getInstance().getController().getScene().sceneChanged.emit(self.getNode())
+
+    ##  The lowest and the highest layer to decode.
+    def _getWindow(self, minimum: int, current: int) -> Tuple[int, int]:
+        return max(minimum, current - self._window_size + 1), current + self._margin
+
+    ##  The indices of the chunks of the layers in a window.
+    def _getChunksInWindow(self, window: Tuple[int, int]) -> List[int]:
+        lowest, highest = window
+        return [index for index, (state, layer_number, parts) in enumerate(self._chunks) if lowest <= layer_number <= highest]
+
+    ##  Get the layers of a chunk, decoding it if it's not decoded already.
+    def _decodeChunk(self, index: int) -> List[Tuple]:
+        with self._lock:
+            if index in self._pinned:
+                return self._pinned[index]
+            if index in self._decoded:
+                self._decoded.move_to_end(index)
+                return self._decoded[index]
+
+        state, layer_number, parts = self._chunks[index]
+        layer_number, layers = GCodeChunkParser.parseChunk((self._parser_class, state, b"".join(parts)))
+
+        with self._lock:
+            self._decoded[index] = layers
+            # Keep the window that is shown, even when it's bigger than the cache.
+            while len(self._decoded) > max(self._cache_size, 2 * (self._window_size + self._margin)):
+                self._decoded.popitem(last = False)
+        return layers
+
+    ##  Build the layer data with the paths of some chunks.
+    #
+    #   \param chunk_indices The chunks to show the paths of, in addition to
+    #   the pinned chunks.
+    def _buildLayerData(self, chunk_indices: List[int]) -> LayerData:
+        builder = LayerDataBuilder()
+        for index in sorted(set(chunk_indices) | set(self._pinned)):  # In the order of the file, as when it is parsed.
+            for layer_id, height, thickness, extruders, point_counts, line_types, points, line_widths, line_thicknesses, line_feedrates in self._decodeChunk(index):
+                builder.addLayer(layer_id)
+                builder.setLayerHeight(layer_id, height)
+                builder.setLayerThickness(layer_id, thickness)
+                builder.getLayer(layer_id).addPaths(extruders, point_counts, line_types, points, line_widths, line_thicknesses, line_feedrates)
+        for layer_id in range(self._layer_count):
+            if builder.getLayer(layer_id) is None:
+                builder.addLayer(layer_id)
+        return builder.build(self._material_color_map)
+
+
+##  Decodes the layers of a window of a LazyLayerDataDecorator and builds its
+#   layer data.
+class _DecodeLayersJob(Job):
+    def __init__(self, decorator: LazyLayerDataDecorator, chunk_indices: List[int]) -> None:
+        super().__init__()
+        self._decorator = decorator
+        self._chunk_indices = chunk_indices
+        self._cancel = False
+
+    def run(self) -> None:
+        try:
+            for index in self._chunk_indices:
+                if self._cancel:
+                    return
+                self._decorator._decodeChunk(index)
+                Job.yieldThread()
+            if self._cancel:
+                return
+            self.setResult(self._decorator._buildLayerData(self._chunk_indices))
+        except Exception:
+            Logger.logException("w", "An exception occurred while decoding g-code layers.")
+
+    def cancel(self) -> None:
+        self._cancel = True
@@ -4,12 +4,14 @@
 import re  # For escaping characters in the settings.
 import json
 import copy
+from typing import Iterable, Iterator, Optional
 
 from UM.Mesh.MeshWriter import MeshWriter
 from UM.Logger import Logger
 from UM.Application import Application
 from UM.Settings.InstanceContainer import InstanceContainer
 
+from cura.GCodeBuffer import GCodeBuffer
 from cura.Machines.QualityManager import getMachineDefinitionIDForQualitySearch
 
 
@@ -64,25 +66,48 @@ class GCodeWriter(MeshWriter):
             Logger.log("e", "GCodeWriter does not support non-text mode.")
             return False
 
+        chunks = self.getGCodeChunks()
+        if chunks is None:
+            return False
+        for chunk in chunks:
+            stream.write(chunk.decode("utf-8", "replace"))
+        return True
+
+    ##  Get the g-code for the entire scene, with the settings at the end, as
+    #   chunks of UTF-8 bytes.
+    #
+    #   The chunks are the chunks of the g-code of the active build plate, so
+    #   writers that store the g-code in binary form can write them one at a
+    #   time, without decoding or joining them.
+    #
+    #   \return An iterator over the chunks, or None if there is no g-code.
+    def getGCodeChunks(self) -> Optional[Iterator[bytes]]:
         active_build_plate = Application.getInstance().getMultiBuildPlateModel().activeBuildPlate
         scene = Application.getInstance().getController().getScene()
         if not hasattr(scene, "gcode_dict"):
-            return False
+            return None
         gcode_dict = getattr(scene, "gcode_dict")
         gcode_list = gcode_dict.get(active_build_plate, None)
-        if gcode_list is not None:
-            has_settings = False
-            for gcode in gcode_list:
-                if gcode[:len(self._setting_keyword)] == self._setting_keyword:
-                    has_settings = True
-                stream.write(gcode)
-            # Serialise the current container stack and put it at the end of the file.
-            if not has_settings:
-                settings = self._serialiseSettings(Application.getInstance().getGlobalContainerStack())
-                stream.write(settings)
-            return True
-
-        return False
+        if gcode_list is None:
+            return None
+        return self._iterGCodeChunks(gcode_list)
+
+    def _iterGCodeChunks(self, gcode_list: Iterable[str]) -> Iterator[bytes]:
+        if isinstance(gcode_list, GCodeBuffer):
+            chunks = gcode_list.iterBytes()
+        else:
+            chunks = (gcode.encode("utf-8") for gcode in gcode_list)
+
+        setting_keyword = self._setting_keyword.encode("utf-8")
+        has_settings = False
+        for chunk in chunks:
+            # The chunks of loaded g-code are whole layers, so the settings can be anywhere in a chunk.
+            if not has_settings and (chunk.startswith(setting_keyword) or b"\n" + setting_keyword in chunk):
+                has_settings = True
+            yield chunk
+        # Serialise the current container stack and put it at the end of the file.
+        if not has_settings:
+            yield self._serialiseSettings(Application.getInstance().getGlobalContainerStack()).encode("utf-8")
 
     ##  Create a new container with container 2 as base and container 1 written over it.
     def _createFlattenedContainerInstance(self, instance_container1, instance_container2):
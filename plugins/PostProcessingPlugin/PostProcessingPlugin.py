@@ -8,6 +8,8 @@ from UM.Application import Application
 from UM.Extension import Extension
 from UM.Logger import Logger
 
+from cura.GCodeBuffer import GCodeBuffer
+
 import configparser #The script lists are stored in metadata as serialised config files.
 import io #To allow configparser to write to a string.
 import os.path
@@ -79,6 +81,8 @@ class PostProcessingPlugin(QObject, Extension):
                     Logger.logException("e", "Exception in post-processing script.")
             if len(self._script_list):  # Add comment to g-code if any changes were made.
                 gcode_list[0] += ";POSTPROCESSED\n"
+            if isinstance(gcode_dict[active_build_plate_id], GCodeBuffer) and not isinstance(gcode_list, GCodeBuffer):
+                gcode_list = GCodeBuffer(gcode_list)  # Scripts may return a new list of strings.
             gcode_dict[active_build_plate_id] = gcode_list
             setattr(scene, "gcode_dict", gcode_dict)
         else:
@@ -74,6 +74,7 @@ class SimulationView(View):
         self._global_container_stack = None
         self._proxy = SimulationViewProxy()
         self._controller.getScene().getRoot().childrenChanged.connect(self._onSceneChanged)
+        self._controller.getScene().getRoot().meshDataChanged.connect(self._onMeshDataChanged)
 
         self._resetSettings()
         self._legend_items = None
@@ -164,6 +165,12 @@ class SimulationView(View):
         self.calculateMaxLayers()
         self.calculateMaxPathsOnLayer(self._current_layer_num)
 
+    ##  Layer data can be extended while the layers are still being processed.
+    def _onMeshDataChanged(self, node):
+        if node.callDecoration("getLayerData"):
+            self.calculateMaxLayers()
+            self.calculateMaxPathsOnLayer(self._current_layer_num)
+
     def isBusy(self):
         return self._busy
 
@@ -344,22 +351,22 @@ class SimulationView(View):
             min_layer_number = sys.maxsize
             max_layer_number = -sys.maxsize
             for layer_id in layer_data.getLayers():
+                layer = layer_data.getLayer(layer_id)
 
-                # If a layer doesn't contain any polygons, skip it (for infill meshes taller than print objects
-                if len(layer_data.getLayer(layer_id).polygons) < 1:
+                # If a layer doesn't contain any paths, skip it (for infill meshes taller than print objects
+                if layer.pathCount < 1:
                     continue
 
                 # Store the max and min feedrates and thicknesses for display purposes
-                for p in layer_data.getLayer(layer_id).polygons:
-                    self._max_feedrate = max(float(p.lineFeedrates.max()), self._max_feedrate)
-                    self._min_feedrate = min(float(p.lineFeedrates.min()), self._min_feedrate)
-                    self._max_thickness = max(float(p.lineThicknesses.max()), self._max_thickness)
-                    try:
-                        self._min_thickness = min(float(p.lineThicknesses[numpy.nonzero(p.lineThicknesses)].min()), self._min_thickness)
-                    except:
-                        # Sometimes, when importing a GCode the line thicknesses are zero and so the minimum (avoiding
-                        # the zero) can't be calculated
-                        Logger.log("i", "Min thickness can't be calculated because all the values are zero")
+                self._max_feedrate = max(float(layer.lineFeedrates.max()), self._max_feedrate)
+                self._min_feedrate = min(float(layer.lineFeedrates.min()), self._min_feedrate)
+                self._max_thickness = max(float(layer.lineThicknesses.max()), self._max_thickness)
+                try:
+                    self._min_thickness = min(float(layer.lineThicknesses[numpy.nonzero(layer.lineThicknesses)].min()), self._min_thickness)
+                except:
+                    # Sometimes, when importing a GCode the line thicknesses are zero and so the minimum (avoiding
+                    # the zero) can't be calculated
+                    Logger.log("i", "Min thickness can't be calculated because all the values are zero")
                 if max_layer_number < layer_id:
                     max_layer_number = layer_id
                 if min_layer_number > layer_id:
@@ -512,6 +519,10 @@ class SimulationView(View):
                 self._wireprint_warning_message.hide()
 
     def _onCurrentLayerNumChanged(self):
+        # Layer data that only has the paths of the layers around the shown ones, like that of big g-code files,
+        # follows the layers that are shown.
+        for node in DepthFirstIterator(self.getController().getScene().getRoot()):
+            node.callDecoration("setVisibleLayers", self._minimum_layer_num, self._current_layer_num)
         self.calculateMaxPathsOnLayer(self._current_layer_num)
 
     def _startUpdateTopLayers(self):
@@ -3,7 +3,6 @@
 
 from Charon.VirtualFile import VirtualFile #To open UFP files.
 from Charon.OpenMode import OpenMode #To indicate that we want to write to UFP files.
-from io import StringIO #For converting g-code to bytes.
 
 from UM.Application import Application
 from UM.Logger import Logger
@@ -31,10 +30,11 @@ class UFPWriter(MeshWriter):
 
         #Store the g-code from the scene.
         archive.addContentType(extension = "gcode", mime_type = "text/x-gcode")
-        gcode_textio = StringIO() #We have to convert the g-code into bytes.
-        PluginRegistry.getInstance().getPluginObject("GCodeWriter").write(gcode_textio, None)
         gcode = archive.getStream("/3D/model.gcode")
-        gcode.write(gcode_textio.getvalue().encode("UTF-8"))
+        #The g-code is kept as UTF-8 bytes already. Write it one chunk at a time, so it never needs to be copied completely.
+        gcode_chunks = PluginRegistry.getInstance().getPluginObject("GCodeWriter").getGCodeChunks()
+        for chunk in gcode_chunks or []:
+            gcode.write(chunk)
         archive.addRelation(virtual_path = "/3D/model.gcode", relation_type = "http://schemas.ultimaker.org/package/2018/relationships/gcode")
 
         #Store the thumbnail.
@@ -7,6 +7,7 @@ from UM.Application import Application
 from UM.Qt.Duration import DurationFormat
 from UM.PluginRegistry import PluginRegistry
 
+from cura.GCodeBuffer import GCodeBuffer
 from cura.PrinterOutputDevice import PrinterOutputDevice, ConnectionState
 from cura.PrinterOutput.PrinterOutputModel import PrinterOutputModel
 from cura.PrinterOutput.PrintJobOutputModel import PrintJobOutputModel
@@ -201,13 +202,16 @@ class USBPrinterOutputDevice(PrinterOutputDevice):
         self.firmwareProgressChanged.emit()
 
     ##  Start a print based on a g-code.
-    #   \param gcode_list List with gcode (strings).
-    def _printGCode(self, gcode_list: List[str]):
+    #   \param gcode_list List with gcode (strings) or a GCodeBuffer.
+    def _printGCode(self, gcode_list: Union[List[str], GCodeBuffer]):
         self._gcode.clear()
         self._paused = False
 
-        for layer in gcode_list:
-            self._gcode.extend(layer.split("\n"))
+        if isinstance(gcode_list, GCodeBuffer):
+            self._gcode.extend(gcode_list.iterLines())
+        else:
+            for layer in gcode_list:
+                self._gcode.extend(layer.split("\n"))
 
         # Reset line number. If this is not done, first line is sometimes ignored
         self._gcode.insert(0, "M110")
@@ -0,0 +1,111 @@
+#!env python
+# Copyright (c) 2018 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+# Measures how many lines of g-code per second the g-code reader tokenizes, on
+# a synthetic corpus that looks like the g-code of CuraEngine. The way
+# FlavorParser tokenized lines before GCodeTokenizer is measured too, for
+# comparison. Run it with: python run_gcode_benchmark.py [number of layers]
+
+import importlib.util
+import os
+import random
+import re
+import sys
+import time
+from collections import namedtuple
+
+def loadModule(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+GCodeTokenizer = loadModule("GCodeTokenizer", os.path.join(os.path.dirname(os.path.abspath(__file__)), "plugins", "GCodeReader", "GCodeTokenizer.py"))
+
+##  Creates g-code with the given number of layers.
+def createCorpus(layer_count, moves_per_layer = 2000, seed = 0):
+    rng = random.Random(seed)
+    lines = [";FLAVOR:Marlin", ";Generated with Cura_SteamEngine", "M140 S60", "M104 S200", "G28 ;Home", "G92 E0", "G1 F1500 E-6.5"]
+    e = 0.0
+    for layer in range(layer_count):
+        lines.append(";LAYER:{0}".format(layer))
+        lines.append("G0 F3600 X{0:.3f} Y{1:.3f} Z{2:.3f}".format(rng.uniform(0, 200), rng.uniform(0, 200), 0.2 + layer * 0.1))
+        for move in range(moves_per_layer):
+            if move % 500 == 0:
+                lines.append(";TYPE:" + rng.choice(["WALL-OUTER", "WALL-INNER", "SKIN", "FILL"]))
+            if rng.random() < 0.1:
+                lines.append("G0 X{0:.3f} Y{1:.3f}".format(rng.uniform(0, 200), rng.uniform(0, 200)))
+            else:
+                e += rng.uniform(0.01, 0.1)
+                lines.append("G1 X{0:.3f} Y{1:.3f} E{2:.5f}".format(rng.uniform(0, 200), rng.uniform(0, 200), e))
+        lines.append("M106 S255")
+    lines.append("M107")
+    return lines
+
+_Position = namedtuple("Position", ["x", "y", "z", "f", "e"])
+
+##  How FlavorParser found the G-code of a line and its parameters before.
+def previousTokenizeLine(line):
+    n = line.find("G")
+    if n < 0:
+        return None
+    n += 1
+    pattern = re.compile("[;\s]")
+    match = pattern.search(line, n)
+    m = match.start() if match is not None else -1
+    try:
+        G = int(line[n:] if m < 0 else line[n:m])
+    except:
+        return None
+
+    line = line.split(";", 1)[0]
+    x, y, z, f, e = None, None, None, None, None
+    for item in line.upper().split(" ")[1:]:
+        if len(item) <= 1:
+            continue
+        if item.startswith(";"):
+            continue
+        if item[0] == "X":
+            x = float(item[1:])
+        if item[0] == "Y":
+            y = float(item[1:])
+        if item[0] == "Z":
+            z = float(item[1:])
+        if item[0] == "F":
+            f = float(item[1:])
+        if item[0] == "E":
+            e = float(item[1:])
+    return G, _Position(x, y, z, f, e)
+
+def previousTokenizeLines(lines):
+    return [previousTokenizeLine(line) for line in lines if line and not line.startswith(";")]
+
+def measure(name, function, lines, repeats = 5):
+    best = None
+    for repeat in range(repeats):
+        start = time.perf_counter()
+        function(lines)
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    print("{0:>24}: {1:>12,.0f} lines/s".format(name, len(lines) / best))
+    return len(lines) / best
+
+def main():
+    layer_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    lines = createCorpus(layer_count)
+    print("Tokenizing {0:,} lines of g-code:".format(len(lines)))
+
+    # Both give the same parameters for the moves.
+    for line in lines:
+        tokens = GCodeTokenizer.tokenizeLine(line)
+        if tokens is not None and tokens[0] == "G":
+            G, params = previousTokenizeLine(line)
+            assert G == tokens[1] and list(params) == tokens[2], line
+
+    before = measure("before", previousTokenizeLines, lines)
+    after = measure("GCodeTokenizer", lambda lines: [GCodeTokenizer.tokenizeLine(line) for line in lines if line and line[0] != ";"], lines)
+    print("Speed-up: {0:.1f}x".format(after / before))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# Copyright (c) 2018 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import io
+import multiprocessing.pool
+import random
+import unittest.mock
+
+import numpy
+import pytest
+
+from cura.GCodeBuffer import GCodeBuffer
+from plugins.GCodeReader.MarlinFlavorParser import MarlinFlavorParser
+from plugins.GCodeReader.RepRapFlavorParser import RepRapFlavorParser
+
+
+##  Creates g-code like that of CuraEngine, with relative moves in the start
+#   and end g-code, resets of the extrusion and tool changes.
+def createGCode(layer_count = 12, seed = 0):
+    rng = random.Random(seed)
+    lines = [";FLAVOR:Marlin", "M104 S200", "G28 ;Home",
+             "G91 ;Relative positioning", "G1 Z5 F300", "G1 X5 Y5", "G90 ;Absolute positioning",
+             "G92 E0", "G1 F1500 E-6.5", ";LAYER_COUNT:{0}".format(layer_count)]
+    e = 0.0
+    extruder = 0
+    for layer in range(layer_count):
+        lines.append(";LAYER:{0}".format(layer))
+        lines.append("G0 F3600 X{0:.3f} Y{1:.3f} Z{2:.2f}".format(rng.uniform(0, 200), rng.uniform(0, 200), 0.3 + layer * 0.2))
+        for move in range(rng.randint(5, 30)):
+            if move % 10 == 0:
+                lines.append(";TYPE:" + rng.choice(["WALL-OUTER", "WALL-INNER", "SKIN", "FILL", "SUPPORT"]))
+            if rng.random() < 0.2:
+                lines.append("G0 X{0:.3f} Y{1:.3f}".format(rng.uniform(0, 200), rng.uniform(0, 200)))
+            else:
+                e += rng.uniform(0.01, 0.5)
+                lines.append("G1 F{0} X{1:.3f} Y{2:.3f} E{3:.5f}".format(rng.choice([1200, 1800, 2400]), rng.uniform(0, 200), rng.uniform(0, 200), e))
+        if layer % 4 == 3:  # Change the extruder, with a retraction and a reset of the extrusion.
+            lines.append("G1 F2700 E{0:.5f}".format(e - 6.5))
+            extruder = 1 - extruder
+            lines.append("T{0}".format(extruder))
+            lines.append("G92 E0")
+            e = 0.0
+            lines.append("G1 F2700 E0")
+        elif layer % 5 == 2:  # Reset the extrusion without changing the extruder.
+            lines.append("G92 E0")
+            e = 0.0
+    lines += ["M107", "G91 ;Relative positioning", "G1 E-2 F2700", "G1 Z10", "G90", "M104 S0", ";End of Gcode"]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def createParser(parser_class):
+    with unittest.mock.patch("plugins.GCodeReader.FlavorParser.Application"):
+        parser = parser_class()
+    parser._message = unittest.mock.MagicMock()
+    parser._extruder_offsets = {0: [0, 0], 1: [18, 0]}
+    return parser
+
+
+@pytest.mark.parametrize("parser_class", [MarlinFlavorParser, RepRapFlavorParser])
+@pytest.mark.parametrize("chunks_per_worker", [2, 5, 1000000])  # The last makes each layer a chunk.
+def test_parallelParseMatchesSerialParse(parser_class, chunks_per_worker):
+    gcode = createGCode()
+
+    serial_parser = createParser(parser_class)
+    serial_gcode_list = GCodeBuffer()
+    assert serial_parser._parseGCodeFile(io.BytesIO(gcode), None, serial_gcode_list)
+
+    parallel_parser = createParser(parser_class)
+    parallel_parser._pool_worker_count = 1
+    parallel_parser._chunks_per_worker = chunks_per_worker
+    parallel_gcode_list = GCodeBuffer()
+    # The chunks are parsed the same way in threads, and threads can see the mocked application.
+    pool = multiprocessing.pool.ThreadPool(2)
+    try:
+        assert parallel_parser._parseGCodeFileInParallel(io.BytesIO(gcode), parallel_gcode_list, pool)
+    finally:
+        pool.terminate()
+
+    assert list(parallel_gcode_list.iterBytes()) == list(serial_gcode_list.iterBytes())
+    assert parallel_parser._layer_number == serial_parser._layer_number
+
+    serial_layers = serial_parser._getLayerColumns()
+    parallel_layers = parallel_parser._getLayerColumns()
+    assert [layer[0] for layer in parallel_layers] == [layer[0] for layer in serial_layers]
+    for serial_layer, parallel_layer in zip(serial_layers, parallel_layers):
+        assert parallel_layer[1:3] == pytest.approx(serial_layer[1:3])  # Height and thickness.
+        for serial_column, parallel_column in zip(serial_layer[3:], parallel_layer[3:]):
+            assert numpy.shape(parallel_column) == numpy.shape(serial_column)
+            assert numpy.allclose(parallel_column, serial_column)
@@ -0,0 +1,62 @@
+# Copyright (c) 2018 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import gzip
+import io
+
+from cura.GCodeBuffer import GCodeBuffer
+
+
+def test_behavesLikeList():
+    gcode = GCodeBuffer([";FLAVOR:Marlin\n", b";LAYER:0\nG1 X1 Y1\n"])
+    gcode.append(";LAYER:1\nG1 X2 Y2 ; °\n")
+    gcode.insert(0, ";START\n")
+    gcode[0] += ";POSTPROCESSED\n"
+
+    assert len(gcode) == 4
+    assert list(gcode) == [";START\n;POSTPROCESSED\n", ";FLAVOR:Marlin\n", ";LAYER:0\nG1 X1 Y1\n", ";LAYER:1\nG1 X2 Y2 ; °\n"]
+    assert gcode[1:3] == [";FLAVOR:Marlin\n", ";LAYER:0\nG1 X1 Y1\n"]
+    assert gcode.index(";FLAVOR:Marlin\n") == 1
+    assert gcode.getBytes(3) == ";LAYER:1\nG1 X2 Y2 ; °\n".encode("utf-8")
+
+
+def test_iterLines():
+    gcode = GCodeBuffer([";LAYER:0\nG1 X1\n", "G1 X2"])
+    # Same as splitting every chunk.
+    assert list(gcode.iterLines()) == [";LAYER:0", "G1 X1", "", "G1 X2"]
+
+
+def test_bytes():
+    chunks = [";LAYER:0\nG1 X1\n", ";LAYER:1\nG1 X2\n"]
+    gcode = GCodeBuffer(chunks)
+    stream = io.BytesIO()
+    gcode.writeTo(stream)
+
+    assert stream.getvalue() == "".join(chunks).encode("utf-8")
+    assert b"".join(gcode.iterBytes()) == stream.getvalue()
+    assert gcode.getByteSize() == len(stream.getvalue())
+
+
+def test_copy():
+    gcode = GCodeBuffer(["A\n", "B\n"])
+    copy = gcode.copy()
+    copy[0] = "C\n"
+
+    assert list(gcode) == ["A\n", "B\n"]
+    assert list(copy) == ["C\n", "B\n"]
+    assert copy.getBytes(1) is gcode.getBytes(1)  # Unchanged chunks are shared.
+
+
+def test_compress():
+    gcode = GCodeBuffer([";LAYER:0\nG1 X1\n", ";LAYER:1\nG1 X2\n"])
+    assert gcode.getCompressed() is None
+
+    compressed = gcode.compress()
+    assert gzip.decompress(compressed) == b"".join(gcode.iterBytes())
+    assert gcode.getCompressed() is compressed
+
+    # Changing the g-code, e.g. by post-processing, makes it compress again.
+    gcode[0] += ";POSTPROCESSED\n"
+    assert gcode.getCompressed() is None
+    assert gcode.compress(lambda: True) is None
+    assert gcode.getCompressed() is None
@@ -0,0 +1,55 @@
+# Copyright (c) 2018 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import pytest
+
+from plugins.GCodeReader import GCodeTokenizer
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("G1 X10.5 Y20 E0.3", ("G", 1, [10.5, 20.0, None, None, 0.3])),
+    ("G0 F3600 X1 Y2 Z0.3", ("G", 0, [1.0, 2.0, 0.3, 3600.0, None])),
+    ("G1 X-.5 E+2", ("G", 1, [-0.5, None, None, None, 2.0])),
+    ("  G28 X0 Y0", ("G", 28, [0.0, 0.0, None, None, None])),
+])
+def test_tokenizeLine(line, expected):
+    assert GCodeTokenizer.tokenizeLine(line) == expected
+
+
+def test_packedParameters():
+    assert GCodeTokenizer.tokenizeLine("G1 X10Y20") == ("G", 1, [10.0, 20.0, None, None, None])
+    assert GCodeTokenizer.tokenizeLine("G1 X10Y20Z0.3F1500E1.5") == ("G", 1, [10.0, 20.0, 0.3, 1500.0, 1.5])
+
+
+def test_lowerCase():
+    assert GCodeTokenizer.tokenizeLine("g1 x3 y4 e0.1") == ("G", 1, [3.0, 4.0, None, None, 0.1])
+    assert GCodeTokenizer.tokenizeLine("t1") == ("T", 1, [None, None, None, None, None])
+
+
+@pytest.mark.parametrize("line", ["", "   ", ";LAYER:0", "; G1 X10", ";TYPE:WALL-OUTER"])
+def test_noCommand(line):
+    assert GCodeTokenizer.tokenizeLine(line) is None
+
+
+def test_comments():
+    # Parameters after the start of a comment are not parsed.
+    assert GCodeTokenizer.tokenizeLine("G0 X1 ;move Y2") == ("G", 0, [1.0, None, None, None, None])
+    assert GCodeTokenizer.tokenizeLine("G28;Home") == ("G", 28, [None, None, None, None, None])
+
+
+def test_otherCommands():
+    assert GCodeTokenizer.tokenizeLine("T0") == ("T", 0, [None, None, None, None, None])
+    # Only the parameters of moves are returned, others like S and T are not.
+    assert GCodeTokenizer.tokenizeLine("M104 S200 T1") == ("M", 104, [None, None, None, None, None])
+    assert GCodeTokenizer.tokenizeLine("M82 ;absolute extrusion mode") == ("M", 82, [None, None, None, None, None])
+
+
+def test_malformedNumbers():
+    # Parameters that are not a number are left out.
+    assert GCodeTokenizer.tokenizeLine("G1 Xabc Y2") == ("G", 1, [None, 2.0, None, None, None])
+    assert GCodeTokenizer.tokenizeLine("G1 X Y2") == ("G", 1, [None, 2.0, None, None, None])
+    # Of a number with too many points, the valid start is used.
+    assert GCodeTokenizer.tokenizeLine("G1 X1.5.5") == ("G", 1, [1.5, None, None, None, None])
+    # A command without a valid code is not a command.
+    assert GCodeTokenizer.tokenizeLine("Gabc X1") is None
+    assert GCodeTokenizer.tokenizeLine("G X1") is None
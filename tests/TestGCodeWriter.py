@@ -0,0 +1,74 @@
+# Copyright (c) 2018 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import io
+import unittest.mock
+
+import pytest
+
+from cura.GCodeBuffer import GCodeBuffer
+from plugins.GCodeReader.FlavorParser import FlavorParser
+from plugins.GCodeWriter.GCodeWriter import GCodeWriter
+
+
+gcode_without_settings = b""";FLAVOR:Marlin
+;Generated with Cura_SteamEngine master
+M104 S200
+G28 ;Home
+G92 E0
+;LAYER_COUNT:2
+;LAYER:0
+G0 F3600 X10 Y10 Z0.3
+;TYPE:WALL-OUTER
+G1 F1500 X20 Y10 E1
+G1 X20 Y20 E2
+;LAYER:1
+G0 X10 Y10 Z0.5
+G1 X20 Y10 E3
+G1 X20 Y20 E4
+M104 S0
+;End of Gcode
+"""
+
+settings = b""";SETTING_3 {"global_quality": "[general]\\\\nversion = 4\\\\nname = Fine
+;SETTING_3 \\\\n\\\\n[values]\\\\nlayer_height = 0.1\\\\n\\\\n"}
+"""
+
+
+@pytest.fixture
+def writer():
+    with unittest.mock.patch("plugins.GCodeWriter.GCodeWriter.Application"):
+        yield GCodeWriter()
+
+
+##  Read g-code into a g-code list, like when it is opened.
+def readGCodeList(data):
+    with unittest.mock.patch("plugins.GCodeReader.FlavorParser.Application"):
+        parser = FlavorParser()
+    parser._message = unittest.mock.MagicMock()
+    gcode_list = GCodeBuffer()
+    assert parser._parseGCodeFile(io.BytesIO(data), None, gcode_list)
+    return gcode_list
+
+
+def test_writeOpenedGCodeWithSettings(writer):
+    gcode = gcode_without_settings + settings
+    gcode_list = readGCodeList(gcode)
+    with unittest.mock.patch.object(writer, "_serialiseSettings") as serialise_settings:
+        assert b"".join(writer._iterGCodeChunks(gcode_list)) == gcode
+    # The settings that were in the file are kept, so they are not added again.
+    serialise_settings.assert_not_called()
+
+
+def test_writeOpenedGCodeWithoutSettings(writer):
+    gcode_list = readGCodeList(gcode_without_settings)
+    with unittest.mock.patch.object(writer, "_serialiseSettings", return_value = settings.decode("utf-8")):
+        assert b"".join(writer._iterGCodeChunks(gcode_list)) == gcode_without_settings + settings
+
+
+def test_writeSettingsInOwnChunk(writer):
+    # Like the g-code that comes from the engine, where the settings are not in a layer.
+    gcode_list = GCodeBuffer([";FLAVOR:Marlin\n", ";LAYER:0\nG1 X1 Y1\n", settings])
+    with unittest.mock.patch.object(writer, "_serialiseSettings") as serialise_settings:
+        assert b"".join(writer._iterGCodeChunks(gcode_list)) == b";FLAVOR:Marlin\n;LAYER:0\nG1 X1 Y1\n" + settings
+    serialise_settings.assert_not_called()
@@ -0,0 +1,54 @@
+# Copyright (c) 2018 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import numpy
+import pytest
+
+from cura import LayerColumnFiles
+
+
+##  Creates the columns of a layer with the given number of paths of a few
+#   points each.
+def createColumns(path_count, seed):
+    random = numpy.random.RandomState(seed)
+    point_counts = random.randint(2, 6, path_count).astype(numpy.int32)
+    line_count = int(numpy.sum(point_counts - 1))
+    return (
+        random.randint(0, 2, path_count).astype(numpy.int32),
+        point_counts,
+        random.randint(0, 11, line_count).astype(numpy.uint8),
+        random.rand(int(numpy.sum(point_counts)), 3).astype(numpy.float32),
+        random.rand(line_count).astype(numpy.float32),
+        random.rand(line_count).astype(numpy.float32),
+        random.rand(line_count).astype(numpy.float32)
+    )
+
+
+def test_writeAndRead(tmpdir):
+    layers = [createColumns(path_count, seed) for seed, path_count in enumerate([3, 0, 5, 1])]  # Including an empty layer.
+    with LayerColumnFiles.ColumnFileWriter(str(tmpdir)) as writer:
+        row_counts = [writer.write(columns) for columns in layers]
+    assert row_counts[1] == (0, 0, 0)
+    assert row_counts[0] == (3, len(layers[0][2]), len(layers[0][3]))
+
+    read_layers = LayerColumnFiles.readColumnFiles(str(tmpdir), row_counts)
+    assert len(read_layers) == len(layers)
+    for columns, read_columns in zip(layers, read_layers):
+        for column, read_column in zip(columns, read_columns):
+            assert read_column.dtype == column.dtype
+            assert numpy.array_equal(read_column, column)
+            assert not read_column.flags.writeable
+
+
+def test_readEmpty(tmpdir):
+    # Files without rows can't be mapped, so they are read as empty columns.
+    with LayerColumnFiles.ColumnFileWriter(str(tmpdir)) as writer:
+        row_counts = [writer.write(createColumns(0, 0))]
+    read_columns, = LayerColumnFiles.readColumnFiles(str(tmpdir), row_counts)
+    assert [len(column) for column in read_columns] == [0] * 7
+    assert read_columns[3].shape == (0, 3)
+
+
+def test_readMissingFiles(tmpdir):
+    with pytest.raises(EnvironmentError):
+        LayerColumnFiles.readColumnFiles(str(tmpdir), [(1, 1, 2)])
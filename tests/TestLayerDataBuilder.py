@@ -0,0 +1,126 @@
+# Copyright (c) 2018 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import numpy
+import pytest
+import unittest.mock
+
+from cura.LayerDataBuilder import LayerDataBuilder
+from cura.LayerPolygon import LayerPolygon
+
+
+##  A fixed color map, so the tests don't need a theme.
+@pytest.fixture(autouse = True)
+def color_map():
+    colors = numpy.linspace(0, 1, 11 * 4, dtype = numpy.float32).reshape((11, 4))
+    with unittest.mock.patch.object(LayerPolygon, "getColorMap", return_value = colors):
+        yield colors
+
+
+material_color_map = numpy.array([[1, 0, 0, 1], [0, 1, 0, 1]], dtype = numpy.float32)
+
+
+##  Adds a few pseudo-random paths to the given layers.
+def addLayers(builder, layer_numbers, seed):
+    random = numpy.random.RandomState(seed)
+    for layer_number in layer_numbers:
+        builder.addLayer(layer_number)
+        for extruder in range(2):
+            point_count = random.randint(3, 20)
+            line_types = random.randint(0, 11, (point_count - 1, 1)).astype(numpy.int32)
+            points = random.rand(point_count, 3).astype(numpy.float32)
+            line_widths = random.rand(point_count - 1, 1).astype(numpy.float32)
+            line_thicknesses = random.rand(point_count - 1, 1).astype(numpy.float32)
+            line_feedrates = random.rand(point_count - 1, 1).astype(numpy.float32)
+            builder.getLayer(layer_number).addPath(extruder, line_types, points, line_widths, line_thicknesses, line_feedrates)
+
+
+def assertSameLayerData(expected, actual):
+    assert numpy.array_equal(expected.getVertices(), actual.getVertices())
+    assert numpy.array_equal(expected.getIndices(), actual.getIndices())
+    assert numpy.array_equal(expected.getColors(), actual.getColors())
+    for name in ["line_dimensions", "extruders", "colors", "line_types", "feedrates"]:
+        assert numpy.array_equal(expected.getAttribute(name)["value"], actual.getAttribute(name)["value"])
+    assert expected.getElementCounts() == actual.getElementCounts()
+
+
+##  Building the layers in chunks gives the same mesh as building them at once.
+def test_buildInChunks():
+    complete = LayerDataBuilder()
+    addLayers(complete, range(0, 10), seed = 1)
+    addLayers(complete, range(10, 20), seed = 2)
+    expected = complete.build(material_color_map)
+
+    chunked = LayerDataBuilder()
+    addLayers(chunked, range(0, 10), seed = 1)
+    partial = chunked.build(material_color_map)
+    assert sorted(partial.getElementCounts()) == list(range(0, 10))
+    addLayers(chunked, range(10, 20), seed = 2)
+    actual = chunked.build(material_color_map)
+
+    assertSameLayerData(expected, actual)
+    # The partial result is not changed by adding more layers.
+    assert sorted(partial.getElementCounts()) == list(range(0, 10))
+
+
+##  Adding a layer below the layers that were already built rebuilds the mesh.
+def test_buildOutOfOrder():
+    complete = LayerDataBuilder()
+    addLayers(complete, range(10, 20), seed = 1)
+    addLayers(complete, range(0, 10), seed = 2)
+    expected = complete.build(material_color_map)
+
+    chunked = LayerDataBuilder()
+    addLayers(chunked, range(10, 20), seed = 1)
+    chunked.build(material_color_map)
+    addLayers(chunked, range(0, 10), seed = 2)
+    actual = chunked.build(material_color_map)
+
+    assertSameLayerData(expected, actual)
+
+
+##  The columns of a layer hold the paths one after the other.
+def test_layerColumns():
+    builder = LayerDataBuilder()
+    builder.addLayer(0)
+    layer = builder.getLayer(0)
+    points = numpy.arange(15, dtype = numpy.float32).reshape((5, 3))
+    layer.addPath(1, numpy.array([[LayerPolygon.Inset0Type], [LayerPolygon.Inset0Type]]), points[:3], numpy.ones((2, 1)), numpy.ones((2, 1)), numpy.ones((2, 1)))
+    layer.addPath(0, numpy.array([[42]]), points[3:], numpy.ones((1, 1)), numpy.ones((1, 1)), numpy.ones((1, 1)))
+
+    assert layer.pathCount == 2
+    assert list(layer.pathOffsets) == [0, 3, 5]
+    assert list(layer.extruders) == [1, 0]
+    assert list(layer.types) == [LayerPolygon.Inset0Type, LayerPolygon.Inset0Type, LayerPolygon.NoneType]  # Unknown types become NoneType.
+    assert layer.lineMeshElementCount() == 3
+    assert layer.lineMeshVertexCount() == 5  # The two lines of the first path share their middle vertex.
+
+    # The head moves along the first path, then continues from the start of the second path.
+    assert list(layer.getPointAtPathIndex(2)) == list(points[2])
+    assert list(layer.getPointAtPathIndex(3)) == list(points[4])
+    assert layer.getPointAtPathIndex(4) is None
+
+
+##  The compact layer mesh expands to the regular layer mesh, up to the precision of the quantization.
+def test_buildCompact():
+    regular = LayerDataBuilder()
+    addLayers(regular, range(0, 5), seed = 1)
+    addLayers(regular, range(5, 10), seed = 2)
+    expected = regular.build(material_color_map)
+
+    compact = LayerDataBuilder()
+    compact.setQuantizationBounds([0, 0, 0], [1, 1, 1])
+    addLayers(compact, range(0, 5), seed = 1)
+    compact.build(material_color_map)
+    addLayers(compact, range(5, 10), seed = 2)
+    actual = compact.build(material_color_map)
+
+    assert numpy.allclose(expected.getVertices(), actual.getVertices(), atol = 1 / 65535)
+    assert numpy.array_equal(expected.getIndices(), actual.getIndices())
+    assert numpy.array_equal(expected.getColors(), actual.getColors())
+    for name in ["extruders", "colors", "line_types"]:
+        assert numpy.array_equal(expected.getAttribute(name)["value"], actual.getAttribute(name)["value"])
+    for name in ["line_dimensions", "feedrates"]:
+        assert numpy.allclose(expected.getAttribute(name)["value"], actual.getAttribute(name)["value"], atol = 1e-3)
+    assert expected.getElementCounts() == actual.getElementCounts()
+    assert actual.getByteSize() < actual.getExpandedByteSize() / 2
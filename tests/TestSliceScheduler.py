@@ -0,0 +1,80 @@
+# Copyright (c) 2018 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import pytest
+
+from plugins.CuraEngineBackend.SliceScheduler import SliceScheduler
+
+
+@pytest.fixture
+def scheduler():
+    return SliceScheduler(default_interval = 500, minimum_interval = 250, maximum_interval = 3000, interval_factor = 0.5, history_size = 2)
+
+
+def test_debounceIntervalWithoutHistory(scheduler):
+    assert scheduler.getDebounceInterval() == 500
+    assert scheduler.getEstimatedSliceDuration(0) is None
+
+
+def test_debounceIntervalFromSliceDuration(scheduler):
+    scheduler.recordDuration(0, "start", 0.5)
+    scheduler.recordDuration(0, "engine", 2.0)
+    scheduler.recordDuration(0, "layers", 1.0)
+    assert scheduler.getEstimatedSliceDuration(0) == pytest.approx(3.5)
+    assert scheduler.getDebounceInterval() == 1750
+
+
+def test_debounceIntervalOfPartlyTimedSlice(scheduler):
+    # Phases that weren't timed yet don't count.
+    scheduler.recordDuration(0, "engine", 2.0)
+    assert scheduler.getEstimatedSliceDuration(0) == pytest.approx(2.0)
+    assert scheduler.getDebounceInterval() == 1000
+
+
+def test_debounceIntervalOfSlowestBuildPlate(scheduler):
+    scheduler.recordDuration(0, "engine", 1.0)
+    scheduler.recordDuration(1, "engine", 4.0)
+    assert scheduler.getDebounceInterval() == 2000
+
+
+def test_debounceIntervalIsClamped(scheduler):
+    scheduler.recordDuration(0, "engine", 0.01)
+    assert scheduler.getDebounceInterval() == 250
+
+    scheduler.recordDuration(1, "engine", 100.0)
+    assert scheduler.getDebounceInterval() == 3000
+
+
+def test_debounceIntervalUsesRecentHistory(scheduler):
+    for duration in (100.0, 1.0, 3.0):  # Only the last two are kept.
+        scheduler.recordDuration(0, "engine", duration)
+    assert scheduler.getEstimatedDuration(0, "engine") == pytest.approx(2.0)
+    assert scheduler.getDebounceInterval() == 1000
+
+
+def test_shouldFinishSliceWithoutHistory(scheduler):
+    # Without progress or earlier slices there is nothing to go by.
+    assert scheduler.getEstimatedRemainingDuration(0, 1.0, 0) is None
+    assert not scheduler.shouldFinishSlice(0, 1.0, 0)
+
+
+def test_shouldFinishSliceFromProgress(scheduler):
+    # Half done after 0.2 seconds: 0.2 seconds to go, within the 500 ms of the default interval.
+    assert scheduler.getEstimatedRemainingDuration(0, 0.2, 0.5) == pytest.approx(0.2)
+    assert scheduler.shouldFinishSlice(0, 0.2, 0.5)
+
+    # Half done after 2 seconds: 2 seconds to go.
+    assert not scheduler.shouldFinishSlice(0, 2.0, 0.5)
+
+
+def test_shouldFinishSliceFromHistory(scheduler):
+    scheduler.recordDuration(0, "engine", 3.0)  # Sets the interval to 1500 ms.
+    assert scheduler.shouldFinishSlice(0, 2.0, 0)
+    assert not scheduler.shouldFinishSlice(0, 1.0, 0)
+
+    # Taking longer than before doesn't give a negative estimate.
+    assert scheduler.getEstimatedRemainingDuration(0, 5.0, 0) == 0
+    assert scheduler.shouldFinishSlice(0, 5.0, 0)
+
+    # A build plate that wasn't sliced before has no history.
+    assert not scheduler.shouldFinishSlice(1, 2.0, 0)